@@ -3,4 +3,11 @@ HOOK_LOG_FAILED = 0
 HOOK_LOG_PENDING = 1
 HOOK_LOG_SUCCESS = 2
 
+# `Hook` fields counting logs by status
+HOOK_LOG_COUNTER_FIELDS = {
+    HOOK_LOG_FAILED: "failed_count",
+    HOOK_LOG_PENDING: "pending_count",
+    HOOK_LOG_SUCCESS: "success_count",
+}
+
 KOBO_INTERNAL_ERROR_STATUS_CODE = None
\ No newline at end of file
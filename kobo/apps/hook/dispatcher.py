@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+import time
+
+from django.conf import settings
+
+from .models.service_definition_interface import get_endpoint_key
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket(object):
+    """
+    Allows `rate` operations per second on average, and up to `capacity`
+    operations in a burst
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Takes a token if one is available
+
+        :return: float. 0 if a token was taken, otherwise the number of
+            seconds until one is available
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+
+def get_bucket(endpoint_key):
+    """
+    Returns the `TokenBucket` limiting the rate of requests that this process
+    sends to `endpoint_key`
+
+    :param endpoint_key: tuple. See `get_endpoint_key()`
+    :return: TokenBucket
+    """
+    with _buckets_lock:
+        try:
+            return _buckets[endpoint_key]
+        except KeyError:
+            bucket = TokenBucket(settings.HOOK_RATE_PER_ENDPOINT,
+                                 settings.HOOK_BURST_PER_ENDPOINT)
+            _buckets[endpoint_key] = bucket
+            return bucket
+
+
+class HookDispatcher(object):
+    """
+    Sends data of many instances to the endpoints of their hooks
+    concurrently, so that a slow endpoint holds up one Celery worker instead
+    of all of them.
+
+    Requests run in a pool of `max_workers` threads, with at most
+    `max_concurrency_per_endpoint` of them in flight to each endpoint (scheme
+    and host), and as fast as the token bucket of the endpoint allows.
+    The database and the deployment backend are only used by the calling
+    thread.
+    """
+
+    def __init__(self, max_workers=None, max_concurrency_per_endpoint=None):
+        self.max_workers = max_workers or settings.HOOK_DISPATCHER_MAX_WORKERS
+        self.max_concurrency_per_endpoint = max_concurrency_per_endpoint or \
+            settings.HOOK_MAX_CONCURRENCY_PER_ENDPOINT
+
+    def dispatch(self, jobs, progress=None):
+        """
+        Sends data and saves logs, like `ServiceDefinitionInterface.send()`
+        does for each job, and blocks until all jobs are done.
+
+        :param jobs: iterable. (`Hook`, instance id) tuples
+        :param progress: callable. Optional. Called with the numbers of jobs
+            done and of jobs in total each time a job is done
+        :return: list. (`Hook`, instance id, success, `HookLog`) tuples in
+            order of completion
+        """
+        queues = OrderedDict()
+        for hook, instance_id in jobs:
+            queues.setdefault(get_endpoint_key(hook.endpoint), deque()).append(
+                (hook, instance_id))
+        total = sum(len(queue) for queue in queues.itervalues())
+        in_flight = defaultdict(int)
+        futures = {}
+        results = []
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while queues or futures:
+                # Start as many requests as limits allow, and find out how
+                # long to wait for more tokens otherwise
+                timeout = None
+                for key in list(queues):
+                    queue = queues[key]
+                    while queue and \
+                            in_flight[key] < self.max_concurrency_per_endpoint:
+                        wait_seconds = get_bucket(key).take()
+                        if wait_seconds:
+                            timeout = wait_seconds if timeout is None \
+                                else min(timeout, wait_seconds)
+                            break
+                        hook, instance_id = queue.popleft()
+                        ServiceDefinition = hook.get_service_definition()
+                        service_definition = ServiceDefinition(hook, instance_id)
+                        future = executor.submit(service_definition.post)
+                        futures[future] = (key, hook, instance_id,
+                                           service_definition)
+                        in_flight[key] += 1
+                    if not queue:
+                        del queues[key]
+
+                if not futures:
+                    time.sleep(timeout)
+                    continue
+
+                done = wait(futures, timeout=timeout,
+                            return_when=FIRST_COMPLETED).done
+                for future in done:
+                    key, hook, instance_id, service_definition = \
+                        futures.pop(future)
+                    in_flight[key] -= 1
+                    success, status_code, message = future.result()
+                    log = service_definition.save_log(
+                        status_code, message, success)
+                    results.append((hook, instance_id, success, log))
+                    if progress:
+                        progress(len(results), total)
+        finally:
+            executor.shutdown(wait=True)
+
+        return results
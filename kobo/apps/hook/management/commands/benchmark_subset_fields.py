@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import re
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from lxml import etree
+
+from kobo.apps.hook.models.hook import SubsetFieldsMatcher
+from kobo.apps.hook.services import service_json, service_xml
+
+
+def legacy_parse_json(submission, fields):
+    """
+    The implementation of `service_json.ServiceDefinition._parse_data()` that
+    preceded `SubsetFieldsMatcher`, kept as a point of comparison
+    """
+    parsed_submission = {}
+    submission_keys = submission.keys()
+
+    for field_ in fields:
+        pattern = r"^{}$" if "/" in field_ else r"(^|/){}(/|$)"
+        for key_ in submission_keys:
+            if re.search(pattern.format(field_), key_):
+                parsed_submission.update({
+                    key_: submission[key_]
+                })
+
+    return parsed_submission
+
+
+def legacy_parse_xml(submission, fields):
+    """
+    The implementation of `service_xml.ServiceDefinition._parse_data()` that
+    preceded `SubsetFieldsMatcher`, kept as a point of comparison
+    """
+    xml_doc = etree.fromstring(submission)
+    tree = etree.ElementTree(xml_doc)
+    matched_nodes_paths = []
+    root_element = tree.getroot()
+    root_path = tree.getpath(root_element)
+
+    def remove_root_path(path_):
+        return path_.replace(root_path, "")
+
+    def is_group(node_):
+        for nested_node_ in node_.iterchildren():
+            if nested_node_.iterchildren():
+                return True
+        return False
+
+    def process_node(node_, matched_nodes_paths_):
+        for child in node_.getchildren():
+            process_node(child, matched_nodes_paths_)
+
+        node_path = remove_root_path(tree.getpath(node_))
+
+        if not node_path.startswith(matched_nodes_paths_) and node_.get("do_not_delete") != "true":
+            node_.getparent().remove(node_)
+        elif node_path != "":
+            node_.getparent().set("do_not_delete", "true")
+
+        if node_.attrib.get("do_not_delete"):
+            del node_.attrib["do_not_delete"]
+
+    for field_ in fields:
+        for node in tree.iter(field_):
+            matched_node_path = remove_root_path(tree.getpath(node))
+            if is_group(node):
+                matched_node_path += "/"
+            matched_nodes_paths.append(matched_node_path)
+
+    process_node(root_element, tuple(matched_nodes_paths))
+
+    return etree.tostring(tree, pretty_print=True)
+
+
+def build_submissions(groups, questions):
+    """
+    Return a JSON and an XML submission with `questions` questions in each
+    of `groups` groups
+    """
+    json_submission = {"__version__": "vPtjMxE37b4kgqoCBFEkeb", "id": 1}
+    root = etree.Element("aPtjMxE37b4kgqoCBFEkeb")
+    etree.SubElement(root, "id").text = "1"
+    for group in xrange(groups):
+        group_node = etree.SubElement(root, "group_{}".format(group))
+        for question in xrange(questions):
+            name = "question_{}_{}".format(group, question)
+            json_submission["group_{}/{}".format(group, name)] = name
+            etree.SubElement(group_node, name).text = name
+    return json_submission, etree.tostring(root)
+
+
+def build_fields(size, groups, questions):
+    """
+    Return `size` subset fields: names of questions and groups, some of which
+    do not exist, and a few full paths
+    """
+    fields = []
+    for index in xrange(size):
+        group = index % (groups + 1)
+        question = index // (groups + 1)
+        name = "question_{}_{}".format(group, question)
+        if index % 10 == 9:
+            fields.append("group_{}/{}".format(group, name))
+        elif index % 10 == 8:
+            fields.append("group_{}".format(group))
+        else:
+            fields.append(name)
+    return fields
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the filtering of JSON and XML submissions by the subset fields "
+        "of a hook against its previous implementation, for several numbers "
+        "of subset fields"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--groups",
+            default=10,
+            type=int,
+            help="Number of groups in each submission",
+        )
+        parser.add_argument(
+            "--questions",
+            default=50,
+            type=int,
+            help="Number of questions in each group",
+        )
+        parser.add_argument(
+            "--subset-sizes",
+            default="1,10,100,1000",
+            help="Comma-separated numbers of subset fields to time",
+        )
+        parser.add_argument(
+            "--deliveries",
+            default=100,
+            type=int,
+            help="Number of submissions to filter per run",
+        )
+        parser.add_argument(
+            "--runs",
+            default=3,
+            type=int,
+            help="Number of times to time each implementation",
+        )
+
+    def handle(self, *args, **options):
+        json_submission, xml_submission = build_submissions(
+            options["groups"], options["questions"])
+        json_service = service_json.ServiceDefinition(None)
+        xml_service = service_xml.ServiceDefinition(None)
+
+        for size in [int(size) for size in options["subset_sizes"].split(",")]:
+            fields = build_fields(size, options["groups"], options["questions"])
+            # Matchers are built once per hook, so leave that out of timings
+            matcher = SubsetFieldsMatcher(fields)
+            implementations = (
+                ("json legacy", lambda: legacy_parse_json(json_submission, fields)),
+                ("json current", lambda: json_service._parse_data(json_submission, matcher)),
+                ("xml legacy", lambda: legacy_parse_xml(xml_submission, fields)),
+                ("xml current", lambda: xml_service._parse_data(xml_submission, matcher)),
+            )
+            results = dict((name, function()) for name, function in implementations)
+            if results["json legacy"] != results["json current"] or \
+                    results["xml legacy"] != results["xml current"]:
+                raise CommandError("The implementations disagree!")
+
+            for name, function in implementations:
+                timings = [
+                    timeit.timeit(function, number=options["deliveries"])
+                    for _ in xrange(options["runs"])
+                ]
+                self.stdout.write(
+                    "{}, {} fields: best {:.3f}s, mean {:.3f}s for {} "
+                    "deliveries".format(
+                        name,
+                        size,
+                        min(timings),
+                        sum(timings) / len(timings),
+                        options["deliveries"]
+                    )
+                )
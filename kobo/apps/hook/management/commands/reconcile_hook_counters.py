@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from kobo.apps.hook.constants import HOOK_LOG_COUNTER_FIELDS
+from kobo.apps.hook.models import Hook, HookLog
+
+
+def reconcile_hook_counters(Hook, HookLog, stdout=None):
+    """
+    Recounts the logs of each hook by status and repairs its counters where
+    they differ. Model classes are passed as arguments so that this function
+    can also be used by migrations. Each hook is locked while it is recounted,
+    so logs can keep changing meanwhile
+
+    :return: int. Number of hooks repaired
+    """
+    repaired = 0
+    hook_ids = list(Hook.objects.order_by("pk").values_list("pk", flat=True))
+    for hook_id in hook_ids:
+        with transaction.atomic():
+            hook = Hook.objects.select_for_update().filter(pk=hook_id).first()
+            if hook is None:
+                continue
+            counts = dict(HookLog.objects.filter(hook_id=hook_id).order_by()
+                          .values_list("status").annotate(Count("id")))
+            counters = dict(
+                (field, counts.get(status, 0))
+                for status, field in HOOK_LOG_COUNTER_FIELDS.items()
+            )
+            if any(getattr(hook, field) != value
+                   for field, value in counters.items()):
+                Hook.objects.filter(pk=hook_id).update(**counters)
+                repaired += 1
+                if stdout:
+                    stdout.write("Hook #{}: {}".format(hook_id, counters))
+    return repaired
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the logs of each hook and repair its `success_count`, "
+        "`failed_count` and `pending_count` where they have drifted, e.g. "
+        "after logs were edited or deleted by hand. Idempotent"
+    )
+
+    def handle(self, *args, **options):
+        verbosity = options.get("verbosity", 1)
+        repaired = reconcile_hook_counters(
+            Hook,
+            HookLog,
+            stdout=self.stdout if verbosity >= 2 else None
+        )
+        if verbosity >= 1:
+            self.stdout.write("Repaired counters of {} hooks".format(repaired))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division
+
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.six.moves import BaseHTTPServer, socketserver
+
+
+class StubServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, delay, failure_rate):
+        BaseHTTPServer.HTTPServer.__init__(self, address, StubRequestHandler)
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.lock = threading.Lock()
+        self.counts = {'success': 0, 'failure': 0, 'in_flight': 0,
+                       'max_in_flight': 0}
+
+
+class StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Keep connections open, like real endpoints, so that pooling counts
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        counts = self.server.counts
+        with self.server.lock:
+            counts['in_flight'] += 1
+            counts['max_in_flight'] = max(counts['max_in_flight'],
+                                          counts['in_flight'])
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.delay)
+        failed = random.random() < self.server.failure_rate
+        body = b'{"detail": "stub failure"}' if failed else b'{"detail": "ok"}'
+        self.send_response(503 if failed else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            counts['in_flight'] -= 1
+            counts['failure' if failed else 'success'] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a local HTTP server that accepts REST service deliveries after a '
+        'delay and fails some of them, for load-testing hook delivery. Point '
+        'hook endpoints to it (this requires the '
+        '`ALLOW_UNSECURED_HOOK_ENDPOINTS` setting) and stop it with Ctrl-C'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--address',
+            default='127.0.0.1',
+            help='Address to listen on',
+        )
+        parser.add_argument(
+            '--port',
+            default=8765,
+            type=int,
+            help='Port to listen on',
+        )
+        parser.add_argument(
+            '--delay',
+            default=0.5,
+            type=float,
+            help='Number of seconds to wait before responding',
+        )
+        parser.add_argument(
+            '--failure-rate',
+            default=0.0,
+            type=float,
+            help='Fraction of requests answered with a 503 error',
+        )
+        parser.add_argument(
+            '--report-every',
+            default=10,
+            type=int,
+            help='Number of seconds between reports of request counts',
+        )
+
+    def handle(self, *args, **options):
+        server = StubServer((options['address'], options['port']),
+                            options['delay'], options['failure_rate'])
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.stdout.write('Listening on http://{}:{}/'.format(
+            options['address'], options['port']))
+
+        started_at = time.time()
+        try:
+            while True:
+                time.sleep(options['report_every'])
+                self._report(server, started_at)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            server.server_close()
+        self._report(server, started_at)
+
+    def _report(self, server, started_at):
+        with server.lock:
+            counts = dict(server.counts)
+        elapsed = time.time() - started_at
+        self.stdout.write(
+            '{success} succeeded, {failure} failed, {in_flight} in flight '
+            '(at most {max_in_flight}), {rate:.1f} requests/s'.format(
+                rate=(counts['success'] + counts['failure']) / elapsed,
+                **counts
+            )
+        )
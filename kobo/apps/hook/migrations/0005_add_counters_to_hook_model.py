@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+from kobo.apps.hook.management.commands.reconcile_hook_counters import \
+    reconcile_hook_counters
+
+
+def populate_counters(apps, schema_editor):
+    if settings.SKIP_HEAVY_MIGRATIONS:
+        print("""
+            !!! ATTENTION !!!
+            If you have existing REST services you need to run this management command:
+
+               > python manage.py reconcile_hook_counters
+
+            Otherwise, their numbers of successful, failed and pending logs will be wrong.
+            This command is idempotent so you can run it even if you are not
+            sure if it is necessary.
+            """)
+    else:
+        print("""
+            This might take a while. If it is too slow, you may want to re-run the
+            migration with SKIP_HEAVY_MIGRATIONS=True and run the management command
+            (reconcile_hook_counters) to populate the counters.
+            """)
+        reconcile_hook_counters(
+            apps.get_model('hook', 'Hook'),
+            apps.get_model('hook', 'HookLog'),
+        )
+
+
+# allow this migration to be run backwards
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hook', '0004_add_batch_fields_to_hook_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hook',
+            name='failed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='hook',
+            name='pending_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='hook',
+            name='success_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, noop),
+    ]
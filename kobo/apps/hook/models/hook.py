@@ -2,14 +2,48 @@
 from importlib import import_module
 
 from django.contrib.postgres.fields import ArrayField
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils import timezone
 from jsonbfield.fields import JSONField as JSONBField
 
-from ..constants import HOOK_LOG_PENDING, HOOK_LOG_FAILED, HOOK_LOG_SUCCESS
+from ..constants import HOOK_LOG_COUNTER_FIELDS
 from kpi.fields import KpiUidField
 
 
+class SubsetFieldsMatcher(object):
+    """
+    Tells whether parts of a submission belong to the subset of fields of a
+    hook. Fields containing a slash are full paths; others match any group
+    or question of that name, at any depth. Each test costs the same
+    whatever the number of fields
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._paths = frozenset(field for field in self.fields if "/" in field)
+        self._names = frozenset(field for field in self.fields if "/" not in field)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def matches_key(self, key):
+        """
+        :param key: str. Key of a JSON submission, e.g. `group/question`
+        :return: bool
+        """
+        if key in self._paths:
+            return True
+        return any(name in self._names for name in key.split("/"))
+
+    def matches_tag(self, tag):
+        """
+        :param tag: str. Tag of a node of an XML submission
+        :return: bool
+        """
+        return tag in self._names
+
+
 class Hook(models.Model):
 
     # Export types
@@ -47,17 +81,36 @@ class Hook(models.Model):
         models.CharField(max_length=500, blank=False),
         default=[],
     )
+    # Maximum number of submissions sent together in one request. When
+    # greater than 1, submissions are queued and sent as a list (JSON) or
+    # within a `<submissions>` element (XML)
+    batch_size = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1)])
+    # Number of seconds to wait for more submissions before sending an
+    # incomplete batch
+    batch_linger = models.PositiveIntegerField(default=0)
+    # Numbers of logs by status, maintained by `update_counters()`.
+    # Run `reconcile_hook_counters` if they drift
+    success_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+
+    _subset_fields_matcher = None
 
     class Meta:
         ordering = ["name"]
 
-    def __init__(self, *args, **kwargs):
-        self.__totals = {}
-        return super(Hook, self).__init__(*args, **kwargs)
-
     def save(self, *args, **kwargs):
         # Update date_modified each time object is saved
         self.date_modified = timezone.now()
+        self._subset_fields_matcher = None
+        # Do not overwrite counters updated since this object was loaded
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and
+                field.name not in HOOK_LOG_COUNTER_FIELDS.values()
+            ]
         super(Hook, self).save(*args, **kwargs)
 
     def __unicode__(self):
@@ -67,38 +120,31 @@ class Hook(models.Model):
         mod = import_module("kobo.apps.hook.services.service_{}".format(self.export_type))
         return getattr(mod, "ServiceDefinition")
 
-    @property
-    def success_count(self):
-        if not self.__totals:
-            self._get_totals()
-        return self.__totals.get(HOOK_LOG_SUCCESS)
-
-    @property
-    def failed_count(self):
-        if not self.__totals:
-            self._get_totals()
-        return self.__totals.get(HOOK_LOG_FAILED)
-
-    @property
-    def pending_count(self):
-        if not self.__totals:
-            self._get_totals()
-        return self.__totals.get(HOOK_LOG_PENDING)
-
-    def _get_totals(self):
-        # TODO add some cache
-        queryset = self.logs.values("status").annotate(values_count=models.Count("status"))
-        queryset.query.clear_ordering(True)
-
-        # Initialize totals
-        self.__totals = {
-            HOOK_LOG_SUCCESS: 0,
-            HOOK_LOG_FAILED: 0,
-            HOOK_LOG_PENDING: 0
-        }
-        for record in queryset:
-            self.__totals[record.get("status")] = record.get("values_count")
-
-    def reset_totals(self):
-        # TODO remove cache when it's enabled
-        self.__totals = {}
\ No newline at end of file
+    def get_subset_fields_matcher(self):
+        """
+        Returns a `SubsetFieldsMatcher` for `subset_fields`, built once and
+        reused by every delivery until the hook is saved or its fields change
+
+        :return: SubsetFieldsMatcher
+        """
+        matcher = self._subset_fields_matcher
+        if matcher is None or matcher.fields != tuple(self.subset_fields):
+            matcher = SubsetFieldsMatcher(self.subset_fields)
+            self._subset_fields_matcher = matcher
+        return matcher
+
+    @staticmethod
+    def update_counters(hook_id, deltas):
+        """
+        Atomically adds `deltas` to the counters of a hook
+
+        :param hook_id: int. Hook primary key
+        :param deltas: dict. Amounts to add, by `HookLog` status
+        """
+        fields = {}
+        for status, delta in deltas.items():
+            if delta and status in HOOK_LOG_COUNTER_FIELDS:
+                field = HOOK_LOG_COUNTER_FIELDS[status]
+                fields[field] = models.F(field) + delta
+        if fields:
+            Hook.objects.filter(pk=hook_id).update(**fields)
@@ -3,7 +3,7 @@ from datetime import datetime, timedelta
 from importlib import import_module
 
 import constance
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 from jsonbfield.fields import JSONField as JSONBField
@@ -12,6 +12,7 @@ from rest_framework import status
 from rest_framework.reverse import reverse
 
 from ..constants import HOOK_LOG_PENDING, HOOK_LOG_FAILED, HOOK_LOG_SUCCESS, KOBO_INTERNAL_ERROR_STATUS_CODE
+from .hook import Hook
 from kpi.fields import KpiUidField
 from kpi.utils.log import logging
 
@@ -28,9 +29,44 @@ class HookLog(models.Model):
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now_add=True)
 
+    # Status stored in the database, to update counters of the hook when it
+    # changes. `None` until the log is saved
+    _saved_status = None
+
     class Meta:
         ordering = ["-date_created"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(HookLog, cls).from_db(db, field_names, values)
+        instance._saved_status = instance.status
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super(HookLog, self).refresh_from_db(*args, **kwargs)
+        self._saved_status = self.status
+
+    @staticmethod
+    def bulk_change_status(queryset, status, **kwargs):
+        """
+        Changes the status of all logs of `queryset` in one query, and updates
+        counters of their hooks accordingly.
+
+        :param queryset: QuerySet. HookLog
+        :param status: int.
+        :param kwargs: dict. Other fields to update
+        """
+        with transaction.atomic():
+            previous_statuses = queryset.exclude(status=status).order_by()\
+                .values_list("hook_id", "status").annotate(models.Count("id"))
+            previous_statuses = list(previous_statuses)
+            queryset.update(status=status, **kwargs)
+            for hook_id, previous_status, count in previous_statuses:
+                Hook.update_counters(hook_id, {
+                    previous_status: -count,
+                    status: count
+                })
+
     def can_retry(self):
         """
         Returns whether instance can be resent to external endpoint.
@@ -89,8 +125,16 @@ class HookLog(models.Model):
         """
         try:
             ServiceDefinition = self.hook.get_service_definition()
-            service_definition = ServiceDefinition(self.hook, self.instance_id)
-            service_definition.send()
+            if self.hook.batch_size > 1:
+                # Send the data in the same format as the batches the
+                # endpoint usually receives
+                HookLog.objects.filter(pk=self.pk).update(
+                    tries=models.F("tries") + 1)
+                service_definition = ServiceDefinition(self.hook)
+                service_definition.send_batch([self.pk])
+            else:
+                service_definition = ServiceDefinition(self.hook, self.instance_id)
+                service_definition.send()
             self.refresh_from_db()
         except Exception as e:
             logging.error("HookLog.retry - {}".format(str(e)), exc_info=True)
@@ -105,8 +149,14 @@ class HookLog(models.Model):
         # We don't want to alter tries when we only change the status
         if kwargs.pop("reset_status", False) is False:
             self.tries += 1
-            self.hook.reset_totals()
-        super(HookLog, self).save(*args, **kwargs)
+        with transaction.atomic():
+            super(HookLog, self).save(*args, **kwargs)
+            if self.status != self._saved_status:
+                Hook.update_counters(self.hook_id, {
+                    self._saved_status: -1,
+                    self.status: 1
+                })
+        self._saved_status = self.status
 
     @property
     def status_str(self):
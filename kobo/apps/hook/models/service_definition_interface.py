@@ -2,11 +2,16 @@
 from __future__ import absolute_import
 
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 import json
 import os
 import re
+import threading
 
 import constance
+from django.utils import timezone
+from django.utils.six.moves import http_cookiejar
+from django.utils.six.moves.urllib import parse as urlparse
 import requests
 from rest_framework import status
 
@@ -15,15 +20,62 @@ from .hook import Hook
 from .hook_log import HookLog
 from kpi.utils.log import logging
 
+# Number of `requests.Session`s, each with its own pool of connections, kept
+# by each process; see `get_session()`
+MAXIMUM_POOLED_SESSIONS = 100
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def get_endpoint_key(endpoint):
+    """
+    Returns the scheme and host of `endpoint`. Endpoints with the same key
+    share connections and limits.
+
+    :param endpoint: str.
+    :return: tuple
+    """
+    return tuple(urlparse.urlparse(endpoint)[:2])
+
+
+def get_session(endpoint):
+    """
+    Returns a `requests.Session` shared by all endpoints on the same scheme
+    and host, so that consecutive deliveries reuse open connections instead
+    of going through a new TCP/TLS handshake each time.
+    Sessions are shared by hooks of different users: they never keep cookies
+
+    :param endpoint: str.
+    :return: requests.Session
+    """
+    key = get_endpoint_key(endpoint)
+    with _sessions_lock:
+        try:
+            session = _sessions.pop(key)
+        except KeyError:
+            session = requests.Session()
+            session.cookies.set_policy(
+                http_cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            if len(_sessions) >= MAXIMUM_POOLED_SESSIONS:
+                _sessions.popitem(last=False)
+        # Most recently used last
+        _sessions[key] = session
+    return session
+
 
 class ServiceDefinitionInterface(object):
 
     __metaclass__ = ABCMeta
 
-    def __init__(self, hook, instance_id):
+    def __init__(self, hook, instance_id=None):
+        """
+        :param hook: Hook.
+        :param instance_id: int. May be omitted when only `send_batch()`
+            is used
+        """
         self._hook = hook
         self._instance_id = instance_id
-        self._data = self._get_data()
+        self._data = self._get_data() if instance_id is not None else None
 
     def _get_data(self):
         """
@@ -31,21 +83,21 @@ class ServiceDefinitionInterface(object):
         """
         try:
             submission = self._hook.asset.deployment.get_submission(self._instance_id, self._hook.export_type)
-            return self._parse_data(submission, self._hook.subset_fields)
+            return self._parse_data(submission, self._hook.get_subset_fields_matcher())
         except Exception as e:
             logging.error("service_json.ServiceDefinition._get_data - Hook #{} - Data #{} - {}".format(
                 self._hook.uid, self._instance_id, str(e)), exc_info=True)
         return None
 
     @abstractmethod
-    def _parse_data(self, submission, fields):
+    def _parse_data(self, submission, matcher):
         """
         Data must be parsed to include only `self._hook.subset_fields` if there are any.
         :param submission: json|xml
-        :param fields: list
+        :param matcher: SubsetFieldsMatcher. See `Hook.get_subset_fields_matcher`
         :return: mixed: json|xml
         """
-        if len(fields) > 0:
+        if matcher:
             pass
         return submission
 
@@ -64,64 +116,127 @@ class ServiceDefinitionInterface(object):
         """
         pass
 
+    @abstractmethod
+    def _prepare_batch_request_kwargs(self, data):
+        """
+        Same as `_prepare_request_kwargs`, for a list of parsed submissions
+        sent together by `send_batch`.
+
+        :param data: list
+        :return: dict
+        """
+        pass
+
     def send(self):
         """
         Sends data to external endpoint
         :return: bool
         """
+        success, status_code, message = self.post()
+        self.save_log(status_code, message, success)
+        return success
 
-        success = False
-        response = None  # Need to declare response before requests.post assignment in case of RequestException
+    def post(self):
+        """
+        Sends data to external endpoint without logging the result, which is
+        left to `save_log`. It does not access the database, so it can run in
+        another thread than the one that created this object.
+
+        :return: tuple. Success (bool), status code and message of the response
+        """
         if self._data:
-            try:
-                request_kwargs = self._prepare_request_kwargs()
-
-                # Add custom headers
-                request_kwargs.get("headers").update(self._hook.settings.get("custom_headers", {}))
-
-                # Add user agent
-                public_domain = "- {} ".format(os.getenv("PUBLIC_DOMAIN_NAME"))\
-                    if os.getenv("PUBLIC_DOMAIN_NAME") else ""
-                request_kwargs.get("headers").update({
-                    "User-Agent": "KoBoToolbox external service {}#{}".format(
-                        public_domain,
-                        self._hook.uid)
-                })
+            return self._post(self._prepare_request_kwargs())
+
+        return False, KOBO_INTERNAL_ERROR_STATUS_CODE, "No data available"
 
-                # If the request needs basic authentication with username & password,
-                # let's provide them
-                if self._hook.auth_level == Hook.BASIC_AUTH:
-                    request_kwargs.update({
-                        "auth": (self._hook.settings.get("username"),
-                                 self._hook.settings.get("password"))
-                    })
-                response = requests.post(self._hook.endpoint, timeout=30, **request_kwargs)
-                response.raise_for_status()
-                self.save_log(response.status_code, response.text, True)
-                success = True
-            except requests.exceptions.RequestException as e:
-                # If request fails to communicate with remote server. Exception is raised before
-                # request.post can return something. Thus, response equals None
-                status_code = KOBO_INTERNAL_ERROR_STATUS_CODE
-                text = str(e)
-                if response is not None:
-                    text = response.text
-                    status_code = response.status_code
-                self.save_log(status_code, text)
-
-            except Exception as e:
-                logging.error("service_json.ServiceDefinition.send - Hook #{} - Data #{} - {}".format(
-                    self._hook.uid, self._instance_id, str(e)), exc_info=True)
-                self.save_log(
-                    KOBO_INTERNAL_ERROR_STATUS_CODE,
-                    "An error occurred when sending data to external endpoint")
+    def send_batch(self, hook_logs_ids):
+        """
+        Sends the data of all the instances of `hook_logs_ids` to external
+        endpoint in one request, and updates their logs in bulk.
+        Tries of these logs must already have been incremented.
+
+        :param hook_logs_ids: list. `HookLog` primary keys
+        :return: bool
+        """
+        instances_ids = list(HookLog.objects.filter(
+            id__in=hook_logs_ids).values_list("instance_id", flat=True))
+        request_kwargs = None
+        try:
+            submissions = self._hook.asset.deployment.get_submissions(
+                self._hook.export_type, instances_ids)
+            matcher = self._hook.get_subset_fields_matcher()
+            data = [self._parse_data(submission, matcher)
+                    for submission in submissions]
+            if data:
+                request_kwargs = self._prepare_batch_request_kwargs(data)
+        except Exception as e:
+            # Logs must be updated anyway, otherwise claimed logs would stay
+            # pending forever
+            logging.error("ServiceDefinitionInterface.send_batch - Hook #{} - {}".format(
+                self._hook.uid, str(e)), exc_info=True)
+
+        if request_kwargs:
+            success, status_code, message = self._post(request_kwargs)
         else:
-            self.save_log(
-                KOBO_INTERNAL_ERROR_STATUS_CODE,
-                "No data available")
+            success = False
+            status_code = KOBO_INTERNAL_ERROR_STATUS_CODE
+            message = "No data available"
 
+        self.save_logs(hook_logs_ids, status_code, message, success)
         return success
 
+    def _post(self, request_kwargs):
+        """
+        Posts to external endpoint
+
+        :param request_kwargs: dict. See `_prepare_request_kwargs`
+        :return: tuple. Success (bool), status code and message of the response
+        """
+        success = False
+        response = None  # Need to declare response before session.post assignment in case of RequestException
+        try:
+            # Add custom headers
+            request_kwargs.get("headers").update(self._hook.settings.get("custom_headers", {}))
+
+            # Add user agent
+            public_domain = "- {} ".format(os.getenv("PUBLIC_DOMAIN_NAME"))\
+                if os.getenv("PUBLIC_DOMAIN_NAME") else ""
+            request_kwargs.get("headers").update({
+                "User-Agent": "KoBoToolbox external service {}#{}".format(
+                    public_domain,
+                    self._hook.uid)
+            })
+
+            # If the request needs basic authentication with username & password,
+            # let's provide them
+            if self._hook.auth_level == Hook.BASIC_AUTH:
+                request_kwargs.update({
+                    "auth": (self._hook.settings.get("username"),
+                             self._hook.settings.get("password"))
+                })
+            response = get_session(self._hook.endpoint).post(
+                self._hook.endpoint, timeout=30, **request_kwargs)
+            response.raise_for_status()
+            status_code = response.status_code
+            message = response.text
+            success = True
+        except requests.exceptions.RequestException as e:
+            # If request fails to communicate with remote server. Exception is raised before
+            # session.post can return something. Thus, response equals None
+            status_code = KOBO_INTERNAL_ERROR_STATUS_CODE
+            message = str(e)
+            if response is not None:
+                message = response.text
+                status_code = response.status_code
+
+        except Exception as e:
+            logging.error("service_json.ServiceDefinition.send - Hook #{} - Data #{} - {}".format(
+                self._hook.uid, self._instance_id, str(e)), exc_info=True)
+            status_code = KOBO_INTERNAL_ERROR_STATUS_CODE
+            message = "An error occurred when sending data to external endpoint"
+
+        return success, status_code, message
+
     def save_log(self, status_code, message, success=False):
         """
         Updates/creates log entry
@@ -129,6 +244,7 @@ class ServiceDefinitionInterface(object):
         :param success: bool.
         :param status_code: int. HTTP status code
         :param message: str.
+        :return: HookLog. `None` if it could not be saved
         """
         fields = {
             "hook": self._hook,
@@ -148,7 +264,43 @@ class ServiceDefinitionInterface(object):
             log.status = HOOK_LOG_FAILED
 
         log.status_code = status_code
+        log.message = self._clean_message(message)
+
+        try:
+            log.save()
+        except Exception as e:
+            logging.error("ServiceDefinitionInterface.save_log - {}".format(str(e)), exc_info=True)
+            return None
+
+        return log
+
+    def save_logs(self, hook_logs_ids, status_code, message, success=False):
+        """
+        Updates log entries of a batch in bulk. Unlike `save_log`, it does not
+        increment tries.
+
+        :param hook_logs_ids: list. `HookLog` primary keys
+        :param success: bool.
+        :param status_code: int. HTTP status code
+        :param message: str.
+        """
+        logs = HookLog.objects.filter(id__in=hook_logs_ids)
+        try:
+            if success:
+                HookLog.bulk_change_status(logs, HOOK_LOG_SUCCESS)
+            else:
+                # Tries have already been incremented for this attempt
+                HookLog.bulk_change_status(
+                    logs.filter(tries__gt=constance.config.HOOK_MAX_RETRIES),
+                    HOOK_LOG_FAILED)
+            logs.update(status_code=status_code,
+                        message=self._clean_message(message),
+                        date_modified=timezone.now())
+        except Exception as e:
+            logging.error("ServiceDefinitionInterface.save_logs - {}".format(str(e)), exc_info=True)
 
+    @staticmethod
+    def _clean_message(message):
         # We want to clean up HTML, so first, we try to create a json object.
         # In case of failure, it should be HTML (or plaintext), we can remove tags
         try:
@@ -156,9 +308,4 @@ class ServiceDefinitionInterface(object):
         except ValueError as e:
             message = re.sub(r"<[^>]*>", " ", message).strip()
 
-        log.message = message
-
-        try:
-            log.save()
-        except Exception as e:
-            logging.error("ServiceDefinitionInterface.save_log - {}".format(str(e)), exc_info=True)
+        return message
@@ -1,27 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
-import json
-import re
-
 from ..models.service_definition_interface import ServiceDefinitionInterface
 
 
 class ServiceDefinition(ServiceDefinitionInterface):
     id = u"json"
 
-    def _parse_data(self, submission, fields):
-        if len(fields) > 0:
+    def _parse_data(self, submission, matcher):
+        if matcher:
             parsed_submission = {}
-            submission_keys = submission.keys()
 
-            for field_ in fields:
-                pattern = r"^{}$" if "/" in field_ else r"(^|/){}(/|$)"
-                for key_ in submission_keys:
-                    if re.search(pattern.format(field_), key_):
-                        parsed_submission.update({
-                            key_: submission[key_]
-                        })
+            for key_, value in submission.iteritems():
+                if matcher.matches_key(key_):
+                    parsed_submission[key_] = value
 
             return parsed_submission
 
@@ -31,4 +23,10 @@ class ServiceDefinition(ServiceDefinitionInterface):
         return {
             "headers": {"Content-Type": "application/json"},
             "json": self._data
-        }
\ No newline at end of file
+        }
+
+    def _prepare_batch_request_kwargs(self, data):
+        return {
+            "headers": {"Content-Type": "application/json"},
+            "json": data
+        }
@@ -10,8 +10,8 @@ from ..models.service_definition_interface import ServiceDefinitionInterface
 class ServiceDefinition(ServiceDefinitionInterface):
     id = u"xml"
 
-    def _parse_data(self, submission, fields):
-        if len(fields) > 0:
+    def _parse_data(self, submission, matcher):
+        if matcher:
 
             # Build xml to be parsed
             xml_doc = etree.fromstring(submission)
@@ -86,9 +86,10 @@ class ServiceDefinition(ServiceDefinitionInterface):
                 if node_.attrib.get("do_not_delete"):
                     del node_.attrib["do_not_delete"]
 
-            # Keep all paths of nodes that match the subset of fields
-            for field_ in fields:
-                for node in tree.iter(field_):
+            # Keep all paths of nodes that match the subset of fields,
+            # walking the tree only once
+            for node in tree.iter():
+                if matcher.matches_tag(node.tag):
                     matched_node_path = remove_root_path(tree.getpath(node))
                     # To make a difference between groups with same beginning of name, we need to add a trailing slash
                     # for later comparison in `process_node`.
@@ -110,3 +111,14 @@ class ServiceDefinition(ServiceDefinitionInterface):
             "data": self._data
         }
 
+    def _prepare_batch_request_kwargs(self, data):
+        submissions = etree.Element("submissions")
+        for submission in data:
+            if isinstance(submission, unicode):
+                # lxml refuses unicode strings with an encoding declaration
+                submission = submission.encode("utf-8")
+            submissions.append(etree.fromstring(submission))
+        return {
+            "headers": {"Content-Type": "application/xml"},
+            "data": etree.tostring(submissions, pretty_print=True)
+        }
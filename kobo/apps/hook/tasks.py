@@ -1,21 +1,32 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
-import time
+from collections import OrderedDict, defaultdict
 
 from celery import shared_task
 import constance
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Count, F
 from django.template import Context
 from django.template.loader import get_template
 from django.utils import translation, timezone
 from django_celery_beat.models import PeriodicTask
 
-from .constants import HOOK_LOG_FAILED
+from .constants import HOOK_LOG_FAILED, HOOK_LOG_PENDING
+from .dispatcher import HookDispatcher
 from .models import Hook, HookLog
 from kpi.utils.log import logging
 
+# Number of logs loaded at a time by `retry_all_task`
+RETRY_CHUNK_SIZE = 1000
+# Number of owners whose failures reports are prepared and sent together
+FAILURES_REPORTS_OWNERS_PER_CHUNK = 100
+# Maximum number of logs listed for each asset in a failures report
+FAILURES_REPORTS_MAXIMUM_LOGS_PER_ASSET = 50
+
 
 @shared_task(bind=True)
 def service_definition_task(self, hook_id, instance_id):
@@ -45,15 +56,156 @@ def service_definition_task(self, hook_id, instance_id):
     return True
 
 
+@shared_task(bind=True)
+def batch_service_definition_task(self, hook_id, hooklogs_ids=None):
+    """
+    Tries to send data of queued instances to the endpoint of the hook in one
+    request. Up to `Hook.batch_size` instances are claimed from the queue
+    when `hooklogs_ids` is not provided, and the batch is retried the same
+    way as `service_definition_task`.
+
+    :param self: Celery.Task.
+    :param hook_id: int. Hook PK
+    :param hooklogs_ids: list. Optional. PKs of the logs of a batch to retry
+    """
+    hook = Hook.objects.get(id=hook_id)
+    if hooklogs_ids is None:
+        hooklogs_ids, has_more = claim_batch(hook)
+        if has_more:
+            batch_service_definition_task.delay(hook_id)
+        if not hooklogs_ids:
+            return True
+    else:
+        HookLog.objects.filter(id__in=hooklogs_ids).update(
+            tries=F("tries") + 1)
+
+    ServiceDefinition = hook.get_service_definition()
+    service_definition = ServiceDefinition(hook)
+    if not service_definition.send_batch(hooklogs_ids):
+        # Countdown is in seconds
+        countdown = HookLog.get_remaining_seconds(self.request.retries)
+        raise self.retry(args=(hook_id, hooklogs_ids), countdown=countdown,
+                         max_retries=constance.config.HOOK_MAX_RETRIES)
+
+    return True
+
+
+@shared_task
+def dispatch_task(jobs):
+    """
+    Sends data of many instances concurrently with `HookDispatcher`.
+    Failed deliveries are retried by another task, after the same delays as
+    `service_definition_task`, until their logs are marked as failed.
+
+    :param jobs: list. [hook_id, instance_id] pairs
+    """
+    hooks = Hook.objects.select_related("asset").in_bulk(
+        set(hook_id for hook_id, instance_id in jobs))
+    results = HookDispatcher().dispatch(
+        (hooks[hook_id], instance_id) for hook_id, instance_id in jobs
+        if hook_id in hooks
+    )
+    schedule_retries(results)
+
+    return True
+
+
+def schedule_retries(results):
+    """
+    Schedules `dispatch_task` for the failed deliveries of `results` whose
+    logs are still pending, grouped by delay.
+
+    :param results: list. See `HookDispatcher.dispatch()`
+    """
+    jobs_by_countdown = defaultdict(list)
+    for hook, instance_id, success, log in results:
+        if not success and log is not None and log.status == HOOK_LOG_PENDING:
+            # Countdown is in seconds. `log.tries` counts the first try too
+            countdown = HookLog.get_remaining_seconds(log.tries - 1)
+            jobs_by_countdown[countdown].append([hook.id, instance_id])
+
+    for countdown, jobs in jobs_by_countdown.iteritems():
+        dispatch_task.apply_async(args=(jobs,), countdown=countdown)
+
+
+def claim_batch(hook):
+    """
+    Takes up to `hook.batch_size` instances out of the queue of `hook`, i.e.
+    pending logs that have never been tried, by incrementing their tries.
+    Concurrent claims for the same hook wait for each other.
+
+    :param hook: Hook.
+    :return: tuple. List of claimed `HookLog` PKs and whether instances remain
+        in the queue
+    """
+    with transaction.atomic():
+        # Lock the hook
+        list(Hook.objects.select_for_update().filter(pk=hook.pk).values_list("pk"))
+        queue = HookLog.objects.filter(hook=hook, status=HOOK_LOG_PENDING, tries=0)
+        hooklogs_ids = list(queue.order_by("id").values_list("id", flat=True)[:hook.batch_size])
+        HookLog.objects.filter(id__in=hooklogs_ids).update(tries=1, date_modified=timezone.now())
+        has_more = queue.exists()
+
+    return hooklogs_ids, has_more
+
+
+def send_batches(hook, hooklogs_ids):
+    """
+    Sends data of the logs of `hooklogs_ids` to the endpoint of `hook` once,
+    in batches of up to `hook.batch_size` instances.
+
+    :param hook: Hook.
+    :param hooklogs_ids: list. `HookLog` primary keys
+    :return: int. Number of logs sent successfully
+    """
+    ServiceDefinition = hook.get_service_definition()
+    service_definition = ServiceDefinition(hook)
+    succeeded = 0
+    for start in xrange(0, len(hooklogs_ids), hook.batch_size):
+        batch_hooklogs_ids = hooklogs_ids[start:start + hook.batch_size]
+        HookLog.objects.filter(id__in=batch_hooklogs_ids).update(
+            tries=F("tries") + 1)
+        if service_definition.send_batch(batch_hooklogs_ids):
+            succeeded += len(batch_hooklogs_ids)
+
+    return succeeded
+
+
 @shared_task
 def retry_all_task(hooklogs_ids):
     """
+    Retries to send data of all logs of `hooklogs_ids` once, concurrently
+    with `HookDispatcher`, `RETRY_CHUNK_SIZE` logs at a time.
+    Logs of hooks that send data in batches are sent again in batches.
+    Progress is logged every `RETRY_CHUNK_SIZE` logs.
+
     :param list: <int>.
     """
-    hook_logs = HookLog.objects.filter(id__in=hooklogs_ids)
-    for hook_log in hook_logs:
-        hook_log.retry()
-        time.sleep(0.2)
+    HookLog.bulk_change_status(HookLog.objects.filter(id__in=hooklogs_ids), HOOK_LOG_PENDING)
+    dispatcher = HookDispatcher()
+    total = len(hooklogs_ids)
+    succeeded = 0
+    for start in xrange(0, total, RETRY_CHUNK_SIZE):
+        logs = list(HookLog.objects.filter(
+            id__in=hooklogs_ids[start:start + RETRY_CHUNK_SIZE]
+        ).order_by("id").values_list("id", "hook_id", "instance_id"))
+        hooks = Hook.objects.select_related("asset").in_bulk(
+            set(hook_id for hooklog_id, hook_id, instance_id in logs))
+        jobs = []
+        batched_hooklogs_ids = defaultdict(list)
+        for hooklog_id, hook_id, instance_id in logs:
+            if hook_id not in hooks:
+                continue
+            if hooks[hook_id].batch_size > 1:
+                batched_hooklogs_ids[hook_id].append(hooklog_id)
+            else:
+                jobs.append((hooks[hook_id], instance_id))
+        results = dispatcher.dispatch(jobs)
+        succeeded += sum(1 for hook, instance_id, success, log in results if success)
+        for hook_id, hook_hooklogs_ids in batched_hooklogs_ids.iteritems():
+            succeeded += send_batches(hooks[hook_id], hook_hooklogs_ids)
+        logging.info("retry_all_task - {}/{} logs retried, {} successfully".format(
+            min(start + RETRY_CHUNK_SIZE, total), total, succeeded))
 
     return True
 
@@ -62,6 +214,9 @@ def retry_all_task(hooklogs_ids):
 def failures_reports():
     """
     Notifies owners' assets by email of hooks failures.
+    Logs are counted in the database, and owners are processed in chunks of
+    `FAILURES_REPORTS_OWNERS_PER_CHUNK`, each report listing at most
+    `FAILURES_REPORTS_MAXIMUM_LOGS_PER_ASSET` logs per asset.
     :return: bool
     """
     beat_schedule = settings.CELERY_BEAT_SCHEDULE.get("send-hooks-failures-reports")
@@ -70,12 +225,11 @@ def failures_reports():
         .order_by("-last_run_at").first()
 
     if failures_reports_period_task:
-        
+
         last_run_at = failures_reports_period_task.last_run_at
         queryset = HookLog.objects.filter(hook__email_notification=True, status=HOOK_LOG_FAILED)
         if last_run_at:
             queryset = queryset.filter(date_modified__gte=last_run_at)
-        queryset = queryset.order_by("hook__asset__name", "hook__uid", "-date_modified")
 
         # PeriodicTask are updated every 3 minutes (default).
         # It means, if this task interval is less than 3 minutes, some data can be duplicated in emails.
@@ -84,74 +238,100 @@ def failures_reports():
         # see: http://docs.celeryproject.org/en/latest/userguide/configuration.html#beat-sync-every
         PeriodicTask.objects.filter(task=beat_schedule.get("task")).update(last_run_at=timezone.now())
 
-        records = {}
-        max_length = 0
-
-        # Prepare data for templates.
-        # All logs will be grouped under their respective asset and user.
-        for record in queryset:
-            # if users don't exist in dict, add them
-            if record.hook.asset.owner.id not in records:
-                records[record.hook.asset.owner.id] = {
-                    "username": record.hook.asset.owner.username,
-                    # language is not implemented yet.
-                    # TODO add language to user table in registration process
-                    "language": getattr(record.hook.asset.owner, "language", "en"),
-                    "email": record.hook.asset.owner.email,
-                    "assets": {}
-                }
-
-            # if asset doesn't exist in user's asset dict, add it
-            if record.hook.asset.id not in records[record.hook.asset.owner.id]["assets"]:
-                max_length = 0
-                records[record.hook.asset.owner.id]["assets"][record.hook.asset.id] = {
-                    "name": record.hook.asset.name,
-                    "max_length": 0,
-                    "logs": []
-                }
-
-            # Add log to corresponding asset and user
-            records[record.hook.asset.owner.id]["assets"][record.hook.asset.id]["logs"].append({
-                "hook_name": record.hook.name,
-                "uid": record.uid,
-                "date_modified": record.date_modified,
-                "status_code": record.status_code,
-                "message": record.message
-            })
-            hook_name_length = len(record.hook.name)
-
-            # Max Length is used for plain text template. To display fixed size columns.
-            max_length = max(max_length, hook_name_length)
-            records[record.hook.asset.owner.id]["assets"][record.hook.asset.id]["max_length"] = max_length
+        owners_ids = list(queryset.order_by("hook__asset__owner_id")
+                          .values_list("hook__asset__owner_id", flat=True).distinct())
+        if not owners_ids:
+            return True
 
         # Get templates
         plain_text_template = get_template("reports/failures_email_body.txt")
         html_template = get_template("reports/failures_email_body.html")
-        email_messages = []
 
-        for owner_id, record in records.items():
-            variables = {
-                "username": record.get("username"),
-                "assets": record.get("assets")
-            }
-            # Localize templates
-            translation.activate(record.get("language"))
-            text_content = plain_text_template.render(Context(variables))
-            html_content = html_template.render(Context(variables))
-
-            msg = EmailMultiAlternatives(translation.ugettext("REST Services Failure Report"), text_content,
-                                         constance.config.SUPPORT_EMAIL,
-                                         [record.get("email")])
-            msg.attach_alternative(html_content, "text/html")
-            email_messages.append(msg)
-
-        # Send email messages
-        if len(email_messages) > 0:
-            try:
-                with get_connection() as connection:
+        # Send email messages, reusing one connection for all chunks
+        try:
+            with get_connection() as connection:
+                for start in xrange(0, len(owners_ids), FAILURES_REPORTS_OWNERS_PER_CHUNK):
+                    records = _get_failures_records(
+                        queryset, owners_ids[start:start + FAILURES_REPORTS_OWNERS_PER_CHUNK])
+                    email_messages = []
+                    for record in records.values():
+                        variables = {
+                            "username": record.get("username"),
+                            "assets": record.get("assets")
+                        }
+                        # Localize templates
+                        translation.activate(record.get("language"))
+                        text_content = plain_text_template.render(Context(variables))
+                        html_content = html_template.render(Context(variables))
+
+                        msg = EmailMultiAlternatives(translation.ugettext("REST Services Failure Report"), text_content,
+                                                     constance.config.SUPPORT_EMAIL,
+                                                     [record.get("email")])
+                        msg.attach_alternative(html_content, "text/html")
+                        email_messages.append(msg)
                     connection.send_messages(email_messages)
-            except Exception as e:
-                logging.error("failures_reports - {}".format(str(e)), exc_info=True)
-                return False
+        except Exception as e:
+            logging.error("failures_reports - {}".format(str(e)), exc_info=True)
+            return False
 
     return True
+
+
+def _get_failures_records(queryset, owners_ids):
+    """
+    Prepares data for templates of failures reports.
+    All logs of `queryset` belonging to `owners_ids` are grouped under their
+    respective asset and user, up to `FAILURES_REPORTS_MAXIMUM_LOGS_PER_ASSET`
+    per asset. `more_count` tells how many logs of an asset are left out.
+
+    :param queryset: QuerySet. HookLog
+    :param owners_ids: list. User primary keys
+    :return: OrderedDict. Records by owner id
+    """
+    owners = User.objects.in_bulk(owners_ids)
+    records = OrderedDict()
+    assets = queryset.filter(hook__asset__owner_id__in=owners_ids)\
+        .order_by("hook__asset__owner_id", "hook__asset__name", "hook__asset_id")\
+        .values_list("hook__asset__owner_id", "hook__asset_id", "hook__asset__name")\
+        .annotate(logs_count=Count("id"))
+
+    for owner_id, asset_id, asset_name, logs_count in assets:
+        owner = owners.get(owner_id)
+        if owner is None:
+            continue
+        # if users don't exist in dict, add them
+        if owner_id not in records:
+            records[owner_id] = {
+                "username": owner.username,
+                # language is not implemented yet.
+                # TODO add language to user table in registration process
+                "language": getattr(owner, "language", "en"),
+                "email": owner.email,
+                "assets": OrderedDict()
+            }
+
+        logs = []
+        # Max Length is used for plain text template. To display fixed size columns.
+        max_length = 0
+        samples = queryset.filter(hook__asset_id=asset_id)\
+            .order_by("hook__uid", "-date_modified")\
+            .values_list("hook__name", "uid", "date_modified", "status_code", "message")
+        for hook_name, uid, date_modified, status_code, message in \
+                samples[:FAILURES_REPORTS_MAXIMUM_LOGS_PER_ASSET]:
+            logs.append({
+                "hook_name": hook_name,
+                "uid": uid,
+                "date_modified": date_modified,
+                "status_code": status_code,
+                "message": message
+            })
+            max_length = max(max_length, len(hook_name))
+
+        records[owner_id]["assets"][asset_id] = {
+            "name": asset_name,
+            "max_length": max_length,
+            "logs": logs,
+            "more_count": logs_count - len(logs)
+        }
+
+    return records
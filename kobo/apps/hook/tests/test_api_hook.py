@@ -2,15 +2,27 @@
 from __future__ import absolute_import
 
 import json
+import threading
 
 import constance
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+import mock
 import requests
 import responses
 from rest_framework import status
 
 from .hook_test_case import HookTestCase
+from ..constants import HOOK_LOG_FAILED, HOOK_LOG_SUCCESS, \
+    KOBO_INTERNAL_ERROR_STATUS_CODE
+from ..models import Hook, HookLog
+from ..tasks import claim_batch, retry_all_task
+from ..utils import HookUtils
 from kpi.constants import INSTANCE_FORMAT_TYPE_JSON
+from kpi.models import Asset
 
 
 class ApiHookTestCase(HookTestCase):
@@ -74,6 +86,32 @@ class ApiHookTestCase(HookTestCase):
         response = self.client.post(submission_url, data)
         self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
 
+    def test_bulk_data_submission(self):
+        first_hook = self._create_hook(name="first dummy external service",
+                                       endpoint="http://first.service.local/")
+        second_hook = self._create_hook(name="second dummy external service",
+                                        endpoint="http://second.service.local/")
+        HookLog.objects.create(hook=first_hook, instance_id=1)
+        submission_url = reverse("submission-list", kwargs={"parent_lookup_asset": self.asset.uid})
+
+        with mock.patch("kobo.apps.hook.utils.dispatch_task") as dispatch_task:
+            response = self.client.post(submission_url, {"instances_ids": [1, 2]},
+                                        format=INSTANCE_FORMAT_TYPE_JSON)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        # All deliveries go through one task
+        self.assertEqual(dispatch_task.delay.call_count, 1)
+        self.assertEqual(sorted(dispatch_task.delay.call_args[0][0]), sorted([
+            [first_hook.id, 2],
+            [second_hook.id, 1],
+            [second_hook.id, 2],
+        ]))
+
+        for hook, instance_id in ((first_hook, 2), (second_hook, 1), (second_hook, 2)):
+            HookLog.objects.create(hook=hook, instance_id=instance_id)
+        response = self.client.post(submission_url, {"instances_ids": [1, 2]},
+                                    format=INSTANCE_FORMAT_TYPE_JSON)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
     def test_non_owner_cannot_access(self):
         hook = self._create_hook()
         self.client.logout()
@@ -156,6 +194,55 @@ class ApiHookTestCase(HookTestCase):
         response = self.client.get(detail_url, format=INSTANCE_FORMAT_TYPE_JSON)
         self.assertEqual(response.data.get("tries"), 2)
 
+    @responses.activate
+    def test_retry_all(self):
+        first_log_response = self._send_and_fail()
+
+        retry_url = reverse("hook-retry", kwargs={
+            "parent_lookup_asset": self.asset.uid,
+            "uid": self.hook.uid
+        })
+        response = self.client.patch(retry_url, format=INSTANCE_FORMAT_TYPE_JSON)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get("pending_uids"),
+                         [first_log_response.get("uid")])
+
+        log = HookLog.objects.get(uid=first_log_response.get("uid"))
+        self.assertEqual(log.status, HOOK_LOG_SUCCESS)
+        self.assertEqual(log.tries, 2)
+        self.hook.refresh_from_db()
+        self.assertEqual(self.hook.success_count, 1)
+        self.assertEqual(self.hook.failed_count, 0)
+        self.assertEqual(self.hook.pending_count, 0)
+
+    @responses.activate
+    def test_counters(self):
+        self._send_and_fail()
+        detail_url = reverse("hook-detail", kwargs={
+            "parent_lookup_asset": self.asset.uid,
+            "uid": self.hook.uid
+        })
+        response = self.client.get(detail_url, format=INSTANCE_FORMAT_TYPE_JSON)
+        self.assertEqual(response.data.get("success_count"), 0)
+        self.assertEqual(response.data.get("failed_count"), 1)
+        self.assertEqual(response.data.get("pending_count"), 0)
+
+        # Saving the hook must not overwrite counters
+        stale_hook = HookLog.objects.get(hook=self.hook).hook
+        HookLog.objects.get(hook=self.hook).change_status(HOOK_LOG_SUCCESS)
+        stale_hook.save()
+        self.hook.refresh_from_db()
+        self.assertEqual(self.hook.success_count, 1)
+        self.assertEqual(self.hook.failed_count, 0)
+
+        # Repair drift
+        HookLog.objects.filter(hook=self.hook).update(status=HOOK_LOG_FAILED)
+        call_command("reconcile_hook_counters", verbosity=0)
+        self.hook.refresh_from_db()
+        self.assertEqual(self.hook.success_count, 0)
+        self.assertEqual(self.hook.failed_count, 1)
+        self.assertEqual(self.hook.pending_count, 0)
+
     def test_validation(self):
 
         constance.config.ALLOW_UNSECURED_HOOK_ENDPOINTS = False
@@ -163,4 +250,123 @@ class ApiHookTestCase(HookTestCase):
         response = self._create_hook(return_response_only=True)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         expected_response = {"endpoint": ["Unsecured endpoint is not allowed"]}
-        self.assertEqual(response.data, expected_response)
\ No newline at end of file
+        self.assertEqual(response.data, expected_response)
+
+    @responses.activate
+    def test_batch_delivery(self):
+        hook = self._create_hook(subset_fields=["q1"])
+        hook.batch_size = 2
+        hook.save()
+        self.asset.deployment.mock_submissions([
+            {"id": 1, "q1": "first", "group1/q2": "ignored"},
+            {"id": 2, "q1": "second"},
+        ])
+        responses.add(responses.POST, hook.endpoint,
+                      status=status.HTTP_200_OK,
+                      content_type="application/json")
+
+        # The first instance starts the queue; hold its delayed task back so
+        # that the second one completes the batch
+        with mock.patch("kobo.apps.hook.utils.batch_service_definition_task"):
+            self.assertTrue(HookUtils.call_services(self.asset, 1))
+        self.assertEqual(len(responses.calls), 0)
+        self.assertTrue(HookUtils.call_services(self.asset, 2))
+        self.assertFalse(HookUtils.call_services(self.asset, 2))
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(json.loads(responses.calls[0].request.body), [
+            {"q1": "first"},
+            {"q1": "second"},
+        ])
+        logs = HookLog.objects.filter(hook=hook)
+        self.assertEqual(logs.count(), 2)
+        for log in logs:
+            self.assertEqual(log.status, HOOK_LOG_SUCCESS)
+            self.assertEqual(log.tries, 1)
+
+    def test_batch_preparation_failure_is_logged(self):
+        hook = self._create_hook()
+        hook.batch_size = 2
+        hook.save()
+        self.asset.deployment.mock_submissions([
+            {"id": 1, "q1": "first"},
+            {"id": 2, "q1": "second"},
+        ])
+        with mock.patch("kobo.apps.hook.utils.batch_service_definition_task"):
+            HookUtils.call_services_bulk(self.asset, [1, 2])
+        hooklogs_ids = claim_batch(hook)[0]
+
+        ServiceDefinition = hook.get_service_definition()
+        with mock.patch.object(ServiceDefinition, "_prepare_batch_request_kwargs",
+                               side_effect=ValueError):
+            self.assertFalse(ServiceDefinition(hook).send_batch(hooklogs_ids))
+        for log in HookLog.objects.filter(id__in=hooklogs_ids):
+            self.assertEqual(log.status_code, KOBO_INTERNAL_ERROR_STATUS_CODE)
+            self.assertEqual(log.message, "No data available")
+
+    @responses.activate
+    def test_retry_all_in_batches(self):
+        hook = self._create_hook(subset_fields=["q1"])
+        hook.batch_size = 2
+        hook.save()
+        self.asset.deployment.mock_submissions([
+            {"id": 1, "q1": "first"},
+            {"id": 2, "q1": "second"},
+        ])
+        hooklogs_ids = [
+            HookLog.objects.create(hook=hook, instance_id=instance_id,
+                                   status=HOOK_LOG_FAILED).pk
+            for instance_id in (1, 2)
+        ]
+        responses.add(responses.POST, hook.endpoint,
+                      status=status.HTTP_200_OK,
+                      content_type="application/json")
+
+        retry_all_task(hooklogs_ids)
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(json.loads(responses.calls[0].request.body), [
+            {"q1": "first"},
+            {"q1": "second"},
+        ])
+        for log in HookLog.objects.filter(id__in=hooklogs_ids):
+            self.assertEqual(log.status, HOOK_LOG_SUCCESS)
+            self.assertEqual(log.tries, 2)
+
+
+class HookQueueTestCase(TransactionTestCase):
+    fixtures = ["test_data"]
+
+    def setUp(self):
+        asset = Asset.objects.create(
+            owner=User.objects.get(username="someuser"),
+            content={"survey": [{"type": "text", "name": "q1"}]})
+        self.hook = Hook.objects.create(
+            asset=asset, name="batched external service",
+            endpoint="http://external.service.local/", batch_size=2)
+
+    def _queue_instance(self, instance_id):
+        try:
+            HookUtils.queue_instances(self.hook.pk, [instance_id],
+                                      self.hook.batch_size, 0)
+        finally:
+            connection.close()
+
+    def test_instance_queued_during_claim_is_sent(self):
+        with mock.patch("kobo.apps.hook.utils.batch_service_definition_task") as task:
+            HookUtils.queue_instances(self.hook.pk, [1], self.hook.batch_size, 0)
+            task.reset_mock()
+            with transaction.atomic():
+                hooklogs_ids, has_more = claim_batch(self.hook)
+                # Queue another instance before the claim is committed
+                thread = threading.Thread(target=self._queue_instance, args=(2,))
+                thread.start()
+                thread.join(1)
+                self.assertTrue(thread.is_alive())
+            thread.join()
+
+        self.assertEqual(len(hooklogs_ids), 1)
+        self.assertFalse(has_more)
+        # The new instance starts a new queue, with a task to send it
+        task.apply_async.assert_called_once_with(
+            args=(self.hook.pk,), countdown=0)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import mock
+import responses
+from rest_framework import status
+
+from .hook_test_case import HookTestCase
+from ..constants import HOOK_LOG_PENDING, HOOK_LOG_SUCCESS
+from ..dispatcher import HookDispatcher, TokenBucket
+from ..models import HookLog
+from ..tasks import dispatch_task
+
+
+class DispatcherTestCase(HookTestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=1, capacity=2)
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0)
+        self.assertGreater(bucket.take(), 0)
+
+    @responses.activate
+    def test_dispatch(self):
+        first_hook = self._create_hook(endpoint="http://first.service.local/")
+        second_hook = self._create_hook(endpoint="http://second.service.local/")
+        instance_id = self.asset.deployment.get_submissions()[0].get("id")
+        for hook in (first_hook, second_hook):
+            responses.add(responses.POST, hook.endpoint,
+                          status=status.HTTP_200_OK,
+                          content_type="application/json")
+
+        progress = mock.Mock()
+        dispatcher = HookDispatcher(max_workers=2,
+                                    max_concurrency_per_endpoint=1)
+        results = dispatcher.dispatch([(first_hook, instance_id),
+                                       (second_hook, instance_id)], progress)
+
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(progress.call_count, 2)
+        progress.assert_called_with(2, 2)
+        self.assertEqual(
+            sorted((hook.uid, success) for hook, _, success, _ in results),
+            sorted([(first_hook.uid, True), (second_hook.uid, True)])
+        )
+        for hook in (first_hook, second_hook):
+            log = HookLog.objects.get(hook=hook, instance_id=instance_id)
+            self.assertEqual(log.status, HOOK_LOG_SUCCESS)
+
+    @responses.activate
+    def test_dispatch_task_schedules_retries(self):
+        hook = self._create_hook()
+        instance_id = self.asset.deployment.get_submissions()[0].get("id")
+        responses.add(responses.POST, hook.endpoint,
+                      status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        with mock.patch.object(dispatch_task, "apply_async") as apply_async:
+            dispatch_task([[hook.id, instance_id]])
+
+        log = HookLog.objects.get(hook=hook, instance_id=instance_id)
+        self.assertEqual(log.status, HOOK_LOG_PENDING)
+        self.assertEqual(log.tries, 1)
+        self.assertEqual(log.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+        apply_async.assert_called_once_with(
+            args=([[hook.id, instance_id]],),
+            countdown=HookLog.get_remaining_seconds(0))
@@ -9,10 +9,13 @@ from django_celery_beat.models import PeriodicTask
 from django.template import Context
 from django.template.loader import get_template
 from django.utils import translation, dateparse
+import mock
 import responses
 from rest_framework import status
 
 from .hook_test_case import HookTestCase
+from ..constants import HOOK_LOG_FAILED
+from ..models import HookLog
 from ..tasks import failures_reports
 from kpi.constants import INSTANCE_FORMAT_TYPE_JSON
 
@@ -64,3 +67,13 @@ class EmailTestCase(HookTestCase):
         text_content = plain_text_template.render(Context(variables))
 
         self.assertEqual(mail.outbox[0].body, text_content)
+
+    @responses.activate
+    def test_notifications_are_capped(self):
+        self._create_periodisk_task()
+        self._send_and_fail()
+        HookLog.objects.create(hook=self.hook, instance_id=99, status=HOOK_LOG_FAILED)
+        with mock.patch("kobo.apps.hook.tasks.FAILURES_REPORTS_MAXIMUM_LOGS_PER_ASSET", 1):
+            failures_reports.delay()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("and 1 more", mail.outbox[0].body)
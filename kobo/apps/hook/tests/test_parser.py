@@ -67,3 +67,23 @@ class ParserTestCase(HookTestCase):
 
         self.assertEquals(remove_whitespace(service_definition._get_data()),
                           remove_whitespace(expected_xml))
+
+    def test_subset_fields_matcher(self):
+        hook = self._create_hook(subset_fields=["q1", "group1/q2"])
+        matcher = hook.get_subset_fields_matcher()
+        self.assertIs(hook.get_subset_fields_matcher(), matcher)
+        self.assertTrue(matcher.matches_key("q1"))
+        self.assertTrue(matcher.matches_key("group2/subgroup11/q1"))
+        self.assertFalse(matcher.matches_key("q11"))
+        self.assertTrue(matcher.matches_key("group1/q2"))
+        self.assertFalse(matcher.matches_key("group2/q2"))
+        self.assertTrue(matcher.matches_tag("q1"))
+        self.assertFalse(matcher.matches_tag("q2"))
+
+        # Saving the hook discards the matcher
+        hook.subset_fields = ["q3"]
+        hook.save()
+        new_matcher = hook.get_subset_fields_matcher()
+        self.assertIsNot(new_matcher, matcher)
+        self.assertTrue(new_matcher.matches_key("group1/q3"))
+        self.assertFalse(new_matcher.matches_key("q1"))
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+from django.db import transaction
+
+from .constants import HOOK_LOG_PENDING
+from .models.hook import Hook
 from .models.hook_log import HookLog
-from .tasks import service_definition_task
+from .tasks import batch_service_definition_task, dispatch_task
+
+# Maximum number of (hook, instance) pairs delivered by each `dispatch_task`
+MAXIMUM_JOBS_PER_TASK = 500
 
 
 class HookUtils(object):
@@ -14,15 +21,87 @@ class HookUtils(object):
 
         :param asset: Asset.
         :param instance_id: int. Instance primary key
+        :return: bool. Whether at least one hook has not received the
+            instance yet
+        """
+        instance_id = int(instance_id)
+        return instance_id in HookUtils.call_services_bulk(asset, [instance_id])
+
+    @staticmethod
+    def call_services_bulk(asset, instances_ids):
         """
+        Delegates to Celery data submission of many instances to remote
+        servers. Logs of all (hook, instance) pairs are looked up in one query,
+        and deliveries are grouped in as few tasks as possible.
+
+        :param asset: Asset.
+        :param instances_ids: list. Instance primary keys
+        :return: set. Ids of the instances that at least one hook has not
+            received yet
+        """
+        instances_ids = list(set(int(instance_id) for instance_id in instances_ids))
         # Retrieve `Hook` ids, to send data to their respective endpoint.
-        hooks_ids = asset.hooks.filter(active=True).values_list("id", flat=True).distinct()
-        # At least, one of the hooks must not have a log that corresponds to `instance_id`
-        # to make success equal True
-        success = False
-        for hook_id in hooks_ids:
-            if not HookLog.objects.filter(instance_id=instance_id, hook_id=hook_id).exists():
-                success = True
-                service_definition_task.delay(hook_id, instance_id)
-
-        return success
\ No newline at end of file
+        hooks = list(asset.hooks.filter(active=True).values_list(
+            "id", "batch_size", "batch_linger").distinct())
+        if not hooks or not instances_ids:
+            return set()
+
+        existing_pairs = set(HookLog.objects.filter(
+            hook_id__in=[hook[0] for hook in hooks],
+            instance_id__in=instances_ids
+        ).order_by().values_list("hook_id", "instance_id"))
+
+        called_instances_ids = set()
+        jobs = []
+        for hook_id, batch_size, batch_linger in hooks:
+            new_instances_ids = [
+                instance_id for instance_id in instances_ids
+                if (hook_id, instance_id) not in existing_pairs
+            ]
+            if not new_instances_ids:
+                continue
+            called_instances_ids.update(new_instances_ids)
+            if batch_size > 1:
+                HookUtils.queue_instances(
+                    hook_id, new_instances_ids, batch_size, batch_linger)
+            else:
+                jobs.extend([hook_id, instance_id]
+                            for instance_id in new_instances_ids)
+
+        for start in xrange(0, len(jobs), MAXIMUM_JOBS_PER_TASK):
+            dispatch_task.delay(jobs[start:start + MAXIMUM_JOBS_PER_TASK])
+
+        return called_instances_ids
+
+    @staticmethod
+    def queue_instances(hook_id, instances_ids, batch_size, batch_linger):
+        """
+        Adds `instances_ids` to the queue of instances waiting to be sent in
+        batch, as pending logs that have never been tried.
+        A task is scheduled when the queue starts, to send it after
+        `batch_linger` seconds, or right away when a batch fills up.
+
+        :param hook_id: int. Hook primary key
+        :param instances_ids: list. Instance primary keys
+        :param batch_size: int.
+        :param batch_linger: int. Number of seconds
+        """
+        with transaction.atomic():
+            # Lock the hook, like `claim_batch()` does. Otherwise, instances
+            # added while a batch is claimed would be neither claimed nor
+            # counted as the start of a new queue, and could wait forever
+            list(Hook.objects.select_for_update().filter(pk=hook_id).values_list("pk"))
+            queued_count = HookLog.objects.filter(
+                hook_id=hook_id, status=HOOK_LOG_PENDING, tries=0).count()
+            HookLog.objects.bulk_create([
+                HookLog(hook_id=hook_id, instance_id=instance_id)
+                for instance_id in instances_ids
+            ])
+            Hook.update_counters(hook_id, {HOOK_LOG_PENDING: len(instances_ids)})
+
+        # Each task sends one batch and schedules another if more remain
+        if (queued_count + len(instances_ids)) // batch_size > queued_count // batch_size:
+            batch_service_definition_task.delay(hook_id)
+        elif queued_count == 0:
+            batch_service_definition_task.apply_async(
+                args=(hook_id,), countdown=batch_linger)
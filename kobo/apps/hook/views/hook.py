@@ -74,6 +74,8 @@ class HookViewSet(NestedViewSetMixin, viewsets.ModelViewSet):
     >           "email_notification": {boolean},
     >           "export_type": {string},
     >           "subset_fields": [{string}],
+    >           "batch_size": {integer},
+    >           "batch_linger": {integer},
     >           "auth_level": {string},
     >           "settings": {
     >               "username": {string},
@@ -102,6 +104,9 @@ class HookViewSet(NestedViewSetMixin, viewsets.ModelViewSet):
         2. `basic_auth`
 
     * `subset_fields` is the list of fields of the form definition. Only these fields should be present in data sent to remote server
+    * `batch_size` is the maximum number of submissions sent together in one request (_default_ `1`).
+    When greater than `1`, data is sent as a list (JSON) or within a `<submissions>` element (XML)
+    * `batch_linger` is the number of seconds to wait for more submissions before sending an incomplete batch (_default_ `0`)
     * `settings`.`custom_headers` is dictionary of `custom header`: `value`
 
     For example:
@@ -187,7 +192,7 @@ class HookViewSet(NestedViewSetMixin, viewsets.ModelViewSet):
 
             if len(records) > 0:
                 # Mark all logs as PENDING
-                HookLog.objects.filter(id__in=hooklogs_ids).update(status=HOOK_LOG_PENDING)
+                HookLog.bulk_change_status(HookLog.objects.filter(id__in=hooklogs_ids), HOOK_LOG_PENDING)
                 # Delegate to Celery
                 retry_all_task.delay(hooklogs_ids)
                 response.update({
@@ -2,39 +2,79 @@
 from __future__ import unicode_literals
 
 import itertools
-from collections import OrderedDict
+import threading
+from collections import Counter, OrderedDict
 from copy import deepcopy
 
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils.translation import ugettext as _
 from formpack import FormPack
 from rest_framework import serializers
 
 from .constants import SPECIFIC_REPORTS_KEY, DEFAULT_REPORTS_KEY
+from kpi.constants import SUBMISSION_VERSION_KEYS
 from kpi.utils.log import logging
 
+INFERRED_VERSION_ID_KEY = '__inferred_version__'
+# Number of `FormPack`s kept by each process; see `_get_formpack()`
+MAXIMUM_CACHED_FORMPACKS = 100
+# Number of distinct combinations of version keys for which each submission
+# stream remembers the inferred version; see `make_version_id_inferrer()`
+MAXIMUM_CACHED_VERSION_INFERENCES = 10000
 
-def build_formpack(asset, submission_stream=None, use_all_form_versions=True):
+_formpack_cache = OrderedDict()
+_formpack_cache_lock = threading.Lock()
+
+
+def get_submission_keys(contents, field_names=None):
     '''
-    Return a tuple containing a `FormPack` instance and the iterable stream of
-    submissions for the given `asset`. If `use_all_form_versions` is `False`,
-    then only the newest version of the form is considered, and all submissions
-    are assumed to have been collected with that version of the form.
+    Return the set of top-level submission keys that hold the responses to
+    `field_names`, or to every field when `field_names` is `None`, in any of
+    the given expanded form `contents`. Responses inside a repeat group are
+    nested beneath the key of the outermost repeat group, so that key is
+    returned instead
     '''
-    FUZZY_VERSION_ID_KEY = '_version_'
-    INFERRED_VERSION_ID_KEY = '__inferred_version__'
+    keys = set()
+    for content in contents:
+        # Each element is a tuple of the group name and whether or not the
+        # group repeats
+        groups = []
+        for row in content.get('survey', []):
+            row_type = row.get('type', '').replace(' ', '_')
+            if row_type.startswith('end_'):
+                if groups:
+                    groups.pop()
+                continue
+            names = {row.get('name'), row.get('$autoname')} - {None}
+            if row_type.startswith('begin_'):
+                groups.append(
+                    (next(iter(names), None), row_type == 'begin_repeat'))
+                continue
+            if field_names is not None and not names.intersection(field_names):
+                continue
+            path = []
+            for group_name, repeats in groups:
+                path.append(group_name)
+                if repeats:
+                    break
+            else:
+                for name in names:
+                    keys.add('/'.join(path + [name]))
+                continue
+            keys.add('/'.join(path))
+    return keys
 
-    if not asset.has_deployment:
-        raise Exception('Cannot build formpack for asset without deployment')
-
-    if use_all_form_versions:
-        _versions = asset.deployed_versions
-    else:
-        _versions = [asset.deployed_versions.first()]
 
+def _build_formpack_for_versions(asset, versions):
+    '''
+    Build the cache entry described by `_get_formpack()` for the given
+    `AssetVersion`s, which must be ordered from newest to oldest
+    '''
     schemas = []
+    contents = []
     version_ids_newest_first = []
-    for v in _versions:
+    for v in versions:
         try:
             fp_schema = v.to_formpack_schema()
         # FIXME: should FormPack validation errors have their own
@@ -49,6 +89,7 @@ def build_formpack(asset, submission_stream=None, use_all_form_versions=True):
         else:
             fp_schema['version_id_key'] = INFERRED_VERSION_ID_KEY
             schemas.append(fp_schema)
+            contents.append(fp_schema['content'])
             version_ids_newest_first.append(v.uid)
             if v.uid_aliases:
                 version_ids_newest_first.extend(v.uid_aliases)
@@ -62,47 +103,151 @@ def build_formpack(asset, submission_stream=None, use_all_form_versions=True):
     # Find the AssetVersion UID for each deprecated reversion ID
     _reversion_ids = dict([
         (str(v._reversion_version_id), v.uid)
-            for v in _versions if v._reversion_version_id
+            for v in versions if v._reversion_version_id
     ])
 
+    return (
+        pack,
+        contents,
+        version_ids_newest_first,
+        get_version_ranks(version_ids_newest_first, _reversion_ids)
+    )
+
+
+def get_version_ranks(version_ids_newest_first, reversion_ids):
+    '''
+    Return a dictionary mapping each id that a submission may use to refer to
+    a version, including deprecated reversion ids, to the position of that
+    version in `version_ids_newest_first`. Lower is newer
+    '''
+    version_ranks = {}
+    for rank, version_id in enumerate(version_ids_newest_first):
+        version_ranks.setdefault(version_id, rank)
+    # A reversion id always stands for its AssetVersion, even if it is
+    # otherwise unknown
+    for reversion_id, version_id in reversion_ids.iteritems():
+        if version_id in version_ranks:
+            version_ranks[reversion_id] = version_ranks[version_id]
+        else:
+            version_ranks.pop(reversion_id, None)
+    return version_ranks
+
+
+def make_version_id_inferrer(version_ids_newest_first, version_ranks):
+    '''
+    Return a function that sets `INFERRED_VERSION_ID_KEY` in a submission to
+    the newest version referred to by any of its `SUBMISSION_VERSION_KEYS`,
+    or to the newest version of all if none is recognized, and returns the
+    submission. `version_ranks` comes from `get_version_ranks()`. Most
+    submissions share a handful of combinations of version ids, so the
+    result for each combination is remembered
+    '''
+    inferred_version_ids = {}
+
+    def infer_version_id(submission):
+        submission_version_ids = tuple(
+            map(submission.get, SUBMISSION_VERSION_KEYS))
+        try:
+            inferred_version_id = inferred_version_ids[submission_version_ids]
+        except KeyError:
+            ranks = [
+                version_ranks[version_id]
+                    for version_id in submission_version_ids
+                    if version_id in version_ranks
+            ]
+            inferred_version_id = version_ids_newest_first[min(ranks or [0])]
+            if len(inferred_version_ids) >= MAXIMUM_CACHED_VERSION_INFERENCES:
+                inferred_version_ids.clear()
+            inferred_version_ids[submission_version_ids] = inferred_version_id
+        submission[INFERRED_VERSION_ID_KEY] = inferred_version_id
+        return submission
+
+    return infer_version_id
+
+
+def _get_formpack(asset, use_all_form_versions=True):
+    '''
+    Return a tuple containing a `FormPack` instance for the deployed versions
+    of `asset` (or only the newest one if `use_all_form_versions` is
+    `False`), their expanded contents, the ids that submissions may use to
+    refer to those versions from newest to oldest, and the version ranks
+    described by `get_version_ranks()`.
+
+    Deployed versions never change, so the result is cached by each process
+    for the most recently used `MAXIMUM_CACHED_FORMPACKS` combinations of
+    asset, title and version UIDs. Callers must not modify it
+    '''
+    deployed_versions = asset.deployed_versions
+    if not use_all_form_versions:
+        deployed_versions = deployed_versions[:1]
+    key = (
+        asset.uid,
+        asset.name,
+        tuple(deployed_versions.values_list('uid', flat=True)),
+    )
+    with _formpack_cache_lock:
+        try:
+            # Move the entry to the most recently used end
+            entry = _formpack_cache.pop(key)
+        except KeyError:
+            pass
+        else:
+            _formpack_cache[key] = entry
+            return entry
+
+    versions = list(deployed_versions)
+    entry = _build_formpack_for_versions(asset, versions)
+    # The versions may have been deployed since the key was built
+    key = key[:2] + (tuple(v.uid for v in versions),)
+    with _formpack_cache_lock:
+        _formpack_cache[key] = entry
+        while len(_formpack_cache) > MAXIMUM_CACHED_FORMPACKS:
+            _formpack_cache.popitem(last=False)
+    return entry
+
+
+def build_formpack(asset, submission_stream=None, use_all_form_versions=True,
+                   field_names=None, submitted_after=None, start_after=None,
+                   end_at=None):
+    '''
+    Return a tuple containing a `FormPack` instance and the iterable stream of
+    submissions for the given `asset`. If `use_all_form_versions` is `False`,
+    then only the newest version of the form is considered, and all submissions
+    are assumed to have been collected with that version of the form. When
+    `submission_stream` is not provided, only the keys needed by
+    `field_names`, or by all fields if `None`, are retrieved from the
+    deployment, and only those submitted after the `submitted_after` datetime
+    and with an `_id` greater than `start_after` and at most `end_at` if they
+    are given.
+    '''
+    if not asset.has_deployment:
+        raise Exception('Cannot build formpack for asset without deployment')
+
+    pack, contents, version_ids_newest_first, version_ranks = _get_formpack(
+        asset, use_all_form_versions)
+
     # A submission often contains many version keys, e.g. `__version__`,
     # `_version_`, `_version__001`, `_version__002`, each with a different
     # version id (see https://github.com/kobotoolbox/kpi/issues/1465). To cope,
     # assume that the newest version of this asset whose id appears in the
     # submission is the proper one to use
-    def _infer_version_id(submission):
-        if not use_all_form_versions:
+    if use_all_form_versions:
+        _infer_version_id = make_version_id_inferrer(
+            version_ids_newest_first, version_ranks)
+    else:
+        def _infer_version_id(submission):
             submission[INFERRED_VERSION_ID_KEY] = version_ids_newest_first[0]
             return submission
 
-        submission_version_ids = [
-            val for key, val in submission.iteritems()
-                if FUZZY_VERSION_ID_KEY in key
-        ]
-        # Replace any deprecated reversion IDs with the UIDs of their
-        # corresponding AssetVersions
-        submission_version_ids = [
-            _reversion_ids[x] if x in _reversion_ids
-                else x for x in submission_version_ids
-        ]
-        inferred_version_id = None
-        for extant_version_id in version_ids_newest_first:
-            if extant_version_id in submission_version_ids:
-                inferred_version_id = extant_version_id
-                break
-        if not inferred_version_id:
-            # Fall back on the latest version
-            # TODO: log a warning?
-            inferred_version_id = version_ids_newest_first[0]
-        submission[INFERRED_VERSION_ID_KEY] = inferred_version_id
-        return submission
-
     if submission_stream is None:
         _userform_id = asset.deployment.mongo_userform_id
         if not _userform_id.startswith(asset.owner.username):
             raise Exception('asset has unexpected `mongo_userform_id`')
 
-        submission_stream = asset.deployment.get_submissions()
+        submission_stream = asset.deployment.get_submissions(
+            fields=get_submission_keys(contents, field_names),
+            submitted_after=submitted_after, start_after=start_after,
+            end_at=end_at)
 
     submission_stream = (
         _infer_version_id(submission) for submission in submission_stream
@@ -121,10 +266,118 @@ def _vnames(asset, cache=False):
     return asset._available_report_uids
 
 
+def _count_responses(counters, fields, versions, submission_stream):
+    '''
+    Tally the responses in `submission_stream` into `counters`, a dictionary
+    of `Counter`s keyed by field name, the same way that formpack's
+    `AutoReport` does before calculating statistics. Returns the number of
+    submissions read and the greatest `_id` among them
+    '''
+    submission_count = 0
+    last_submission_id = None
+    for submission in submission_stream:
+        submission_count += 1
+        last_submission_id = max(last_submission_id, submission.get('_id'))
+        if submission.get(INFERRED_VERSION_ID_KEY) not in versions:
+            continue
+        for field in fields:
+            if not field.has_stats:
+                continue
+            counter = counters.setdefault(field.name, Counter())
+            raw_value = submission.get(field.path)
+            if raw_value is None:
+                counter[None] += 1
+            else:
+                counter.update(field.parse_values(raw_value))
+                counter['__submissions__'] += 1
+    return submission_count, last_submission_id
+
+
+def get_report_counters(asset):
+    '''
+    Return a tuple containing a `FormPack` instance for the given `asset` and
+    the response tallies for each of its fields, as kept by its
+    `AssetReportAggregate`. Only the submissions received since the tallies
+    were last saved are read, unless the deployed versions have changed or
+    submissions have been deleted, in which case the tallies start over.
+    Edits to submissions that have already been tallied are not noticed,
+    which is why reports only use this when `INCREMENTAL_REPORTS` is enabled
+    '''
+    # Avoid a circular import
+    from kpi.models import AssetReportAggregate
+
+    try:
+        with transaction.atomic():
+            aggregate = AssetReportAggregate.objects.get_or_create(
+                asset=asset)[0]
+    except IntegrityError:
+        # A concurrent request created the tallies meanwhile
+        aggregate = AssetReportAggregate.objects.get(asset=asset)
+    pack, submission_stream = build_formpack(
+        asset, asset.deployment.get_submissions(
+            start_after=aggregate.last_submission_id)
+    )
+    versions = sorted(pack.versions.keys())
+    fields = pack.get_fields_for_versions(versions=versions)
+    reset = aggregate.versions != versions
+    if reset:
+        if aggregate.last_submission_id is not None:
+            submission_stream = build_formpack(
+                asset, asset.deployment.get_submissions())[1]
+        aggregate.reset(versions)
+
+    counters = aggregate.get_counters()
+    submission_count, last_submission_id = _count_responses(
+        counters, fields, versions, submission_stream)
+    if (
+            not reset and
+            aggregate.submission_count + submission_count !=
+            asset.deployment.submission_count
+    ):
+        # Some tallied submissions have been deleted
+        reset = True
+        aggregate.reset(versions)
+        counters = {}
+        submission_count, last_submission_id = _count_responses(
+            counters, fields, versions, build_formpack(
+                asset, asset.deployment.get_submissions())[1]
+        )
+
+    if submission_count and last_submission_id is None:
+        # Without `_id`s, there would be no way to resume later
+        return pack, counters
+    if submission_count or reset:
+        aggregate.submission_count += submission_count
+        aggregate.last_submission_id = max(
+            aggregate.last_submission_id, last_submission_id)
+        aggregate.set_counters(counters)
+        aggregate.save()
+    return pack, counters
+
+
 def data_by_identifiers(asset, field_names=None, submission_stream=None,
                         report_styles=None, lang=None, fields=None,
                         split_by=None):
-    pack, submission_stream = build_formpack(asset, submission_stream)
+    '''
+    Return the report statistics for `field_names`, or for every field if
+    `None`, of the given `asset`. When `INCREMENTAL_REPORTS` is enabled and
+    neither `submission_stream` nor `split_by` is given, the statistics are
+    calculated from the tallies kept by `get_report_counters()` instead of
+    from every submission
+    '''
+    counters = None
+    if (settings.INCREMENTAL_REPORTS and submission_stream is None and
+            not split_by):
+        pack, counters = get_report_counters(asset)
+    else:
+        if field_names is None:
+            stream_field_names = None
+        else:
+            stream_field_names = list(field_names)
+            if split_by:
+                stream_field_names.append(split_by)
+        pack, submission_stream = build_formpack(
+            asset, submission_stream, field_names=stream_field_names)
     _all_versions = pack.versions.keys()
     report = pack.autoreport(versions=_all_versions)
     fields_by_name = OrderedDict([
@@ -171,9 +424,21 @@ def data_by_identifiers(asset, field_names=None, submission_stream=None,
             'style': specified_styles.get(identifier, {}),
         }
 
+    if counters is None:
+        stats = report.get_stats(submission_stream,
+                                 fields=field_names,
+                                 lang=lang,
+                                 split_by=split_by)
+    else:
+        requested_field_names = set(field_names)
+        stats = [
+            # `get_stats()` consumes its argument, so pass a copy
+            (field, None, field.get_stats(
+                Counter(counters.get(field.name, {})), lang=lang))
+            for field in fields_by_name.itervalues()
+                if field.name in requested_field_names
+        ]
+
     return [_package_stat(*stat_tup, split_by=split_by) for
-            stat_tup in report.get_stats(submission_stream,
-                                         fields=field_names,
-                                         lang=lang,
-                                         split_by=split_by)
+            stat_tup in stats
     ]
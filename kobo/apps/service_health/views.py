@@ -5,6 +5,7 @@ from django.conf import settings
 from django.http import HttpResponse
 
 from kpi.models import Asset
+from kpi.models.object_permission import get_permission_cache_stats
 
 
 def get_response(url_):
@@ -69,18 +70,22 @@ def service_health(request):
     any_failure = True if failure else any_failure
     kobocat_time = time.time() - t0
 
+    permission_cache_stats = get_permission_cache_stats()
+
     output = (
         u'{}\r\n\r\n'
         u'Mongo: {} in {:.3} seconds\r\n'
         u'Postgres: {} in {:.3} seconds\r\n'
         u'Enketo [{}]: {} in {:.3} seconds\r\n'
         u'KoBoCAT [{}]: {} in {:.3} seconds\r\n'
+        u'Permission cache (this process): {} hits, {} misses\r\n'
     ).format(
         'FAIL' if any_failure else 'OK',
         mongo_message, mongo_time,
         postgres_message, postgres_time,
         settings.ENKETO_INTERNAL_URL, enketo_message, enketo_time,
-        settings.KOBOCAT_INTERNAL_URL, kobocat_message, kobocat_time
+        settings.KOBOCAT_INTERNAL_URL, kobocat_message, kobocat_time,
+        permission_cache_stats['hits'], permission_cache_stats['misses']
     )
 
     if kobocat_content:
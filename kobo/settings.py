@@ -187,6 +187,15 @@ ALLOWED_ANONYMOUS_PERMISSIONS = (
     'kpi.view_submissions',
 )
 
+# Name of a cache, listed in `CACHES`, used to share resolved object
+# permissions between requests and processes. It must be shared by every
+# process (e.g. Redis or Memcached, but not the default local-memory cache).
+# When unset, permissions are cached only for the lifetime of each object
+# instance, i.e. usually a single request
+OBJECT_PERMISSION_CACHE = os.environ.get('OBJECT_PERMISSION_CACHE') or None
+OBJECT_PERMISSION_CACHE_TIMEOUT = int(
+    os.environ.get('OBJECT_PERMISSION_CACHE_TIMEOUT', 3600))
+
 # run heavy migration scripts by default
 # NOTE: this should be set to False for major deployments. This can take a long time
 SKIP_HEAVY_MIGRATIONS = os.environ.get('SKIP_HEAVY_MIGRATIONS', 'False') == 'True'
@@ -230,6 +239,53 @@ CAN_LOGIN_AS = lambda request, target_user: request.user.is_superuser
 
 # REMOVE the oldest if a user exceeds this many exports for a particular form
 MAXIMUM_EXPORTS_PER_USER_PER_FORM = 10
+# Number of submissions rendered by each Celery task of a sharded export
+EXPORT_SHARD_SIZE = int(os.environ.get('EXPORT_SHARD_SIZE', 50000))
+# Stop reusing the oldest export results for a particular form once the newer
+# ones reach this many bytes in total
+MAXIMUM_EXPORT_CACHE_BYTES_PER_FORM = int(os.environ.get(
+    'MAXIMUM_EXPORT_CACHE_BYTES_PER_FORM', 500 * 1024 * 1024))
+# Calculate reports from running tallies of the responses, reading only the
+# submissions received since the last report. Edits to submissions that were
+# already tallied are not reflected until the tallies start over, i.e. when a
+# new version is deployed or a submission is deleted
+INCREMENTAL_REPORTS = (
+    os.environ.get('INCREMENTAL_REPORTS', 'False') == 'True')
+# Remove XForm XML cached by `kpi.models.CachedXForm` once it has not been
+# used for this many days, or when more recently used XML exceeds this many
+# entries
+XFORM_CACHE_MAXIMUM_AGE_DAYS = int(os.environ.get(
+    'XFORM_CACHE_MAXIMUM_AGE_DAYS', 30))
+XFORM_CACHE_MAXIMUM_ENTRIES = int(os.environ.get(
+    'XFORM_CACHE_MAXIMUM_ENTRIES', 20000))
+# Remove `AssetSnapshot`s created more than this many days ago, except those
+# of the latest versions of assets
+ASSET_SNAPSHOT_MAXIMUM_AGE_DAYS = int(os.environ.get(
+    'ASSET_SNAPSHOT_MAXIMUM_AGE_DAYS', 7))
+# Generate the snapshot of each new version of a survey or template in the
+# background, once no newer version has been created for this many seconds,
+# instead of when it is first viewed
+PREGENERATE_ASSET_SNAPSHOTS = (
+    os.environ.get('PREGENERATE_ASSET_SNAPSHOTS', 'False') == 'True')
+ASSET_SNAPSHOT_PREGENERATION_DELAY = int(os.environ.get(
+    'ASSET_SNAPSHOT_PREGENERATION_DELAY', 10))
+# Store most new `AssetVersion`s as patches against the latest version of the
+# same asset that is stored in full, and store every this many versions in full
+ASSET_VERSION_DELTA_STORAGE = (
+    os.environ.get('ASSET_VERSION_DELTA_STORAGE', 'False') == 'True')
+ASSET_VERSION_KEYFRAME_INTERVAL = int(os.environ.get(
+    'ASSET_VERSION_KEYFRAME_INTERVAL', 50))
+
+# Number of requests that each task of `kobo.apps.hook.dispatcher` may have
+# in flight to REST services in total, and to any one host
+HOOK_DISPATCHER_MAX_WORKERS = int(os.environ.get(
+    'HOOK_DISPATCHER_MAX_WORKERS', 50))
+HOOK_MAX_CONCURRENCY_PER_ENDPOINT = int(os.environ.get(
+    'HOOK_MAX_CONCURRENCY_PER_ENDPOINT', 4))
+# Number of requests per second that each process sends to any one host on
+# average, and in a burst
+HOOK_RATE_PER_ENDPOINT = float(os.environ.get('HOOK_RATE_PER_ENDPOINT', 10))
+HOOK_BURST_PER_ENDPOINT = int(os.environ.get('HOOK_BURST_PER_ENDPOINT', 20))
 
 # Private media file configuration
 PRIVATE_STORAGE_ROOT = os.path.join(BASE_DIR, 'media')
@@ -426,6 +482,12 @@ CELERY_BEAT_SCHEDULE = {
         "task": "kobo.apps.hook.tasks.failures_reports",
         "schedule": crontab(hour=0, minute=0),
     },
+    # Apply the eviction policy of `AssetSnapshot`s and `CachedXForm`s every
+    # day at 1 AM UTC
+    'clean-xform-cache': {
+        'task': 'kpi.tasks.clean_xform_cache',
+        'schedule': crontab(hour=1, minute=0),
+    },
 }
 
 if 'KOBOCAT_URL' in os.environ:
@@ -673,6 +735,8 @@ else:
 MONGO_CONNECTION = MongoClient(
     MONGO_CONNECTION_URL, j=True, tz_aware=True, connect=False)
 MONGO_DB = MONGO_CONNECTION[MONGO_DATABASE['NAME']]
+# Number of submissions fetched from Mongo per round trip when streaming
+MONGO_CURSOR_BATCH_SIZE = int(os.environ.get('MONGO_CURSOR_BATCH_SIZE', 1000))
 
 RECAPTCHA_SITE_KEY = os.environ.get('RECAPTCHA_SITE_KEY')
 RECAPTCHA_SECRET_KEY = os.environ.get('RECAPTCHA_SECRET_KEY')
@@ -2,6 +2,18 @@
 INSTANCE_FORMAT_TYPE_XML = "xml"
 INSTANCE_FORMAT_TYPE_JSON = "json"
 
+# KoBoCAT stores `_submission_time` in Mongo as a naive UTC string with
+# per-second resolution
+SUBMISSION_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# Keys that may hold the id of the form version used for a submission. A
+# submission may contain several; see
+# https://github.com/kobotoolbox/kpi/issues/1465
+SUBMISSION_VERSION_KEYS = (
+    "__version__",
+    "_version_",
+) + tuple("_version__{:03d}".format(i) for i in range(1, 10))
+
 ASSET_TYPE_TEXT = 'text'
 ASSET_TYPE_EMPTY = 'empty'
 ASSET_TYPE_QUESTION = 'question'
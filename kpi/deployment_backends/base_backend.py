@@ -43,6 +43,18 @@ class BaseDeploymentBackend(object):
     def last_submission_time(self):
         return self._last_submission_time()
 
+    @property
+    def last_modification_time(self):
+        return self._last_modification_time()
+
+    def get_last_modification_time(self, submitted_before=None):
+        '''
+        Return the latest time at which any submission received no later
+        than `submitted_before`, or any submission at all if it is `None`, was
+        saved, including edits and changes to its validation status
+        '''
+        return self._last_modification_time(submitted_before)
+
     @property
     def mongo_userform_id(self):
         return None
@@ -6,6 +6,7 @@ from django.contrib.auth.models import User, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core.checks import Warning, register as register_check
 from django.db import ProgrammingError, transaction
+from django.db.models import Max, Q
 from rest_framework.authtoken.models import Token
 import requests
 
@@ -47,6 +48,19 @@ def last_submission_time(xform_id_string, user_id):
         user_id=user_id, id_string=xform_id_string
     ).last_submission_time
 
+@safe_kc_read
+def last_modification_time(xform_id_string, user_id, submitted_before=None):
+    '''
+    Return the latest time at which any submission to the form, received no
+    later than `submitted_before` if given, was saved, including edits and
+    changes to its validation status
+    '''
+    instances = _models.Instance.objects.filter(
+        xform__user_id=user_id, xform__id_string=xform_id_string)
+    if submitted_before is not None:
+        instances = instances.filter(date_created__lte=submitted_before)
+    return instances.aggregate(Max('date_modified'))['date_modified__max']
+
 @safe_kc_read
 def get_kc_profile_data(user_id):
     '''
@@ -237,31 +251,7 @@ def assign_applicable_kc_permissions(obj, user, kpi_codenames):
         :type user: :py:class:`User` or :py:class:`AnonymousUser`
         :type kpi_codenames: str or list(str)
     """
-    if not obj._meta.model_name == 'asset':
-        return
-    permissions = _get_applicable_kc_permissions(obj, kpi_codenames)
-    if not permissions:
-        return
-    xform_id = _get_xform_id_for_asset(obj)
-    if not xform_id:
-        return
-    if user.is_anonymous() or user.pk == settings.ANONYMOUS_USER_ID:
-        return set_kc_anonymous_permissions_xform_flags(
-            obj, kpi_codenames, xform_id)
-    xform_content_type = ContentType.objects.get(**obj.KC_CONTENT_TYPE_KWARGS)
-    UserObjectPermission = _models.UserObjectPermission
-    kc_permissions_already_assigned = UserObjectPermission.objects.filter(
-        user=user, permission__in=permissions, object_pk=xform_id,
-    ).values_list('permission__codename', flat=True)
-    permissions_to_create = []
-    for permission in permissions:
-        if permission.codename in kc_permissions_already_assigned:
-            continue
-        permissions_to_create.append(UserObjectPermission(
-            user=user, permission=permission, object_pk=xform_id,
-            content_type=xform_content_type
-        ))
-    UserObjectPermission.objects.bulk_create(permissions_to_create)
+    bulk_assign_applicable_kc_permissions(obj, {user: kpi_codenames})
 
 
 @transaction.atomic()
@@ -275,20 +265,130 @@ def remove_applicable_kc_permissions(obj, user, kpi_codenames):
         :type user: :py:class:`User` or :py:class:`AnonymousUser`
         :type kpi_codenames: str or list(str)
     """
-    if not obj._meta.model_name == 'asset':
-        return
-    permissions = _get_applicable_kc_permissions(obj, kpi_codenames)
+    bulk_remove_applicable_kc_permissions(obj, {user: kpi_codenames})
+
+
+def _get_kc_permission_pks_by_user(obj, codenames_by_user, permissions):
+    r"""
+        Given a mapping of users to KPI permission codenames and the KC
+        `Permission`s applicable to all of those codenames, return a
+        dictionary that maps the primary key of each user to the primary keys
+        of the KC permissions that apply to that user alone
+    """
+    permission_pks_by_kc_codename = {p.codename: p.pk for p in permissions}
+    permission_pks_by_user_pk = {}
+    for user, kpi_codenames in codenames_by_user.iteritems():
+        if isinstance(kpi_codenames, basestring):
+            kpi_codenames = [kpi_codenames]
+        permission_pks = set()
+        for kpi_codename in kpi_codenames:
+            try:
+                permission_pks.add(permission_pks_by_kc_codename[
+                    obj.KC_PERMISSIONS_MAP[kpi_codename]])
+            except KeyError:
+                # This permission doesn't map to anything in KC
+                continue
+        if permission_pks:
+            permission_pks_by_user_pk[user.pk] = permission_pks
+    return permission_pks_by_user_pk
+
+
+def _prepare_kc_permissions_change(obj, codenames_by_user, remove=False):
+    r"""
+        Shared setup of the functions that assign or remove KC permissions:
+        switch the KC `XForm` flags for the anonymous user, if present in
+        `codenames_by_user`, and work out the KC permissions of the other
+        users. Return a tuple of the PK of the KC `XForm`, the applicable KC
+        `Permission`s and the dictionary returned by
+        `_get_kc_permission_pks_by_user()`, or `None` if there is nothing
+        else to do
+        :param obj: Any Django model instance
+        :type codenames_by_user: dict(:py:class:`User`, str or list(str))
+        :param remove: Whether the permissions are being removed
+    """
+    if not obj._meta.model_name == 'asset' or not codenames_by_user:
+        return None
+    all_codenames = set()
+    for kpi_codenames in codenames_by_user.itervalues():
+        if isinstance(kpi_codenames, basestring):
+            kpi_codenames = [kpi_codenames]
+        all_codenames.update(kpi_codenames)
+    permissions = list(_get_applicable_kc_permissions(obj, all_codenames))
     if not permissions:
-        return
+        return None
     xform_id = _get_xform_id_for_asset(obj)
     if not xform_id:
+        return None
+    regular_codenames_by_user = {}
+    for user, kpi_codenames in codenames_by_user.iteritems():
+        if user.is_anonymous() or user.pk == settings.ANONYMOUS_USER_ID:
+            set_kc_anonymous_permissions_xform_flags(
+                obj, kpi_codenames, xform_id, remove=remove)
+        else:
+            regular_codenames_by_user[user] = kpi_codenames
+    permission_pks_by_user_pk = _get_kc_permission_pks_by_user(
+        obj, regular_codenames_by_user, permissions)
+    if not permission_pks_by_user_pk:
+        return None
+    return xform_id, permissions, permission_pks_by_user_pk
+
+
+@transaction.atomic()
+def bulk_assign_applicable_kc_permissions(obj, codenames_by_user):
+    r"""
+        Like `assign_applicable_kc_permissions()`, but for many users at once
+        using a fixed number of queries. `codenames_by_user` maps each user to
+        one KPI permission codename as a single string or many codenames as an
+        iterable.
+        :param obj: Any Django model instance
+        :type codenames_by_user: dict(:py:class:`User`, str or list(str))
+    """
+    prepared = _prepare_kc_permissions_change(obj, codenames_by_user)
+    if prepared is None:
+        return
+    xform_id, permissions, permission_pks_by_user_pk = prepared
+    xform_content_type = ContentType.objects.get(**obj.KC_CONTENT_TYPE_KWARGS)
+    UserObjectPermission = _models.UserObjectPermission
+    kc_permissions_already_assigned = set(
+        UserObjectPermission.objects.filter(
+            user_id__in=permission_pks_by_user_pk.keys(),
+            permission__in=permissions,
+            object_pk=xform_id,
+        ).values_list('user_id', 'permission_id')
+    )
+    permissions_to_create = []
+    for user_pk, permission_pks in permission_pks_by_user_pk.iteritems():
+        for permission_pk in permission_pks:
+            if (user_pk, permission_pk) in kc_permissions_already_assigned:
+                continue
+            permissions_to_create.append(UserObjectPermission(
+                user_id=user_pk, permission_id=permission_pk,
+                object_pk=xform_id, content_type=xform_content_type
+            ))
+    UserObjectPermission.objects.bulk_create(permissions_to_create)
+
+
+@transaction.atomic()
+def bulk_remove_applicable_kc_permissions(obj, codenames_by_user):
+    r"""
+        Like `remove_applicable_kc_permissions()`, but for many users at once
+        using a fixed number of queries. `codenames_by_user` maps each user to
+        one KPI permission codename as a single string or many codenames as an
+        iterable.
+        :param obj: Any Django model instance
+        :type codenames_by_user: dict(:py:class:`User`, str or list(str))
+    """
+    prepared = _prepare_kc_permissions_change(
+        obj, codenames_by_user, remove=True)
+    if prepared is None:
         return
-    if user.is_anonymous() or user.pk == settings.ANONYMOUS_USER_ID:
-        return set_kc_anonymous_permissions_xform_flags(
-            obj, kpi_codenames, xform_id, remove=True)
+    xform_id, permissions, permission_pks_by_user_pk = prepared
+    query = Q()
+    for user_pk, permission_pks in permission_pks_by_user_pk.iteritems():
+        query |= Q(user_id=user_pk, permission_id__in=permission_pks)
     content_type_kwargs = _get_content_type_kwargs(obj)
     _models.UserObjectPermission.objects.filter(
-        user=user, permission__in=permissions, object_pk=xform_id,
+        query, object_pk=xform_id,
         # `permission` has a FK to `ContentType`, but I'm paranoid
         **content_type_kwargs
     ).delete()
@@ -13,6 +13,8 @@ import posixpath
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import ugettext_lazy as _
+from pymongo import ASCENDING
+from pymongo.errors import CursorNotFound
 from pyxform.xls2json_backends import xls_to_dict
 from rest_framework import exceptions, status, serializers
 from rest_framework.request import Request
@@ -20,9 +22,14 @@ from rest_framework.authtoken.models import Token
 
 from ..exceptions import BadFormatException
 from .base_backend import BaseDeploymentBackend
-from .kc_access.utils import instance_count, last_submission_time
+from .kc_access.utils import (
+    instance_count,
+    last_modification_time,
+    last_submission_time,
+)
 from .kc_access.shadow_models import _models
-from kpi.constants import INSTANCE_FORMAT_TYPE_JSON, INSTANCE_FORMAT_TYPE_XML
+from kpi.constants import INSTANCE_FORMAT_TYPE_JSON, INSTANCE_FORMAT_TYPE_XML, \
+    SUBMISSION_TIME_FORMAT, SUBMISSION_VERSION_KEYS
 from kpi.utils.mongo_helper import MongoDecodingHelper
 from kpi.utils.log import logging
 
@@ -51,6 +58,25 @@ class KobocatDeploymentBackend(BaseDeploymentBackend):
     "self.asset._deployment_data" JSONField.
     '''
 
+    # Keys always retrieved from Mongo, even when `get_submissions()` is asked
+    # for specific `fields`
+    SUBMISSION_METADATA_KEYS = (
+        '_id',
+        '_uuid',
+        '_submission_time',
+        '_submitted_by',
+        '_validation_status',
+    ) + SUBMISSION_VERSION_KEYS
+    # How many times to re-query Mongo after the server discards an open
+    # cursor before giving up
+    MAXIMUM_CURSOR_RESUMPTIONS = 5
+    # Index of the Mongo `instances` collection that lets submissions of one
+    # form be streamed in `_id` order without sorting them in memory. KoBoCAT
+    # does not create it; see the `create_mongo_indexes` management command
+    MONGO_INSTANCES_INDEX = [('_userform_id', ASCENDING), ('_id', ASCENDING)]
+    # Whether `MONGO_INSTANCES_INDEX` exists, checked once per process
+    _mongo_instances_index_exists = None
+
     @staticmethod
     def make_identifier(username, id_string):
         ''' Uses `settings.KOBOCAT_URL` to construct an identifier from a
@@ -481,6 +507,13 @@ class KobocatDeploymentBackend(BaseDeploymentBackend):
         return last_submission_time(
             xform_id_string=id_string, user_id=self.asset.owner.pk)
 
+    def _last_modification_time(self, submitted_before=None):
+        _deployment_data = self.asset._deployment_data
+        id_string = _deployment_data['backend_response']['id_string']
+        return last_modification_time(
+            xform_id_string=id_string, user_id=self.asset.owner.pk,
+            submitted_before=submitted_before)
+
 
     def get_submission_validation_status_url(self, submission_pk):
         url = '{detail_url}/validation_status'.format(
@@ -488,21 +521,41 @@ class KobocatDeploymentBackend(BaseDeploymentBackend):
         )
         return url
 
-    def get_submissions(self, format_type=INSTANCE_FORMAT_TYPE_JSON, instances_ids=[]):
+    def get_submissions(self, format_type=INSTANCE_FORMAT_TYPE_JSON,
+                        instances_ids=[], fields=None, start_after=None,
+                        batch_size=None, submitted_after=None, end_at=None):
         """
         Retreives submissions through Postgres or Mongo depending on `format_type`.
         It can be filtered on instances uuids.
         `uuid` is used instead of `id` because `id` is not available in ReadOnlyInstance model
+        Submissions are streamed in `_id` order, so an interrupted iteration
+        can be resumed by passing the last `_id` received as `start_after`.
 
         :param format_type: str. INSTANCE_FORMAT_TYPE_JSON|INSTANCE_FORMAT_TYPE_XML
         :param instances_ids: list. Optional
-        :return: list: mixed
+        :param fields: list. Optional. Top-level keys to retrieve from each
+            JSON submission in addition to `SUBMISSION_METADATA_KEYS`;
+            all keys are retrieved when `None`
+        :param start_after: int. Optional. Only retrieve submissions whose
+            `_id` is greater
+        :param batch_size: int. Optional. Number of JSON submissions fetched
+            from Mongo per round trip; defaults to
+            `settings.MONGO_CURSOR_BATCH_SIZE`
+        :param submitted_after: datetime. Optional. Only retrieve JSON
+            submissions whose `_submission_time` is later. Mongo timestamps
+            have per-second resolution, so any fraction of a second is ignored
+        :param end_at: int. Optional. Only retrieve submissions whose `_id`
+            is lower or equal
+        :return: generator: mixed
         """
         submissions = []
         if format_type == INSTANCE_FORMAT_TYPE_JSON:
-            submissions = self.__get_submissions_in_json(instances_ids)
+            submissions = self.__get_submissions_in_json(
+                instances_ids, fields, start_after, batch_size,
+                submitted_after, end_at)
         elif format_type == INSTANCE_FORMAT_TYPE_XML:
-            submissions = self.__get_submissions_in_xml(instances_ids)
+            submissions = self.__get_submissions_in_xml(
+                instances_ids, start_after, end_at)
         else:
             raise BadFormatException(
                 "The format {} is not supported".format(format_type)
@@ -526,34 +579,153 @@ class KobocatDeploymentBackend(BaseDeploymentBackend):
         else:
             raise ValueError("Primary key must be provided")
 
-    def __get_submissions_in_json(self, instances_ids=[]):
+    def __get_submissions_in_json(self, instances_ids=[], fields=None,
+                                  start_after=None, batch_size=None,
+                                  submitted_after=None, end_at=None):
         """
         Retrieves instances directly from Mongo.
 
         :param instances_ids: list. Optional
+        :param fields: list. Optional
+        :param start_after: int. Optional
+        :param batch_size: int. Optional
+        :param submitted_after: datetime. Optional
+        :param end_at: int. Optional
         :return: generator<JSON>
         """
-        query = {
-            "_userform_id": self.mongo_userform_id,
-            "_deleted_at": {"$exists": False}
-        }
+        query = self.__get_mongo_instances_query()
+
+        if submitted_after is not None:
+            query.update({
+                "_submission_time": {
+                    "$gt": submitted_after.strftime(SUBMISSION_TIME_FORMAT)
+                }
+            })
 
         if len(instances_ids) > 0:
             query.update({
                 "_id": {"$in": instances_ids}
             })
 
-        instances = settings.MONGO_DB.instances.find(query)
-        return (
-            MongoDecodingHelper.to_readable_dict(instance)
-            for instance in instances
-        )
+        if end_at is not None:
+            query.setdefault("_id", {})["$lte"] = end_at
+
+        if fields is None:
+            projection = None
+        else:
+            projection = dict.fromkeys(self.SUBMISSION_METADATA_KEYS, True)
+            projection.update({
+                MongoDecodingHelper.encode(field): True for field in fields
+            })
+
+        if batch_size is None:
+            batch_size = settings.MONGO_CURSOR_BATCH_SIZE
+
+        return self.__stream_mongo_instances(
+            query, projection, start_after, batch_size)
+
+    @classmethod
+    def _has_mongo_instances_index(cls):
+        """
+        Returns whether `MONGO_INSTANCES_INDEX` exists. Without it, Mongo has
+        to sort the submissions of a form in memory, which fails beyond 32 MB,
+        or to scan the `_id` index of the whole collection.
+
+        :return: bool
+        """
+        if cls._mongo_instances_index_exists is None:
+            cls._mongo_instances_index_exists = any(
+                index["key"] == cls.MONGO_INSTANCES_INDEX for index in
+                settings.MONGO_DB.instances.index_information().itervalues()
+            )
+            if not cls._mongo_instances_index_exists:
+                logging.warning(
+                    "Mongo `instances` lack the index needed to stream "
+                    "submissions in order; run `manage.py "
+                    "create_mongo_indexes`")
+        return cls._mongo_instances_index_exists
+
+    def __stream_mongo_instances(self, query, projection, start_after,
+                                 batch_size):
+        """
+        Iterates over the Mongo instances matching `query` in `_id` order.
+        The cursor never times out, so that slow consumers (e.g. exports) do
+        not lose it, and is therefore always closed explicitly. If the server
+        discards it nonetheless, the query is resumed after the last instance
+        yielded.
+
+        :return: generator<JSON>
+        """
+        last_id = start_after
+        resumptions = 0
+        while True:
+            resumed_query = dict(query)
+            if last_id is not None:
+                id_query = dict(query.get("_id", {}))
+                id_query["$gt"] = last_id
+                resumed_query["_id"] = id_query
+            cursor = settings.MONGO_DB.instances.find(
+                resumed_query, projection, no_cursor_timeout=True
+            ).sort("_id", ASCENDING).batch_size(batch_size)
+            if self._has_mongo_instances_index():
+                cursor = cursor.hint(self.MONGO_INSTANCES_INDEX)
+            try:
+                for instance in cursor:
+                    last_id = instance["_id"]
+                    yield MongoDecodingHelper.to_readable_dict(instance)
+                return
+            except CursorNotFound:
+                resumptions += 1
+                if resumptions > self.MAXIMUM_CURSOR_RESUMPTIONS:
+                    raise
+                logging.warning(
+                    "Mongo cursor lost for {}; resuming after _id {}".format(
+                        self.mongo_userform_id, last_id))
+            finally:
+                cursor.close()
+
+    def get_submission_ids(self, start_after=None, skip=0, limit=None):
+        """
+        Returns the `_id`s of JSON submissions in `_id` order, without
+        streaming the submissions themselves: the `skip`-th submission whose
+        `_id` is greater than `start_after` is returned first, followed by at
+        most `limit - 1` others. Mongo walks `MONGO_INSTANCES_INDEX` to skip,
+        so locating e.g. the boundaries of export shards costs one small
+        query per boundary.
+
+        :param start_after: int. Optional
+        :param skip: int. Optional
+        :param limit: int. Optional
+        :return: list<int>
+        """
+        query = self.__get_mongo_instances_query()
+        if start_after is not None:
+            query["_id"] = {"$gt": start_after}
+        cursor = settings.MONGO_DB.instances.find(
+            query, {"_id": True}).sort("_id", ASCENDING).skip(skip)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        if self._has_mongo_instances_index():
+            cursor = cursor.hint(self.MONGO_INSTANCES_INDEX)
+        try:
+            return [instance["_id"] for instance in cursor]
+        finally:
+            cursor.close()
 
-    def __get_submissions_in_xml(self, instances_ids=[]):
+    def __get_mongo_instances_query(self):
+        return {
+            "_userform_id": self.mongo_userform_id,
+            "_deleted_at": {"$exists": False}
+        }
+
+    def __get_submissions_in_xml(self, instances_ids=[], start_after=None,
+                                 end_at=None):
         """
         Retrieves instances directly from Postgres.
 
         :param instances_ids: list. Optional
+        :param start_after: int. Optional
+        :param end_at: int. Optional
         :return: list<XML>
         """
         queryset = _models.Instance.objects.filter(
@@ -564,6 +736,12 @@ class KobocatDeploymentBackend(BaseDeploymentBackend):
         if len(instances_ids) > 0:
             queryset = queryset.filter(id__in=instances_ids)
 
+        if start_after is not None:
+            queryset = queryset.filter(id__gt=start_after)
+
+        if end_at is not None:
+            queryset = queryset.filter(id__lte=end_at)
+
         queryset = queryset.order_by("id")
 
-        return (lazy_instance.xml for lazy_instance in queryset)
+        return queryset.values_list("xml", flat=True).iterator()
@@ -1,9 +1,13 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import datetime
 import re
 
+import pytz
+
 from base_backend import BaseDeploymentBackend
-from kpi.constants import INSTANCE_FORMAT_TYPE_JSON, INSTANCE_FORMAT_TYPE_XML
+from kpi.constants import INSTANCE_FORMAT_TYPE_JSON, INSTANCE_FORMAT_TYPE_XML, \
+    SUBMISSION_TIME_FORMAT
 
 
 class MockDeploymentBackend(BaseDeploymentBackend):
@@ -53,6 +57,38 @@ class MockDeploymentBackend(BaseDeploymentBackend):
         submissions = self.asset._deployment_data.get('submissions', [])
         return len(submissions)
 
+    def _last_submission_time(self):
+        submissions = self.asset._deployment_data.get('submissions', [])
+        submission_times = [submission['_submission_time']
+                            for submission in submissions
+                            if '_submission_time' in submission]
+        if not submission_times:
+            return None
+        return datetime.datetime.strptime(
+            max(submission_times), SUBMISSION_TIME_FORMAT
+        ).replace(tzinfo=pytz.UTC)
+
+    def _last_modification_time(self, submitted_before=None):
+        submissions = self.asset._deployment_data.get('submissions', [])
+        if submitted_before is not None:
+            watermark = submitted_before.strftime(SUBMISSION_TIME_FORMAT)
+        modification_times = []
+        for submission in submissions:
+            submission_time = submission.get('_submission_time')
+            if submission_time is None or (
+                    submitted_before is not None and
+                    submission_time > watermark
+            ):
+                continue
+            # Like KoBoCAT, record edits in `_last_edited`
+            modification_times.append(
+                submission.get('_last_edited', submission_time))
+        if not modification_times:
+            return None
+        return datetime.datetime.strptime(
+            max(modification_times), SUBMISSION_TIME_FORMAT
+        ).replace(tzinfo=pytz.UTC)
+
     def _mock_submission(self, submission):
         """
         @TODO may be useless because of mock_submissions. Remove if it's not used anymore anywhere else.
@@ -72,16 +108,42 @@ class MockDeploymentBackend(BaseDeploymentBackend):
         self.store_data({"submissions": submissions})
         self.asset.save(create_version=False)
 
-    def get_submissions(self, format_type=INSTANCE_FORMAT_TYPE_JSON, instances_ids=[]):
+    def get_submissions(self, format_type=INSTANCE_FORMAT_TYPE_JSON,
+                        instances_ids=[], fields=None, start_after=None,
+                        batch_size=None, submitted_after=None, end_at=None):
         """
         Returns a list of json representation of instances.
+        `fields` and `batch_size` are accepted for compatibility with
+        `KobocatDeploymentBackend` but ignored.
 
         :param format_type: str. xml or json
         :param instances_ids: list. Ids of instances to retrieve
+        :param start_after: int. Optional. Only retrieve JSON submissions
+            whose `_id` is greater. Mock submissions are assumed to be stored
+            in `_id` order
+        :param submitted_after: datetime. Optional. Only retrieve JSON
+            submissions whose `_submission_time` is later
+        :param end_at: int. Optional. Only retrieve JSON submissions whose
+            `_id` is lower or equal
         :return: list
         """
         submissions = self.asset._deployment_data.get("submissions", [])
 
+        if start_after is not None and \
+                format_type == INSTANCE_FORMAT_TYPE_JSON:
+            submissions = [submission for submission in submissions
+                           if submission.get("_id") > start_after]
+
+        if end_at is not None and format_type == INSTANCE_FORMAT_TYPE_JSON:
+            submissions = [submission for submission in submissions
+                           if submission.get("_id") <= end_at]
+
+        if submitted_after is not None and \
+                format_type == INSTANCE_FORMAT_TYPE_JSON:
+            watermark = submitted_after.strftime(SUBMISSION_TIME_FORMAT)
+            submissions = [submission for submission in submissions
+                           if submission.get("_submission_time") > watermark]
+
         if len(instances_ids) > 0:
             if format_type == INSTANCE_FORMAT_TYPE_XML:
                 # ugly way to find matches, but it avoids to load each xml in memory.
@@ -93,6 +155,23 @@ class MockDeploymentBackend(BaseDeploymentBackend):
 
         return submissions
 
+    def get_submission_ids(self, start_after=None, skip=0, limit=None):
+        """
+        Returns the `_id`s of JSON submissions, as
+        `KobocatDeploymentBackend.get_submission_ids()` does
+
+        :param start_after: int. Optional
+        :param skip: int. Optional
+        :param limit: int. Optional
+        :return: list<int>
+        """
+        submission_ids = sorted(
+            submission["_id"] for submission in
+                self.get_submissions(start_after=start_after))
+        if limit is None:
+            return submission_ids[skip:]
+        return submission_ids[skip:skip + limit]
+
     def get_submission(self, pk, format_type=INSTANCE_FORMAT_TYPE_JSON):
         if pk:
             submissions = list(self.get_submissions(format_type, [pk]))
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import copy
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kpi.utils.mongo_helper import MongoDecodingHelper
+
+
+def legacy_to_readable_dict(d):
+    '''
+    The implementation of `MongoDecodingHelper.to_readable_dict()` that
+    preceded the decoded key cache, kept as a point of comparison
+    '''
+    for key, value in list(d.items()):
+        if type(value) == list:
+            value = [legacy_to_readable_dict(e)
+                     if type(e) == dict else e for e in value]
+        elif type(value) == dict:
+            value = legacy_to_readable_dict(value)
+
+        if MongoDecodingHelper._is_attribute_encoded(key):
+            del d[key]
+            d[MongoDecodingHelper.decode(key)] = value
+
+    return d
+
+
+def build_submission(index, questions, repeats, repetitions):
+    '''
+    Return a submission shaped like those KC stores in Mongo: metadata, plain
+    questions, a few keys containing encoded dots, and repeat groups whose
+    entries are prefixed by the path of the group
+    '''
+    submission = {
+        '__version__': 'vPtjMxE37b4kgqoCBFEkeb',
+        '_attachments': [],
+        '_geolocation': [None, None],
+        '_id': index,
+        '_notes': [],
+        '_status': 'submitted_via_web',
+        '_submission_time': '2017-12-20T07:19:38',
+        '_submitted_by': None,
+        '_tags': [],
+        '_userform_id': 'someuser_afgNxNby4VxHJ4STM2LmVz',
+        '_uuid': 'f9753a6e-abd3-47e3-a218-9ad1adfa2688',
+        '_xform_id_string': 'afgNxNby4VxHJ4STM2LmVz',
+        'formhub/uuid': 'c1aae157497d477aa3443b2ca9306e2e',
+        'meta/instanceID': 'uuid:f9753a6e-abd3-47e3-a218-9ad1adfa2688',
+    }
+    for question in xrange(questions):
+        submission['group/question_{}'.format(question)] = str(question)
+    submission['dottyLg==question'] = 'dot'
+    for repeat in xrange(repeats):
+        path = 'household/memberLg=={}'.format(repeat)
+        submission[path] = [
+            dict(
+                [('{}/question_{}'.format(path, question), str(question))
+                    for question in xrange(questions)],
+                **{'{}/nested'.format(path): [
+                    {'{}/nested/age'.format(path): '42'}
+                ]}
+            ) for _ in xrange(repetitions)
+        ]
+    return submission
+
+
+class Command(BaseCommand):
+    help = (
+        'Time `MongoDecodingHelper.to_readable_dict()` against its previous '
+        'implementation on synthetic submissions with nested repeat groups'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--submissions',
+            default=1000,
+            type=int,
+            help='Number of submissions to decode per run',
+        )
+        parser.add_argument(
+            '--questions',
+            default=50,
+            type=int,
+            help='Number of questions outside and within each repeat group',
+        )
+        parser.add_argument(
+            '--repeats',
+            default=2,
+            type=int,
+            help='Number of repeat groups in each submission',
+        )
+        parser.add_argument(
+            '--repetitions',
+            default=5,
+            type=int,
+            help='Number of entries in each repeat group',
+        )
+        parser.add_argument(
+            '--runs',
+            default=5,
+            type=int,
+            help='Number of times to time each implementation',
+        )
+
+    def handle(self, *args, **options):
+        submissions = [
+            build_submission(
+                index,
+                options['questions'],
+                options['repeats'],
+                options['repetitions']
+            ) for index in xrange(options['submissions'])
+        ]
+
+        legacy = [legacy_to_readable_dict(s)
+                  for s in copy.deepcopy(submissions)]
+        current = [MongoDecodingHelper.to_readable_dict(s)
+                   for s in copy.deepcopy(submissions)]
+        if legacy != current:
+            raise CommandError('The implementations disagree!')
+
+        for name, function in (
+            ('legacy', legacy_to_readable_dict),
+            ('current', MongoDecodingHelper.to_readable_dict),
+        ):
+            timings = []
+            for _ in xrange(options['runs']):
+                # Decoding happens in place, so each run needs fresh copies.
+                # Keep copying out of the timings
+                run_submissions = copy.deepcopy(submissions)
+                timings.append(timeit.timeit(
+                    lambda: [function(s) for s in run_submissions], number=1
+                ))
+            self.stdout.write(
+                '{}: best {:.3f}s, mean {:.3f}s for {} submissions'.format(
+                    name,
+                    min(timings),
+                    sum(timings) / len(timings),
+                    len(submissions)
+                )
+            )
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from kpi.models import Asset, Collection, ObjectPermission
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the time taken by the bulk and the walking implementations '
+        'of `recalculate_descendants_perms()` on a synthetic collection tree. '
+        'Everything is created inside a transaction that is rolled back, but '
+        'do not run this against a production database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--depth',
+            default=4,
+            type=int,
+            help='Number of levels of collections beneath the root',
+        )
+        parser.add_argument(
+            '--breadth',
+            default=3,
+            type=int,
+            help='Number of child collections in each collection',
+        )
+        parser.add_argument(
+            '--assets',
+            default=10,
+            type=int,
+            help='Number of assets in each collection',
+        )
+        parser.add_argument(
+            '--users',
+            default=5,
+            type=int,
+            help='Number of users with whom the root collection is shared',
+        )
+        parser.add_argument(
+            '--repeat',
+            default=3,
+            type=int,
+            help='Number of times to time each implementation',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            root = self._build_tree(options)
+            results = {}
+            for name, method in (
+                ('walk', '_walk_recalculate_descendants_perms'),
+                ('bulk', '_bulk_recalculate_descendants_perms'),
+            ):
+                timings = []
+                for _ in xrange(options['repeat']):
+                    start = time.time()
+                    getattr(Collection.objects.get(pk=root.pk), method)()
+                    timings.append(time.time() - start)
+                results[name] = self._get_inherited_perms(root)
+                self.stdout.write('{}: best {:.3f}s, mean {:.3f}s'.format(
+                    name, min(timings), sum(timings) / len(timings)))
+            transaction.set_rollback(True)
+        if results['walk'] != results['bulk']:
+            raise CommandError(
+                'The implementations disagree! walk: {} permissions, '
+                'bulk: {} permissions'.format(
+                    len(results['walk']), len(results['bulk']))
+            )
+        self.stdout.write('Both implementations produced {} inherited '
+                          'permissions'.format(len(results['bulk'])))
+
+    def _build_tree(self, options):
+        owner = User.objects.create(username='benchmark_owner')
+        root = Collection.objects.create(name='benchmark root', owner=owner)
+        parents = [root]
+        collection_count = 1
+        for _ in xrange(options['depth']):
+            children = []
+            for parent in parents:
+                for index in xrange(options['breadth']):
+                    children.append(Collection.objects.create(
+                        name='benchmark {}'.format(index),
+                        owner=owner,
+                        parent=parent
+                    ))
+            collection_count += len(children)
+            parents = children
+        uid_field = Asset._meta.get_field('uid')
+        Asset.objects.bulk_create([
+            Asset(
+                name='benchmark',
+                owner=owner,
+                parent=collection,
+                uid=uid_field.generate_uid()
+            ) for collection in Collection.objects.filter(
+                tree_id=Collection.objects.get(pk=root.pk).tree_id)
+            for _ in xrange(options['assets'])
+        ])
+        for index in xrange(options['users']):
+            user = User.objects.create(
+                username='benchmark_user_{}'.format(index))
+            Collection.objects.get(pk=root.pk).assign_perm(
+                user,
+                'change_collection' if index % 2 else 'view_collection',
+                defer_recalc=True,
+                skip_kc=True
+            )
+        self.stdout.write('Built a tree of {} collections and {} assets'.format(
+            collection_count, collection_count * options['assets']))
+        return root
+
+    def _get_inherited_perms(self, root):
+        root = Collection.objects.get(pk=root.pk)
+        perms = set()
+        for queryset in root.get_descendant_querysets():
+            perms.update(ObjectPermission.objects.filter(
+                content_type__model=queryset.model._meta.model_name,
+                content_type__app_label=queryset.model._meta.app_label,
+                object_id__in=queryset.values('pk'),
+                inherited=True
+            ).values_list(
+                'content_type_id', 'object_id', 'user_id', 'permission_id'))
+        return perms
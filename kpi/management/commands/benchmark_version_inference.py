@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import itertools
+import random
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kobo.apps.reports.report_data import (
+    INFERRED_VERSION_ID_KEY,
+    get_version_ranks,
+    make_version_id_inferrer,
+)
+
+# Number of distinct submissions generated; the stream cycles through them
+POOL_SIZE = 1000
+
+
+def make_legacy_version_id_inferrer(version_ids_newest_first, reversion_ids):
+    '''
+    The implementation of `_infer_version_id()` in `build_formpack()` that
+    preceded the version rank index, kept as a point of comparison
+    '''
+    FUZZY_VERSION_ID_KEY = '_version_'
+
+    def legacy_infer_version_id(submission):
+        submission_version_ids = [
+            val for key, val in submission.iteritems()
+                if FUZZY_VERSION_ID_KEY in key
+        ]
+        submission_version_ids = [
+            reversion_ids[x] if x in reversion_ids
+                else x for x in submission_version_ids
+        ]
+        inferred_version_id = None
+        for extant_version_id in version_ids_newest_first:
+            if extant_version_id in submission_version_ids:
+                inferred_version_id = extant_version_id
+                break
+        if not inferred_version_id:
+            inferred_version_id = version_ids_newest_first[0]
+        submission[INFERRED_VERSION_ID_KEY] = inferred_version_id
+        return submission
+
+    return legacy_infer_version_id
+
+
+def build_versions(count):
+    '''
+    Return the ids of `count` synthetic versions from newest to oldest, each
+    followed by its deployed version id as `_get_formpack()` does, and a
+    dictionary mapping a deprecated reversion id to every tenth version
+    '''
+    version_ids_newest_first = []
+    reversion_ids = {}
+    for index in xrange(count, 0, -1):
+        uid = 'v{:021d}'.format(index)
+        version_ids_newest_first.extend([uid, '1{:09d}'.format(index)])
+        if not index % 10:
+            reversion_ids[str(index)] = uid
+    return version_ids_newest_first, reversion_ids
+
+
+def build_submission(index, questions, version_ids, rng):
+    '''
+    Return a submission with `questions` answers and the version keys that
+    KC writes, some of them referring to versions unknown to the asset
+    '''
+    submission = {
+        '_id': index,
+        '_submission_time': '2017-12-20T07:19:38',
+        '_uuid': 'f9753a6e-abd3-47e3-a218-9ad1adfa2688',
+        'meta/instanceID': 'uuid:f9753a6e-abd3-47e3-a218-9ad1adfa2688',
+    }
+    for question in xrange(questions):
+        submission['group/question_{}'.format(question)] = str(question)
+    submission['__version__'] = rng.choice(version_ids)
+    if rng.random() < 0.5:
+        submission['_version_'] = rng.choice(version_ids)
+    for suffix in xrange(1, rng.randint(1, 4)):
+        submission['_version__{:03d}'.format(suffix)] = rng.choice(
+            version_ids + ['vUnknownVersion'])
+    return submission
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the version inference of `build_formpack()` against its '
+        'previous implementation on a synthetic stream of submissions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--submissions',
+            default=1000000,
+            type=int,
+            help='Number of submissions in the stream',
+        )
+        parser.add_argument(
+            '--versions',
+            default=300,
+            type=int,
+            help='Number of versions of the asset',
+        )
+        parser.add_argument(
+            '--questions',
+            default=50,
+            type=int,
+            help='Number of questions in each submission',
+        )
+        parser.add_argument(
+            '--runs',
+            default=3,
+            type=int,
+            help='Number of times to time each implementation',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        version_ids_newest_first, reversion_ids = build_versions(
+            options['versions'])
+        pool = [
+            build_submission(
+                index,
+                options['questions'],
+                version_ids_newest_first + reversion_ids.keys(),
+                rng
+            ) for index in xrange(POOL_SIZE)
+        ]
+
+        def make_current():
+            return make_version_id_inferrer(
+                version_ids_newest_first,
+                get_version_ranks(version_ids_newest_first, reversion_ids)
+            )
+
+        def make_legacy():
+            return make_legacy_version_id_inferrer(
+                version_ids_newest_first, reversion_ids)
+
+        def infer_all(infer_version_id):
+            return [
+                infer_version_id(submission).pop(INFERRED_VERSION_ID_KEY)
+                    for submission in pool
+            ]
+
+        if infer_all(make_legacy()) != infer_all(make_current()):
+            raise CommandError('The implementations disagree!')
+
+        for name, make_inferrer in (
+            ('legacy', make_legacy),
+            ('current', make_current),
+        ):
+            def run():
+                # Each stream builds its own inferrer, as `build_formpack()`
+                # does
+                infer_version_id = make_inferrer()
+                for submission in itertools.islice(
+                    itertools.cycle(pool), options['submissions']
+                ):
+                    infer_version_id(submission).pop(INFERRED_VERSION_ID_KEY)
+
+            timings = [
+                timeit.timeit(run, number=1) for _ in xrange(options['runs'])
+            ]
+            self.stdout.write(
+                '{}: best {:.3f}s, mean {:.3f}s for {} submissions and {} '
+                'versions'.format(
+                    name,
+                    min(timings),
+                    sum(timings) / len(timings),
+                    options['submissions'],
+                    options['versions']
+                )
+            )
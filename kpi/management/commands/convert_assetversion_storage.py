@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import AssetVersion
+
+
+def store_versions_as_deltas(asset_id):
+    '''
+    Store the versions of an asset as deltas where possible, against the
+    closest preceding keyframe. Return the number of versions converted
+    '''
+    converted = 0
+    keyframe_id = None
+    versions_pks = AssetVersion.objects.filter(
+        asset_id=asset_id, _keyframe=None).order_by('pk').values_list(
+            'pk', flat=True)
+    # Fetch versions one at a time, since assets may have thousands of them
+    for version_pk in versions_pks:
+        version = AssetVersion.objects.get(pk=version_pk)
+        if keyframe_id is not None and version.store_as_delta(keyframe_id):
+            version.save(update_fields=[
+                '_version_content', '_keyframe', '_content_delta'])
+            converted += 1
+        else:
+            keyframe_id = version.pk
+    return converted
+
+
+def store_versions_in_full(asset_id):
+    '''
+    Store all versions of an asset in full. Return the number of versions
+    converted
+    '''
+    converted = 0
+    versions_pks = AssetVersion.objects.filter(
+        asset_id=asset_id).exclude(_keyframe=None).values_list(
+            'pk', flat=True)
+    for version_pk in versions_pks:
+        AssetVersion.objects.get(pk=version_pk).store_in_full()
+        converted += 1
+    return converted
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert the existing history of assets to or from delta storage (see '
+        'the `ASSET_VERSION_DELTA_STORAGE` setting). Versions are only stored '
+        'as deltas when that saves space. Output is tab-delimited with the '
+        'following columns:\n'
+        '\tAsset UID\n\tConverted Version Count'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to',
+            choices=['deltas', 'full'],
+            default='deltas',
+            help='Store versions as deltas (default), or store them all in '
+                 'full again',
+        )
+        parser.add_argument(
+            '--username',
+            help='Consider only versions owned by a specific user',
+        )
+        parser.add_argument(
+            '--asset-uid',
+            help='Consider only versions of the specified `Asset`',
+        )
+
+    def handle(self, *args, **options):
+        if options['to'] == 'deltas':
+            convert = store_versions_as_deltas
+        else:
+            convert = store_versions_in_full
+
+        versions = AssetVersion.objects.order_by()
+        if options.get('username'):
+            versions = versions.filter(
+                asset__owner__username=options['username'])
+        if options.get('asset_uid'):
+            versions = versions.filter(asset__uid=options['asset_uid'])
+        assets = versions.values_list('asset_id', 'asset__uid').distinct()
+
+        total = 0
+        for asset_id, asset_uid in assets.iterator():
+            with transaction.atomic():
+                converted = convert(asset_id)
+            total += converted
+            if converted:
+                self.stdout.write('{}\t{}'.format(asset_uid, converted))
+        self.stderr.write('Converted {} versions'.format(total))
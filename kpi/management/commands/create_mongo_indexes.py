@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from kpi.deployment_backends.kobocat_backend import KobocatDeploymentBackend
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the indexes of the Mongo `instances` collection that KPI '
+        'needs to stream the submissions of large projects. Idempotent'
+    )
+
+    def handle(self, *args, **options):
+        # Build in the background, so that KoBoCAT can keep writing
+        # submissions meanwhile
+        name = settings.MONGO_DB.instances.create_index(
+            KobocatDeploymentBackend.MONGO_INSTANCES_INDEX, background=True)
+        self.stdout.write('Index `{}` is ready'.format(name))
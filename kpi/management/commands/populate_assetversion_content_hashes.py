@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from ...models import AssetVersion
+from ...models.asset_version import get_content_hash
+from ...utils.json_patch import apply_patch
+
+# Number of versions, whose content may be large, read per query
+CHUNK_SIZE = 100
+
+
+def populate_content_hashes(AssetVersion, stdout=None):
+    '''
+    Set `content_hash` on all versions that lack it. The model class is passed
+    as an argument so that this function can also be used by migrations; it
+    therefore reads the storage fields directly instead of relying on
+    `AssetVersion.version_content`. Return the number of versions updated
+    '''
+    updated = 0
+    last_keyframe = (None, None)
+    versions = AssetVersion.objects.filter(content_hash=None).order_by('pk')
+    while True:
+        rows = list(versions.values_list(
+            'pk', '_version_content', '_keyframe', '_content_delta'
+        )[:CHUNK_SIZE])
+        if not rows:
+            break
+        for pk, content, keyframe_id, content_delta in rows:
+            if keyframe_id is not None:
+                # Versions of an asset are mostly contiguous, so remembering
+                # the last keyframe avoids most queries
+                if last_keyframe[0] != keyframe_id:
+                    last_keyframe = (
+                        keyframe_id,
+                        AssetVersion.objects.filter(pk=keyframe_id).values_list(
+                            '_version_content', flat=True)[0]
+                    )
+                content = apply_patch(last_keyframe[1], content_delta)
+            AssetVersion.objects.filter(pk=pk).update(
+                content_hash=get_content_hash(content))
+        updated += len(rows)
+        if stdout:
+            stdout.write('Updated {} versions'.format(updated))
+    return updated
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the `content_hash` of all `AssetVersion`s that lack it, i.e. '
+        'those created before it was stored. Idempotent'
+    )
+
+    def handle(self, *args, **options):
+        populate_content_hashes(AssetVersion, stdout=self.stdout)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import Permission
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from kpi.models import ObjectPermission, EffectiveObjectPermission
+from kpi.models.object_permission import (
+    calculate_effective_permission_bits,
+    get_permission_bits,
+)
+
+CHUNK_SIZE = 1000
+
+
+def rebuild_effective_permissions(ObjectPermission, EffectiveObjectPermission,
+                                  Permission, stdout=None):
+    '''
+    Discard and recalculate every `EffectiveObjectPermission` from the
+    `ObjectPermission`s. Model classes are passed as arguments so that this
+    function can also be used by migrations. Objects are processed in chunks of
+    `CHUNK_SIZE`, each inside its own transaction
+    '''
+    content_type_ids = list(ObjectPermission.objects.order_by().values_list(
+        'content_type_id', flat=True).distinct())
+    for content_type_id in content_type_ids:
+        bits_by_pk = get_permission_bits(content_type_id, Permission)[0]
+        object_ids = list(ObjectPermission.objects.filter(
+            content_type_id=content_type_id
+        ).order_by('object_id').values_list('object_id', flat=True).distinct())
+        for start in xrange(0, len(object_ids), CHUNK_SIZE):
+            chunk = object_ids[start:start + CHUNK_SIZE]
+            permission_rows = ObjectPermission.objects.filter(
+                content_type_id=content_type_id, object_id__in=chunk
+            ).values_list('object_id', 'user_id', 'permission_id', 'deny')
+            effective_bits = calculate_effective_permission_bits(
+                permission_rows, bits_by_pk)
+            with transaction.atomic():
+                EffectiveObjectPermission.objects.filter(
+                    content_type_id=content_type_id, object_id__in=chunk
+                ).delete()
+                EffectiveObjectPermission.objects.bulk_create([
+                    EffectiveObjectPermission(
+                        user_id=user_id,
+                        content_type_id=content_type_id,
+                        object_id=object_id,
+                        permission_bits=bits
+                    ) for (object_id, user_id), bits
+                        in effective_bits.iteritems()
+                ])
+            if stdout:
+                stdout.write('Content type {}: {}/{} objects'.format(
+                    content_type_id,
+                    min(start + CHUNK_SIZE, len(object_ids)),
+                    len(object_ids)
+                ))
+        # Remove anything left behind by objects that no longer have any
+        # permissions
+        EffectiveObjectPermission.objects.filter(
+            content_type_id=content_type_id
+        ).exclude(object_id__in=ObjectPermission.objects.filter(
+            content_type_id=content_type_id).values('object_id')
+        ).delete()
+    EffectiveObjectPermission.objects.exclude(
+        content_type_id__in=content_type_ids
+    ).delete()
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalculate the denormalized `EffectiveObjectPermission` table used '
+        'by `get_objects_for_user()`. Idempotent; run it whenever the table '
+        'may have drifted, e.g. after `ObjectPermission`s were edited by hand '
+        'or a `Permission` was deleted'
+    )
+
+    def handle(self, *args, **options):
+        verbosity = options.get('verbosity', 1)
+        rebuild_effective_permissions(
+            ObjectPermission,
+            EffectiveObjectPermission,
+            Permission,
+            stdout=self.stdout if verbosity >= 1 else None
+        )
@@ -23,6 +23,10 @@ from hub.models import FormBuilderPreference
 from ...deployment_backends.kobocat_backend import KobocatDeploymentBackend
 from ...deployment_backends.kc_access.shadow_models import _models
 from ...models import Asset, ObjectPermission
+from ...models.object_permission import (
+    flush_permission_cache_invalidations,
+    refresh_effective_perms,
+)
 from .import_survey_drafts_from_dkobo import _set_auto_field_update
 from kpi.utils.log import logging
 
@@ -392,6 +396,9 @@ def _sync_permissions(asset, xform):
         if perms_to_assign or perms_to_revoke:
             affected_usernames.append(user_obj.username)
 
+    # Account for any `ObjectPermission`s written directly above
+    refresh_effective_perms(ASSET_CT, [asset.pk])
+
     return affected_usernames
 
 
@@ -527,6 +534,9 @@ class Command(BaseCommand):
                     self._print_tabular(*error_information)
                     logging.exception(u'sync_kobocat_xforms: {}'.format(
                         u', '.join(error_information)))
+                finally:
+                    # Permissions written above are committed by now
+                    flush_permission_cache_invalidations()
 
         _set_auto_field_update(Asset, "date_created", True)
         _set_auto_field_update(Asset, "date_modified", True)
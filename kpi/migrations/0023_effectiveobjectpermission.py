@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+from kpi.management.commands.rebuild_effective_permissions import \
+    rebuild_effective_permissions
+
+
+def populate_effective_permissions(apps, schema_editor):
+    if settings.SKIP_HEAVY_MIGRATIONS:
+        print("""
+            !!! ATTENTION !!!
+            If you have existing projects you need to run this management command:
+
+               > python manage.py rebuild_effective_permissions
+
+            Otherwise, users will not see objects shared with them.
+            This command is idempotent so you can run it even if you are not
+            sure if it is necessary.
+            """)
+    else:
+        print("""
+            This might take a while. If it is too slow, you may want to re-run the
+            migration with SKIP_HEAVY_MIGRATIONS=True and run the management command
+            (rebuild_effective_permissions) to populate the table.
+            """)
+        rebuild_effective_permissions(
+            apps.get_model('kpi', 'ObjectPermission'),
+            apps.get_model('kpi', 'EffectiveObjectPermission'),
+            apps.get_model('auth', 'Permission'),
+        )
+
+
+# allow this migration to be run backwards
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('kpi', '0022_assetfile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveObjectPermission',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('object_id', models.PositiveIntegerField()),
+                ('permission_bits', models.BigIntegerField()),
+                ('content_type', models.ForeignKey(to='contenttypes.ContentType')),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='effectiveobjectpermission',
+            unique_together=set([('user', 'content_type', 'object_id')]),
+        ),
+        migrations.RunPython(populate_effective_permissions, noop),
+    ]
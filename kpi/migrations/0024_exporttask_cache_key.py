@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpi', '0023_effectiveobjectpermission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exporttask',
+            name='cache_key',
+            field=models.CharField(max_length=64, null=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import jsonbfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpi', '0024_exporttask_cache_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetReportAggregate',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('versions', jsonbfield.fields.JSONField(default=list)),
+                ('counts', jsonbfield.fields.JSONField(default=dict)),
+                ('submission_count', models.IntegerField(default=0)),
+                ('last_submission_id', models.IntegerField(null=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('asset', models.OneToOneField(related_name='report_aggregate', to='kpi.Asset')),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import jsonbfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpi', '0025_assetreportaggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assetversion',
+            name='expanded_content',
+            field=jsonbfield.fields.JSONField(null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpi', '0026_assetversion_expanded_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedXForm',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('content_hash', models.CharField(unique=True, max_length=64)),
+                ('xml', models.TextField()),
+                ('details', jsonfield.fields.JSONField(default=dict)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_accessed', models.DateTimeField(default=django.utils.timezone.now, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import jsonbfield.fields
+import kpi.models.asset_version
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpi', '0027_cachedxform'),
+    ]
+
+    operations = [
+        # Keep the existing column: only its name in the model changes
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterField(
+                    model_name='assetversion',
+                    name='version_content',
+                    field=jsonbfield.fields.JSONField(null=True),
+                ),
+            ],
+            state_operations=[
+                migrations.RenameField(
+                    model_name='assetversion',
+                    old_name='version_content',
+                    new_name='_version_content',
+                ),
+                migrations.AlterField(
+                    model_name='assetversion',
+                    name='_version_content',
+                    field=jsonbfield.fields.JSONField(null=True, db_column='version_content'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='assetversion',
+            name='_content_delta',
+            field=jsonbfield.fields.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='assetversion',
+            name='_keyframe',
+            field=models.ForeignKey(related_name='+', on_delete=kpi.models.asset_version.materialize_dependent_versions, to='kpi.AssetVersion', null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpi', '0028_assetversion_delta_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assetversion',
+            name='content_digest',
+            field=models.CharField(max_length=40, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+from kpi.management.commands.populate_assetversion_content_hashes import \
+    populate_content_hashes
+
+
+def populate_assetversion_content_hashes(apps, schema_editor):
+    if settings.SKIP_HEAVY_MIGRATIONS:
+        print("""
+            !!! ATTENTION !!!
+            If you have existing projects you need to run this management command:
+
+               > python manage.py populate_assetversion_content_hashes
+
+            Otherwise, the API will not report the content hash of their versions.
+            This command is idempotent so you can run it even if you are not
+            sure if it is necessary.
+            """)
+    else:
+        print("""
+            This might take a while. If it is too slow, you may want to re-run the
+            migration with SKIP_HEAVY_MIGRATIONS=True and run the management command
+            (populate_assetversion_content_hashes) to populate the column.
+            """)
+        populate_content_hashes(apps.get_model('kpi', 'AssetVersion'))
+
+
+# allow this migration to be run backwards
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpi', '0029_assetversion_content_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assetversion',
+            name='content_hash',
+            field=models.CharField(max_length=40, null=True, db_index=True),
+        ),
+        migrations.RunPython(populate_assetversion_content_hashes, noop),
+    ]
@@ -3,8 +3,11 @@ from kpi.models.collection import UserCollectionSubscription
 from kpi.models.asset import Asset
 from kpi.models.asset import AssetSnapshot
 from kpi.models.asset_version import AssetVersion
+from kpi.models.cached_xform import CachedXForm
 from kpi.models.asset_file import AssetFile
+from kpi.models.asset_report_aggregate import AssetReportAggregate
 from kpi.models.object_permission import ObjectPermission, ObjectPermissionMixin
+from kpi.models.object_permission import EffectiveObjectPermission
 from kpi.models.import_export_task import ImportTask, ExportTask
 from kpi.models.tag_uid import TagUid
 from kpi.models.authorized_application import AuthorizedApplication
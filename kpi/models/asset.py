@@ -11,9 +11,10 @@ from collections import OrderedDict
 
 import xlwt
 import six
+from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
 from django.core.exceptions import MultipleObjectsReturned
-from django.db import models
+from django.db import connection, models
 from django.db import transaction
 from django.db.models import Prefetch
 from django.dispatch import receiver
@@ -28,7 +29,8 @@ from formpack import FormPack
 from formpack.utils.flatten_content import flatten_content
 from formpack.utils.json_hash import json_hash
 from formpack.utils.spreadsheet_content import flatten_to_spreadsheet_content
-from asset_version import AssetVersion
+from asset_version import AssetVersion, get_content_digest
+from .cached_xform import CachedXForm
 from kpi.utils.standardize_content import (standardize_content,
                                            needs_standardization,
                                            standardize_content_in_place)
@@ -36,7 +38,11 @@ from kpi.utils.autoname import (autoname_fields_in_place,
                                 autovalue_choices_in_place)
 from kpi.constants import ASSET_TYPES, ASSET_TYPE_BLOCK,\
     ASSET_TYPE_QUESTION, ASSET_TYPE_SURVEY, ASSET_TYPE_TEMPLATE
-from .object_permission import ObjectPermission, ObjectPermissionMixin
+from .object_permission import (
+    EffectiveObjectPermission,
+    ObjectPermission,
+    ObjectPermissionMixin,
+)
 from ..fields import KpiUidField, LazyDefaultJSONBField
 from ..utils.asset_content_analyzer import AssetContentAnalyzer
 from ..utils.sluggify import sluggify_label
@@ -60,6 +66,10 @@ from kobo.apps.reports.constants import (SPECIFIC_REPORTS_KEY,
                                          DEFAULT_REPORTS_KEY)
 from kpi.utils.log import logging
 
+# First key of the Postgres advisory locks taken by `Asset._snapshot()`; the
+# second key is the `AssetVersion` primary key
+SNAPSHOT_BUILD_LOCK_NAMESPACE = 0x6b706931  # 'kpi1'
+
 
 # TODO: Would prefer this to be a mixin that didn't derive from `Manager`.
 class TaggableModelManager(models.Manager):
@@ -612,13 +622,44 @@ class Asset(ObjectPermissionMixin,
         super(Asset, self).save(*args, **kwargs)
 
         if _create_version:
-            self.asset_versions.create(name=self.name,
-                                       version_content=self.content,
-                                       _deployment_data=self._deployment_data,
-                                       # asset_version.deployed is set in the
-                                       # DeploymentSerializer
-                                       deployed=False,
-                                       )
+            content_digest = get_content_digest(self.content)
+            if self._matches_latest_version(content_digest):
+                return
+            asset_version = self.asset_versions.create(
+                name=self.name,
+                version_content=self.content,
+                content_digest=content_digest,
+                _deployment_data=self._deployment_data,
+                # asset_version.deployed is set in the DeploymentSerializer
+                deployed=False,
+            )
+            if settings.PREGENERATE_ASSET_SNAPSHOTS and self.asset_type in [
+                    ASSET_TYPE_SURVEY, ASSET_TYPE_TEMPLATE]:
+                from kpi.tasks import generate_asset_snapshot
+                generate_asset_snapshot.apply_async(
+                    args=(asset_version.pk,),
+                    countdown=settings.ASSET_SNAPSHOT_PREGENERATION_DELAY)
+
+    def _matches_latest_version(self, content_digest):
+        '''
+        Whether a new version with `content_digest` would duplicate the
+        latest version, in which case there is no need to create it
+        '''
+        # Don't use `self.latest_version`, which may have been prefetched
+        latest_version = self.asset_versions.order_by('-date_modified').only(
+            'name', 'content_digest', '_deployment_data').first()
+        if latest_version is None:
+            return False
+        if latest_version.content_digest is None:
+            # Versions created before digests existed get one the first time
+            # they are compared
+            latest_version.content_digest = get_content_digest(
+                latest_version.version_content)
+            AssetVersion.objects.filter(pk=latest_version.pk).update(
+                content_digest=latest_version.content_digest)
+        return (latest_version.content_digest == content_digest and
+                latest_version.name == self.name and
+                latest_version._deployment_data == self._deployment_data)
 
     def rename_translation(self, _from, _to):
         if not self._has_translations(self.content, 2):
@@ -718,7 +759,7 @@ class Asset(ObjectPermissionMixin,
         # it may execute a database query each time it's read
         latest_version = self.latest_version
         if latest_version:
-            return latest_version.content_hash
+            return latest_version.ensure_content_hash()
 
     @property
     def snapshot(self):
@@ -727,6 +768,16 @@ class Asset(ObjectPermissionMixin,
     @transaction.atomic
     def _snapshot(self, regenerate=True):
         asset_version = self.latest_version
+        if (settings.PREGENERATE_ASSET_SNAPSHOTS and
+                asset_version is not None):
+            # Build snapshots of a version one at a time: readers wait for a
+            # build in progress by `kpi.tasks.generate_asset_snapshot`, then
+            # use its result, or build the snapshot themselves if the task
+            # has not started yet. An advisory lock is used so that the
+            # version row itself stays writable during the build
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [
+                    SNAPSHOT_BUILD_LOCK_NAMESPACE, asset_version.pk])
 
         try:
             snapshot = AssetSnapshot.objects.get(asset=self,
@@ -799,7 +850,8 @@ class Asset(ObjectPermissionMixin,
                 'asset_versions',
                 queryset=AssetVersion.objects.order_by(
                     '-date_modified'
-                ).only('uid', 'asset', 'date_modified', 'deployed'),
+                ).only('uid', 'asset', 'date_modified', 'deployed',
+                       'content_hash'),
                 to_attr='prefetched_latest_versions',
             ),
         )
@@ -809,10 +861,14 @@ class Asset(ObjectPermissionMixin,
 class AssetSnapshot(models.Model, XlsExportable, FormpackXLSFormUtils):
     '''
     This model serves as a cache of the XML that was exported by the installed
-    version of pyxform.
-
-    TODO: come up with a policy to clear this cache out.
-    DO NOT: depend on these snapshots existing for more than a day until a policy is set.
+    version of pyxform. The XML itself comes from `CachedXForm` whenever the
+    same source has already been exported with the same versions of pyxform
+    and formpack.
+
+    Snapshots older than `ASSET_SNAPSHOT_MAXIMUM_AGE_DAYS`, except those of
+    the latest versions of assets, are deleted daily by the
+    `delete_assets_snapshots` command; `Asset.snapshot` regenerates them as
+    needed. DO NOT depend on any other snapshot existing for longer.
     '''
     xml = models.TextField()
     source = JSONField(null=True)
@@ -885,6 +941,14 @@ class AssetSnapshot(models.Model, XlsExportable, FormpackXLSFormUtils):
         self._populate_fields_with_autofields(source_copy)
         self._strip_kuids(source_copy)
 
+        cache_key = CachedXForm.get_key(source_copy,
+                                        root_node_name=root_node_name,
+                                        id_string=id_string,
+                                        title=form_title)
+        cached_xform = CachedXForm.get(cache_key)
+        if cached_xform is not None:
+            return (cached_xform.xml, copy.deepcopy(cached_xform.details))
+
         warnings = []
         details = {}
         try:
@@ -912,6 +976,9 @@ class AssetSnapshot(models.Model, XlsExportable, FormpackXLSFormUtils):
                 u'error': err_message,
                 u'warnings': warnings,
             })
+            # Failures are not cached, so that they are logged every time
+            return (xml, details)
+        CachedXForm.store(cache_key, xml, copy.deepcopy(details))
         return (xml, details)
 
 
@@ -920,4 +987,5 @@ class AssetSnapshot(models.Model, XlsExportable, FormpackXLSFormUtils):
 def post_delete_asset(sender, instance, **kwargs):
     # Remove all permissions associated with this object
     ObjectPermission.objects.filter_for_object(instance).delete()
+    EffectiveObjectPermission.objects.filter_for_object(instance).delete()
     # No recalculation is necessary since children will also be deleted
@@ -0,0 +1,42 @@
+from collections import Counter
+
+from django.db import models
+from jsonbfield.fields import JSONField as JSONBField
+
+
+class AssetReportAggregate(models.Model):
+    '''
+    Running tallies of the responses to each field of a deployed asset, kept
+    so that reports only need to read the submissions received since they
+    were last updated. See `kobo.apps.reports.report_data`
+    '''
+    asset = models.OneToOneField('Asset', related_name='report_aggregate')
+    # The `FormPack` version ids of the asset when the tallies were started;
+    # any change invalidates them
+    versions = JSONBField(default=list)
+    # `{field name: [[value, count], ...]}`. Values are kept in lists, not as
+    # object keys, so that numbers and `None` survive the trip through JSON
+    counts = JSONBField(default=dict)
+    submission_count = models.IntegerField(default=0)
+    last_submission_id = models.IntegerField(null=True)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    def reset(self, versions):
+        self.versions = versions
+        self.counts = {}
+        self.submission_count = 0
+        self.last_submission_id = None
+
+    def get_counters(self):
+        return dict(
+            (field_name, Counter(dict(
+                (value, count) for value, count in value_counts)))
+            for field_name, value_counts in self.counts.iteritems()
+        )
+
+    def set_counters(self, counters):
+        self.counts = dict(
+            (field_name, [[value, count] for value, count
+                          in counter.iteritems()])
+            for field_name, counter in counters.iteritems()
+        )
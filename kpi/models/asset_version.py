@@ -1,6 +1,9 @@
 import json
 import hashlib
 import datetime
+import threading
+from collections import OrderedDict
+from django.conf import settings
 from django.utils import timezone
 
 from django.db import models
@@ -8,11 +11,91 @@ from django.db import models
 from jsonbfield.fields import JSONField as JSONBField
 from reversion.models import Version
 from ..fields import KpiUidField
+from ..utils.json_patch import apply_patch, make_patch
 from ..utils.kobo_to_xlsform import to_xlsform_structure
 
 from formpack.utils.expand_content import expand_content
 
 DEFAULT_DATETIME = datetime.datetime(2010, 1, 1)
+# Store a version in full instead of as a delta when the delta would be larger
+# than this fraction of the full content
+MAXIMUM_DELTA_RATIO = 0.5
+# Number of keyframe contents kept in memory by each process to rebuild the
+# content of versions stored as deltas
+MAXIMUM_CACHED_KEYFRAMES = 100
+
+_keyframes_contents = OrderedDict()
+_keyframes_contents_lock = threading.Lock()
+
+
+def get_keyframe_content(keyframe_id):
+    '''
+    Return the content of the keyframe with primary key `keyframe_id`, which
+    callers must not modify. Keyframes never change, so they are cached
+    '''
+    with _keyframes_contents_lock:
+        try:
+            content = _keyframes_contents.pop(keyframe_id)
+        except KeyError:
+            pass
+        else:
+            _keyframes_contents[keyframe_id] = content
+            return content
+    content = AssetVersion.objects.filter(pk=keyframe_id).values_list(
+        '_version_content', flat=True)[0]
+    with _keyframes_contents_lock:
+        _keyframes_contents[keyframe_id] = content
+        while len(_keyframes_contents) > MAXIMUM_CACHED_KEYFRAMES:
+            _keyframes_contents.popitem(last=False)
+    return content
+
+
+def make_content_delta(keyframe_content, content):
+    '''
+    Return the patch that turns `keyframe_content` into `content`, or `None`
+    if storing `content` in full is preferable
+    '''
+    patch = make_patch(keyframe_content, content)
+    if len(json.dumps(patch)) > \
+            MAXIMUM_DELTA_RATIO * len(json.dumps(content)):
+        return None
+    return patch
+
+
+def get_content_hash(content):
+    '''
+    Return the hash stored in `AssetVersion.content_hash`, which identifies
+    content exactly
+    '''
+    return hashlib.sha1(json.dumps(content, sort_keys=True)).hexdigest()
+
+
+def get_content_digest(content):
+    '''
+    Return a digest of `content` that ignores `$kuid`s, which change without
+    any change to the form itself
+    '''
+    content = dict(content or {})
+    for kuid_containing in 'survey', 'choices':
+        if isinstance(content.get(kuid_containing), list):
+            content[kuid_containing] = [
+                dict((key, value) for key, value in row.iteritems()
+                     if key != '$kuid') if isinstance(row, dict) else row
+                for row in content[kuid_containing]
+            ]
+    return hashlib.sha1(json.dumps(
+        content, sort_keys=True, separators=(',', ':'))).hexdigest()
+
+
+def materialize_dependent_versions(collector, field, sub_objs, using):
+    '''
+    `on_delete` handler of `AssetVersion._keyframe`: store the versions that
+    depend on a deleted keyframe in full, unless they are being deleted too
+    '''
+    deleted_versions = collector.data.get(sub_objs.model, ())
+    for version in sub_objs:
+        if version not in deleted_versions:
+            version.store_in_full()
 
 
 class AssetVersion(models.Model):
@@ -27,15 +110,120 @@ class AssetVersion(models.Model):
                                               null=True,
                                               on_delete=models.SET_NULL,
                                               )
-    version_content = JSONBField()
+    # The content of the version, or `None` when the version is stored as a
+    # delta. Use `version_content` to read and write it in either case
+    _version_content = JSONBField(db_column='version_content', null=True)
+    # When `ASSET_VERSION_DELTA_STORAGE` is enabled, most versions are stored
+    # as a patch (`_content_delta`) against the latest version of the same
+    # asset stored in full (`_keyframe`)
+    _keyframe = models.ForeignKey('self', null=True, related_name='+',
+                                  on_delete=materialize_dependent_versions)
+    _content_delta = JSONBField(null=True)
+    # The result of `get_content_hash()` on `version_content`, set when the
+    # version is first saved; versions never change, so neither does this
+    content_hash = models.CharField(max_length=40, null=True, db_index=True)
+    # The result of `get_content_digest()` on `version_content`, used to avoid
+    # saving versions that would duplicate the latest one
+    content_digest = models.CharField(max_length=40, null=True)
     uid_aliases = JSONBField(null=True)
     deployed_content = JSONBField(null=True)
+    # The result of `expand_content()` on `_deployed_content()`, saved the
+    # first time `to_formpack_schema()` needs it. Versions never change, so
+    # neither does this
+    expanded_content = JSONBField(null=True)
     _deployment_data = JSONBField(default=False)
     deployed = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['-date_modified']
 
+    @property
+    def version_content(self):
+        if self._keyframe_id is None:
+            return self._version_content
+        try:
+            return self._rebuilt_content
+        except AttributeError:
+            self._rebuilt_content = apply_patch(
+                get_keyframe_content(self._keyframe_id), self._content_delta)
+            return self._rebuilt_content
+
+    @version_content.setter
+    def version_content(self, content):
+        self._version_content = content
+        self._keyframe_id = None
+        self._content_delta = None
+
+    def ensure_content_hash(self):
+        '''
+        Return `content_hash`, after computing and storing it if this version
+        was saved before the column was populated
+        '''
+        if self.content_hash is None:
+            self.content_hash = get_content_hash(self.version_content)
+            # Write this column only, not the whole row and its content
+            AssetVersion.objects.filter(pk=self.pk).update(
+                content_hash=self.content_hash)
+        return self.content_hash
+
+    def save(self, *args, **kwargs):
+        if self.content_hash is None:
+            self.content_hash = get_content_hash(self.version_content)
+        if self._state.adding and self._keyframe_id is None and \
+                settings.ASSET_VERSION_DELTA_STORAGE:
+            self.store_as_delta()
+        return super(AssetVersion, self).save(*args, **kwargs)
+
+    def store_as_delta(self, keyframe_id=None):
+        '''
+        Replace the content of this version, which must be stored in full, by a
+        patch against `keyframe_id`, which defaults to the latest keyframe of
+        the asset. Do nothing if this version should remain a keyframe: when it
+        is the first version of its asset or other versions depend on it, when
+        `ASSET_VERSION_KEYFRAME_INTERVAL` versions already depend on the
+        keyframe, or when the patch would be too large. Changes are not saved.
+        Return whether the version is now stored as a delta
+        '''
+        if self.pk is not None and AssetVersion.objects.filter(
+                _keyframe_id=self.pk).exists():
+            # Other versions depend on this one
+            return False
+        if keyframe_id is None:
+            keyframes = AssetVersion.objects.filter(
+                asset_id=self.asset_id, _keyframe=None)
+            if self.pk is not None:
+                keyframes = keyframes.filter(pk__lt=self.pk)
+            keyframe_id = keyframes.order_by('-pk').values_list(
+                'pk', flat=True).first()
+            if keyframe_id is None:
+                return False
+        if AssetVersion.objects.filter(_keyframe_id=keyframe_id).count() >= \
+                settings.ASSET_VERSION_KEYFRAME_INTERVAL - 1:
+            return False
+        content = self._version_content
+        delta = make_content_delta(get_keyframe_content(keyframe_id), content)
+        if delta is None:
+            return False
+        self._version_content = None
+        self._keyframe_id = keyframe_id
+        self._content_delta = delta
+        self._rebuilt_content = content
+        return True
+
+    def store_in_full(self):
+        '''
+        Store the content of this version in full, so that it no longer
+        depends on a keyframe, and save that change immediately
+        '''
+        if self._keyframe_id is None:
+            return
+        self.version_content = self.version_content
+        AssetVersion.objects.filter(pk=self.pk).update(
+            _version_content=self._version_content,
+            _keyframe=None,
+            _content_delta=None,
+        )
+
     def _deployed_content(self):
         if self.deployed_content is not None:
             return self.deployed_content
@@ -48,19 +236,17 @@ class AssetVersion(models.Model):
                                         move_autonames=True)
 
     def to_formpack_schema(self):
+        if self.expanded_content is None:
+            self.expanded_content = expand_content(self._deployed_content())
+            if self.pk is not None:
+                AssetVersion.objects.filter(pk=self.pk).update(
+                    expanded_content=self.expanded_content)
         return {
-            'content': expand_content(self._deployed_content()),
+            'content': self.expanded_content,
             'version': self.uid,
             'version_id_key': '__version__',
         }
 
-    @property
-    def content_hash(self):
-        # used to determine changes in the content from version to version
-        # not saved, only compared with other asset_versions
-        _json_string = json.dumps(self.version_content, sort_keys=True)
-        return hashlib.sha1(_json_string).hexdigest()
-
     def __unicode__(self):
         return '{}@{} T{}{}'.format(self.asset.uid, self.uid,
                     self.date_modified.strftime('%Y-%m-%d %H:%M'),
@@ -0,0 +1,100 @@
+import hashlib
+import json
+from datetime import timedelta
+
+import pkg_resources
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from jsonfield import JSONField
+
+# Distributions whose code turns sources into XForm XML; a new version of any
+# of them makes every cached XForm obsolete
+XFORM_GENERATORS = ('formpack', 'pyxform')
+# `date_accessed` is only updated when it is older than this, so that reads
+# rarely cause writes
+ACCESS_RESOLUTION = timedelta(hours=1)
+
+
+def get_generator_versions():
+    versions = {}
+    for name in XFORM_GENERATORS:
+        try:
+            versions[name] = pkg_resources.get_distribution(name).version
+        except pkg_resources.DistributionNotFound:
+            versions[name] = None
+    return versions
+
+
+class CachedXForm(models.Model):
+    '''
+    XForm XML generated from a source, shared by all `AssetSnapshot`s whose
+    source is the same once prepared for pyxform, e.g. clones, forms created
+    from templates, or redeployments of unchanged content. Entries that have
+    not been used for `XFORM_CACHE_MAXIMUM_AGE_DAYS`, and the least recently
+    used beyond `XFORM_CACHE_MAXIMUM_ENTRIES`, are removed by `evict()`
+    '''
+    content_hash = models.CharField(max_length=64, unique=True)
+    xml = models.TextField()
+    details = JSONField(default=dict)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_accessed = models.DateTimeField(default=timezone.now, db_index=True)
+
+    _generator_versions = None
+
+    @classmethod
+    def get_key(cls, source, **options):
+        '''
+        Return the hash of `source`, the keyword arguments that affect the
+        generated XML, and the versions of `XFORM_GENERATORS`
+        '''
+        if cls._generator_versions is None:
+            cls._generator_versions = get_generator_versions()
+        return hashlib.sha256(json.dumps({
+            'generators': cls._generator_versions,
+            'options': options,
+            'source': source,
+        }, sort_keys=True)).hexdigest()
+
+    @classmethod
+    def get(cls, content_hash):
+        try:
+            entry = cls.objects.get(content_hash=content_hash)
+        except cls.DoesNotExist:
+            return None
+        now = timezone.now()
+        if entry.date_accessed < now - ACCESS_RESOLUTION:
+            cls.objects.filter(pk=entry.pk).update(date_accessed=now)
+        return entry
+
+    @classmethod
+    def store(cls, content_hash, xml, details):
+        try:
+            with transaction.atomic():
+                cls.objects.create(content_hash=content_hash, xml=xml,
+                                   details=details)
+        except IntegrityError:
+            # Another process generated the same XML meanwhile
+            pass
+
+    @classmethod
+    def evict(cls, maximum_age_days=None, maximum_entries=None):
+        '''
+        Remove entries not accessed in the last `maximum_age_days`, then the
+        least recently accessed ones beyond `maximum_entries`. Both default to
+        the corresponding settings. Return the number of entries removed
+        '''
+        if maximum_age_days is None:
+            maximum_age_days = settings.XFORM_CACHE_MAXIMUM_AGE_DAYS
+        if maximum_entries is None:
+            maximum_entries = settings.XFORM_CACHE_MAXIMUM_ENTRIES
+        threshold = timezone.now() - timedelta(days=maximum_age_days)
+        expired = cls.objects.filter(date_accessed__lt=threshold)
+        removed = expired.count()
+        expired.delete()
+        excess_pks = list(cls.objects.order_by(
+            '-date_accessed', '-pk').values_list('pk', flat=True)[
+                maximum_entries:])
+        if excess_pks:
+            cls.objects.filter(pk__in=excess_pks).delete()
+        return removed + len(excess_pks)
@@ -16,7 +16,11 @@ from asset import (
     KpiTaggableManager,
     TagStringMixin,
 )
-from object_permission import ObjectPermission, ObjectPermissionMixin
+from object_permission import (
+    EffectiveObjectPermission,
+    ObjectPermission,
+    ObjectPermissionMixin,
+)
 from ..haystack_utils import update_object_in_search_index
 from ..fields import KpiUidField
 
@@ -118,6 +122,19 @@ class Collection(ObjectPermissionMixin, TagStringMixin, MPTTModel):
         ''' Returns all children, both Assets and Collections '''
         return CollectionChildrenQuerySet(self)
 
+    def get_descendant_querysets(self):
+        ''' Returns a QuerySet of all descendant Collections and another of
+        all Assets within this Collection or its descendants, found using the
+        MPTT fields instead of walking the tree '''
+        return (
+            self.get_descendants(),
+            Asset.objects.filter(
+                parent__tree_id=self.tree_id,
+                parent__lft__gte=self.lft,
+                parent__rght__lte=self.rght,
+            ),
+        )
+
     def __unicode__(self):
         return self.name
 
@@ -126,6 +143,7 @@ class Collection(ObjectPermissionMixin, TagStringMixin, MPTTModel):
 def post_delete_collection(sender, instance, **kwargs):
     # Remove all permissions associated with this object
     ObjectPermission.objects.filter_for_object(instance).delete()
+    EffectiveObjectPermission.objects.filter_for_object(instance).delete()
     # No recalculation is necessary since children will also be deleted
 
 
@@ -1,6 +1,8 @@
 import re
+import json
 import pytz
 import base64
+import hashlib
 import datetime
 import requests
 import tempfile
@@ -14,7 +16,7 @@ from jsonfield import JSONField
 from django.conf import settings
 from rest_framework import exceptions
 from django.db import models, transaction
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
 from private_storage.fields import PrivateFileField
 from django.core.urlresolvers import Resolver404, resolve
 from django.utils.six.moves.urllib import parse as urlparse
@@ -87,7 +89,10 @@ def _resolve_url_to_asset_or_collection(item_path):
 class ImportExportTask(models.Model):
     '''
     A common base model for asynchronous import and exports. Must be
-    subclassed to be useful. Subclasses must implement the `_run_task()` method
+    subclassed to be useful. Subclasses must implement the `_run_task()` method,
+    which may return `DEFERRED` when it has handed its work over to other
+    asynchronous tasks. Those then become responsible for setting the final
+    status
     '''
 
     class Meta:
@@ -105,6 +110,8 @@ class ImportExportTask(models.Model):
         (COMPLETE, COMPLETE),
     )
 
+    DEFERRED = 'deferred'
+
     user = models.ForeignKey('auth.User')
     data = JSONField()
     messages = JSONField(default={})
@@ -137,7 +144,8 @@ class ImportExportTask(models.Model):
         msgs = defaultdict(list)
         try:
             # This method must be implemented by a subclass
-            self._run_task(msgs)
+            if self._run_task(msgs) == self.DEFERRED:
+                return
             self.status = self.COMPLETE
         except Exception as err:
             msgs['error_type'] = type(err).__name__
@@ -396,11 +404,35 @@ class ExportTask(ImportExportTask):
              | 123                             |
 
         The default is `['hxl']`
+    * `incremental`: optional; when `true`, a CSV export copies the result of
+                     the user's most recent export with the same options and
+                     appends only the submissions received since then. Falls
+                     back to a full export whenever that previous result cannot
+                     be trusted, e.g. after a redeployment or the deletion of
+                     submissions. Edits to already-exported submissions are
+                     *not* reflected. Ignored for other export types
+
+    * `sharded`: optional; when `true`, a CSV export of more than
+                 `settings.EXPORT_SHARD_SIZE` submissions is split by `_id`
+                 range into shards that are rendered in parallel by separate
+                 Celery tasks and then concatenated in order. Ignored for other
+                 export types, and when an incremental export is possible
+
+    Once complete, `data['submission_count']` holds the number of submissions
+    included in the export.
+
+    Results are cached: `cache_key` identifies the deployed versions, options,
+    export type, submission count and timestamp, and time of the latest edit
+    to any submission that produced `result`.
+    An export whose key matches a previous, complete export of any user gets
+    a copy of that result instead of regenerating it. See
+    `evict_from_cache()` for how the cache is kept in check.
     '''
 
     uid = KpiUidField(uid_prefix='e')
     last_submission_time = models.DateTimeField(null=True)
     result = PrivateFileField(upload_to=export_upload_to, max_length=380)
+    cache_key = models.CharField(max_length=64, null=True, db_index=True)
 
     COPY_FIELDS = (
         '_id',
@@ -419,6 +451,21 @@ class ExportTask(ImportExportTask):
     }
 
     TIMESTAMP_KEY = '_submission_time'
+    # Keys of `data` that do not affect the contents of an export, and so are
+    # disregarded when looking for a previous export to extend
+    INCREMENTAL_IGNORED_DATA_KEYS = (
+        'incremental',
+        'processing_time_seconds',
+        'result_size',
+        'sharded',
+        'shards',
+        'submission_count',
+    )
+    # Keys of `data` that are not options of the export, and so are
+    # disregarded when building `cache_key`
+    CACHE_IGNORED_DATA_KEYS = INCREMENTAL_IGNORED_DATA_KEYS
+    CSV_INDEX_RE = re.compile(br'"(\d+)"\r\n$')
+    COPY_CHUNK_SIZE = 5 * 1024 * 1024
     # Above 244 seems to cause 'Download error' in Chrome 64/Linux
     MAXIMUM_FILENAME_LENGTH = 240
 
@@ -509,7 +556,8 @@ class ExportTask(ImportExportTask):
         '''
         Internal generator that yields each submission in the given
         `submission_stream` while recording the most recent submission
-        timestamp in `self.last_submission_time`
+        timestamp in `self.last_submission_time` and counting the submissions
+        in `self.data['submission_count']`
         '''
         # FIXME: Mongo has only per-second resolution. Brutal.
         for submission in submission_stream:
@@ -527,8 +575,438 @@ class ExportTask(ImportExportTask):
                         timestamp > self.last_submission_time
                 ):
                     self.last_submission_time = timestamp
+            self.data['submission_count'] += 1
             yield submission
 
+    @property
+    def _incremental(self):
+        return self.data.get('incremental', '').lower() == 'true'
+
+    def _get_incremental_base_export(self, source, source_url):
+        '''
+        Internal method to find a previous export of `source` whose result
+        can be extended with newer submissions instead of being regenerated.
+        Returns `None` unless a completed CSV export with identical options
+        exists, no version has been deployed and none of the submissions it
+        includes has been edited since it was created, and its
+        `last_submission_time` is safely in the past with respect to the
+        per-second resolution of Mongo timestamps
+        '''
+        def comparable_options(data):
+            return dict(
+                (key, value) for key, value in data.iteritems()
+                if key not in self.INCREMENTAL_IGNORED_DATA_KEYS
+            )
+
+        options = comparable_options(self.data)
+        previous_exports = self._filter_by_source_kludge(
+            ExportTask.objects.filter(
+                user=self.user,
+                status=self.COMPLETE,
+                last_submission_time__isnull=False,
+            ).exclude(pk=self.pk), source_url
+        ).order_by('-date_created')
+        for previous_export in previous_exports:
+            if (
+                    'submission_count' in previous_export.data and
+                    comparable_options(previous_export.data) == options
+            ):
+                base_export = previous_export
+                break
+        else:
+            return None
+
+        latest_version = source.deployed_versions.first()
+        if (
+                latest_version is not None and
+                latest_version.date_modified > base_export.date_created
+        ):
+            return None
+        # The rows of submissions that have been edited, or whose validation
+        # status has changed, would be stale
+        last_modification_time = source.deployment.get_last_modification_time(
+            submitted_before=base_export.last_submission_time)
+        if (
+                last_modification_time is not None and
+                last_modification_time > base_export.date_created
+        ):
+            return None
+        # A submission received during the same second as the watermark, but
+        # after the previous export read its submissions, would otherwise
+        # never be exported
+        if base_export.date_created <= (
+                base_export.last_submission_time +
+                datetime.timedelta(seconds=1)
+        ):
+            return None
+        return base_export
+
+    def _build_formpack(self, source, base_export=None, start_after=None,
+                        end_at=None):
+        '''
+        Internal method to build the `FormPack` and submission stream for
+        `source`, retrieving only the submissions newer than those already
+        included in `base_export` if it is given, and only those whose `_id`
+        is greater than `start_after` and at most `end_at` if they are given
+        '''
+        if base_export is None:
+            submitted_after = None
+        else:
+            submitted_after = base_export.last_submission_time.astimezone(
+                pytz.UTC)
+
+        if isinstance(source.deployment, MockDeploymentBackend):
+            # Currently used only for unit testing (`MockDeploymentBackend`)
+            # TODO: Have the KC backend also implement `_get_submissions()`?
+            submission_stream = source.deployment.get_submissions(
+                submitted_after=submitted_after, start_after=start_after,
+                end_at=end_at)
+        else:
+            submission_stream = None
+
+        pack, submission_stream = build_formpack(
+            source, submission_stream, self._fields_from_all_versions,
+            submitted_after=submitted_after, start_after=start_after,
+            end_at=end_at
+        )
+
+        # Wrap the submission stream in a generator that records the most
+        # recent timestamp
+        if base_export is None:
+            self.last_submission_time = None
+            self.data['submission_count'] = 0
+        else:
+            self.last_submission_time = base_export.last_submission_time
+            self.data['submission_count'] = base_export.data[
+                'submission_count']
+        submission_stream = self._record_last_submission_time(
+            submission_stream)
+
+        return pack, submission_stream
+
+    @staticmethod
+    def _encode_csv_lines(lines):
+        for line in lines:
+            yield (line + u"\r\n").encode('utf-8')
+
+    def _get_csv_header(self, pack, options):
+        '''
+        Internal method to get the encoded header lines, including any tag
+        rows, that begin every CSV export of `pack` with the given `options`
+        '''
+        return list(self._encode_csv_lines(
+            pack.export(**options).to_csv([])))
+
+    def _starts_with(self, export_task, header_lines):
+        '''
+        Internal method to check that the result of `export_task` begins with
+        exactly `header_lines`, i.e. that its columns have not changed
+        '''
+        header = b''.join(header_lines)
+        try:
+            with export_task.result.storage.open(
+                    export_task.result.name, 'rb') as base_file:
+                return base_file.read(len(header)) == header
+        except (IOError, OSError):
+            return False
+
+    def _write_csv(self, export, output_file, submission_stream,
+                   base_export=None, header_lines=None):
+        '''
+        Internal method to write `export` as CSV. When `base_export` is given,
+        its result is copied first, and then only the rows for the submissions
+        in `submission_stream` are appended with their `_index` continuing
+        from the last row of the previous export
+        '''
+        lines = self._encode_csv_lines(export.to_csv(submission_stream))
+        if base_export is None:
+            for line in lines:
+                output_file.write(line)
+            return
+
+        self._copy_file(base_export.result.storage, base_export.result.name,
+                        output_file)
+        index_offset = base_export.data['submission_count']
+        for line_number, line in enumerate(lines):
+            if line_number < len(header_lines):
+                continue
+            output_file.write(self._offset_csv_index(line, index_offset))
+
+    def _offset_csv_index(self, line, offset):
+        '''
+        Internal method to add `offset` to the `_index` of an encoded CSV row
+        '''
+        if not offset:
+            return line
+        # `force_index` always makes `_index` the final column
+        return self.CSV_INDEX_RE.sub(
+            lambda match: b'"{}"\r\n'.format(int(match.group(1)) + offset),
+            line
+        )
+
+    def _copy_file(self, storage, name, output_file):
+        '''
+        Internal method to copy the file `name` from `storage` to the end of
+        `output_file` in chunks
+        '''
+        with storage.open(name, 'rb') as input_file:
+            while True:
+                chunk = input_file.read(self.COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                output_file.write(chunk)
+
+    def _write_result(self, export, export_type, submission_stream,
+                      base_export=None, header_lines=None):
+        '''
+        Internal method to write `export` in the given `export_type` to the
+        `self.result` file, which must already exist
+        '''
+        with self.result.storage.open(self.result.name, 'wb') as output_file:
+            if export_type == 'csv':
+                self._write_csv(export, output_file, submission_stream,
+                                base_export, header_lines)
+            elif export_type == 'xls':
+                # XLSX export actually requires a filename (limitation of
+                # pyexcelerate?)
+                with tempfile.NamedTemporaryFile(
+                        prefix='export_xlsx', mode='rb'
+                ) as xlsx_output_file:
+                    export.to_xlsx(xlsx_output_file.name, submission_stream)
+                    # TODO: chunk again once
+                    # https://github.com/jschneier/django-storages/issues/449
+                    # is fixed
+                    # TODO: Check if monkey-patch (line 57) can restore writing
+                    # by chunk
+                    '''
+                    while True:
+                        chunk = xlsx_output_file.read(5 * 1024 * 1024)
+                        if chunk:
+                            output_file.write(chunk)
+                        else:
+                            break
+                    '''
+                    output_file.write(xlsx_output_file.read())
+            elif export_type == 'spss_labels':
+                export.to_spss_labels(output_file)
+
+    def _build_cache_key(self, source, export_type):
+        '''
+        Internal method to build the `cache_key` for exporting `source`. Every
+        input of `_build_export_options()` is either one of the options in
+        `self.data` or determined by the deployed versions, so the key can be
+        built without the expense of `build_formpack()`
+        '''
+        options = dict(
+            (key, value) for key, value in self.data.iteritems()
+            if key not in self.CACHE_IGNORED_DATA_KEYS
+        )
+        last_submission_time = source.deployment.last_submission_time
+        if last_submission_time is not None:
+            last_submission_time = last_submission_time.isoformat()
+        # Edits to submissions, including changes to their validation status,
+        # change neither their count nor the time of the last one
+        last_modification_time = source.deployment.last_modification_time
+        if last_modification_time is not None:
+            last_modification_time = last_modification_time.isoformat()
+        key_material = json.dumps({
+            'versions': list(
+                source.deployed_versions.values_list('uid', flat=True)),
+            'options': options,
+            'type': export_type,
+            'submission_count': source.deployment.submission_count,
+            'last_submission_time': last_submission_time,
+            'last_modification_time': last_modification_time,
+        }, sort_keys=True)
+        return hashlib.sha256(key_material).hexdigest()
+
+    def _get_cached_export(self):
+        '''
+        Internal method to find the newest complete export whose `cache_key`
+        matches this one and whose result still exists
+        '''
+        cached_export = ExportTask.objects.filter(
+            cache_key=self.cache_key,
+            status=self.COMPLETE,
+        ).exclude(pk=self.pk).exclude(result='').order_by(
+            '-date_created').first()
+        if cached_export is None or not cached_export.result.storage.exists(
+                cached_export.result.name):
+            return None
+        return cached_export
+
+    def _copy_cached_export(self, cached_export):
+        '''
+        Internal method to make this export a copy of `cached_export`
+        '''
+        with cached_export.result.storage.open(
+                cached_export.result.name, 'rb') as cached_file:
+            self.result.save(
+                posixpath.basename(cached_export.result.name),
+                File(cached_file)
+            )
+        self.last_submission_time = cached_export.last_submission_time
+        for key in ('submission_count', 'result_size'):
+            if key in cached_export.data:
+                self.data[key] = cached_export.data[key]
+        self.save(update_fields=[
+            'result', 'last_submission_time', 'data', 'cache_key'])
+
+    @property
+    def _sharded(self):
+        return self.data.get('sharded', '').lower() == 'true'
+
+    def _plan_shards(self, source):
+        '''
+        Internal method to split the submissions of `source` by `_id` range
+        into shards of `settings.EXPORT_SHARD_SIZE` submissions. The last
+        shard is open-ended so that it picks up any submission received in the
+        meantime. Rather than retrieving every `_id`, each boundary is found
+        by asking for the last `_id` of the shard and the one after it
+        '''
+        shard_size = settings.EXPORT_SHARD_SIZE
+        shards = []
+        start_after = None
+        offset = 0
+        while True:
+            boundary_ids = source.deployment.get_submission_ids(
+                start_after=start_after, skip=shard_size - 1, limit=2)
+            # Only close this shard if another submission follows it
+            end_at = boundary_ids[0] if len(boundary_ids) == 2 else None
+            shards.append({
+                'start_after': start_after,
+                'end_at': end_at,
+                'offset': offset,
+            })
+            if end_at is None:
+                return shards
+            start_after = end_at
+            offset += shard_size
+
+    def _get_shard_filename(self, shard_index):
+        return posixpath.join(
+            self.user.username,
+            'exports',
+            'shards',
+            '{}-{}.csv'.format(self.uid, shard_index)
+        )
+
+    def render_shard(self, shard_index):
+        '''
+        Render the CSV rows of one shard, as planned by `_plan_shards()`, into
+        a fragment file. Only the first shard includes the header. The shard
+        that finishes last assembles the result. Catches all exceptions,
+        marking the whole export as errored!
+        '''
+        shard = self.data['shards'][shard_index]
+        try:
+            source_url = self.data['source']
+            source = _resolve_url_to_asset_or_collection(source_url)[1]
+            pack, submission_stream = self._build_formpack(
+                source, start_after=shard['start_after'],
+                end_at=shard['end_at']
+            )
+            options = self._build_export_options(pack)
+            if shard_index:
+                header_line_count = len(self._get_csv_header(pack, options))
+            else:
+                header_line_count = 0
+            lines = self._encode_csv_lines(
+                pack.export(**options).to_csv(submission_stream))
+            storage = self.result.storage
+            fragment_name = storage.save(
+                self._get_shard_filename(shard_index), ContentFile(''))
+            with storage.open(fragment_name, 'wb') as fragment_file:
+                for line_number, line in enumerate(lines):
+                    if line_number < header_line_count:
+                        continue
+                    fragment_file.write(
+                        self._offset_csv_index(line, shard['offset']))
+        except Exception as err:
+            logging.error(
+                'Failed to render shard {} of {}: {}'.format(
+                    shard_index, self._meta.model_name, repr(err)),
+                exc_info=True
+            )
+            self._fail_shards(err)
+            return
+
+        if self.last_submission_time is not None:
+            last_submission_time = self.last_submission_time.isoformat()
+        else:
+            last_submission_time = None
+        with transaction.atomic():
+            export_task = ExportTask.objects.select_for_update().get(
+                pk=self.pk)
+            export_task.data['shards'][shard_index].update({
+                'fragment': fragment_name,
+                'submission_count': self.data['submission_count'],
+                'last_submission_time': last_submission_time,
+            })
+            export_task.save(update_fields=['data'])
+        if export_task.status != self.PROCESSING:
+            # Another shard has failed
+            storage.delete(fragment_name)
+        elif all('fragment' in s for s in export_task.data['shards']):
+            export_task._assemble_shards()
+
+    @transaction.atomic
+    def _fail_shards(self, err):
+        '''
+        Internal method to mark a sharded export as errored and discard the
+        fragments rendered so far
+        '''
+        export_task = ExportTask.objects.select_for_update().get(pk=self.pk)
+        if export_task.status == self.ERROR:
+            return
+        export_task.status = self.ERROR
+        export_task.messages.update({
+            'error_type': type(err).__name__,
+            'error': err.message,
+        })
+        export_task.save(update_fields=['status', 'messages'])
+        for shard in export_task.data['shards']:
+            if 'fragment' in shard:
+                self.result.storage.delete(shard['fragment'])
+
+    def _assemble_shards(self):
+        '''
+        Internal method to concatenate the fragments of every shard, in
+        order, into the `self.result` file and complete the export
+        '''
+        source_url = self.data['source']
+        source = _resolve_url_to_asset_or_collection(source_url)[1]
+        pack = build_formpack(source, [], self._fields_from_all_versions)[0]
+        export = pack.export(**self._build_export_options(pack))
+        self.result.save(self._build_export_filename(export, 'csv'),
+                         ContentFile(''))
+        self.result.close()
+        self.result.file.close()
+        storage = self.result.storage
+        with storage.open(self.result.name, 'wb') as output_file:
+            for shard in self.data['shards']:
+                self._copy_file(storage, shard['fragment'], output_file)
+        for shard in self.data['shards']:
+            storage.delete(shard['fragment'])
+        self.result.open('rb')
+
+        self.data['submission_count'] = sum(
+            shard['submission_count'] for shard in self.data['shards'])
+        last_submission_times = [
+            dateutil.parser.parse(shard['last_submission_time'])
+                for shard in self.data['shards']
+                if shard['last_submission_time']
+        ]
+        self.last_submission_time = max(last_submission_times or [None])
+        self.data['result_size'] = self.result.size
+        self.data['processing_time_seconds'] = (
+            datetime.datetime.now(self.date_created.tzinfo) - self.date_created
+        ).total_seconds()
+        self.status = self.COMPLETE
+        self.save(update_fields=[
+            'result', 'last_submission_time', 'data', 'status'])
+        self.remove_excess(self.user, source_url)
+
     def _run_task(self, messages):
         '''
         Generate the export and store the result in the `self.result`
@@ -563,22 +1041,41 @@ class ExportTask(ImportExportTask):
         # Take this opportunity to do some housekeeping
         self.log_and_mark_stuck_as_errored(self.user, source_url)
 
-        if isinstance(source.deployment, MockDeploymentBackend):
-            # Currently used only for unit testing (`MockDeploymentBackend`)
-            # TODO: Have the KC backend also implement `_get_submissions()`?
-            submission_stream = source.deployment.get_submissions()
-        else:
-            submission_stream = None
-
-        pack, submission_stream = build_formpack(
-            source, submission_stream, self._fields_from_all_versions)
-
-        # Wrap the submission stream in a generator that records the most
-        # recent timestamp
-        submission_stream = self._record_last_submission_time(
-            submission_stream)
+        self.cache_key = self._build_cache_key(source, export_type)
+        cached_export = self._get_cached_export()
+        if cached_export is not None:
+            self._copy_cached_export(cached_export)
+            self.remove_excess(self.user, source_url)
+            return
 
+        # Only CSV files can be appended to; other types are always generated
+        # in full
+        base_export = None
+        header_lines = None
+        if self._incremental and export_type == 'csv':
+            base_export = self._get_incremental_base_export(
+                source, source_url)
+
+        if base_export is None and self._sharded and export_type == 'csv':
+            shards = self._plan_shards(source)
+            if len(shards) > 1:
+                # Import here to avoid a circular import
+                from kpi.tasks import render_export_shard
+                self.data['shards'] = shards
+                self.save(update_fields=['data', 'cache_key'])
+                for shard_index in xrange(len(shards)):
+                    render_export_shard.delay(
+                        export_task_uid=self.uid, shard_index=shard_index)
+                return self.DEFERRED
+
+        pack, submission_stream = self._build_formpack(source, base_export)
         options = self._build_export_options(pack)
+        if base_export is not None:
+            header_lines = self._get_csv_header(pack, options)
+            if not self._starts_with(base_export, header_lines):
+                base_export = None
+                pack, submission_stream = self._build_formpack(source)
+
         export = pack.export(**options)
         filename = self._build_export_filename(export, export_type)
         self.result.save(filename, ContentFile(''))
@@ -587,37 +1084,25 @@ class ExportTask(ImportExportTask):
         # https://code.djangoproject.com/ticket/13809
         self.result.close()
         self.result.file.close()
-        with self.result.storage.open(self.result.name, 'wb') as output_file:
-            if export_type == 'csv':
-                for line in export.to_csv(submission_stream):
-                    output_file.write((line + u"\r\n").encode('utf-8'))
-            elif export_type == 'xls':
-                # XLSX export actually requires a filename (limitation of
-                # pyexcelerate?)
-                with tempfile.NamedTemporaryFile(
-                        prefix='export_xlsx', mode='rb'
-                ) as xlsx_output_file:
-                    export.to_xlsx(xlsx_output_file.name, submission_stream)
-                    # TODO: chunk again once
-                    # https://github.com/jschneier/django-storages/issues/449
-                    # is fixed
-                    # TODO: Check if monkey-patch (line 57) can restore writing
-                    # by chunk
-                    '''
-                    while True:
-                        chunk = xlsx_output_file.read(5 * 1024 * 1024)
-                        if chunk:
-                            output_file.write(chunk)
-                        else:
-                            break
-                    '''
-                    output_file.write(xlsx_output_file.read())
-            elif export_type == 'spss_labels':
-                export.to_spss_labels(output_file)
+        self._write_result(export, export_type, submission_stream,
+                           base_export, header_lines)
+
+        if (
+                base_export is not None and
+                self.data['submission_count'] !=
+                source.deployment.submission_count
+        ):
+            # Submissions have been deleted since the previous export (or
+            # have arrived while this one was running). Its rows can no
+            # longer be trusted, so start over from scratch
+            pack, submission_stream = self._build_formpack(source)
+            export = pack.export(**options)
+            self._write_result(export, export_type, submission_stream)
 
         # Restore the FileField to its typical state
         self.result.open('rb')
-        self.save(update_fields=['last_submission_time'])
+        self.data['result_size'] = self.result.size
+        self.save(update_fields=['last_submission_time', 'data', 'cache_key'])
 
         # Now that a new export has completed successfully, remove any old
         # exports in excess of the per-user, per-form limit
@@ -674,7 +1159,8 @@ class ExportTask(ImportExportTask):
         '''
         Remove a user's oldest exports if they have more than
         settings.MAXIMUM_EXPORTS_PER_USER_PER_FORM exports for a particular
-        form. Returns the number of exports removed.
+        form. Returns the number of exports removed. Afterwards, lets
+        `evict_from_cache()` trim the cached results for the form.
 
         `source` is the source URL as included in the `data` attribute.
         '''
@@ -688,6 +1174,37 @@ class ExportTask(ImportExportTask):
             # The `result` file must be deleted manually
             export.result.delete()
             export.delete()
+        cls.evict_from_cache(source)
+
+    @classmethod
+    def evict_from_cache(cls, source):
+        '''
+        Stop reusing the oldest cached results for a particular form, across
+        all users, once the newer ones add up to more than
+        settings.MAXIMUM_EXPORT_CACHE_BYTES_PER_FORM. Results are copied when
+        reused, so each `cache_key` counts once, at the size of its newest
+        result. Evicted exports remain available to their users until
+        `remove_excess()` deletes them. Returns the number of evicted keys.
+
+        `source` is the source URL as included in the `data` attribute.
+        '''
+        cached_exports = cls._filter_by_source_kludge(
+            cls.objects.filter(cache_key__isnull=False), source
+        ).order_by('-date_created').only('cache_key', 'data')
+        cached_bytes = 0
+        seen_keys = set()
+        evicted_keys = []
+        for export in cached_exports:
+            if export.cache_key in seen_keys:
+                continue
+            seen_keys.add(export.cache_key)
+            cached_bytes += export.data.get('result_size', 0)
+            if cached_bytes > settings.MAXIMUM_EXPORT_CACHE_BYTES_PER_FORM:
+                evicted_keys.append(export.cache_key)
+        if evicted_keys:
+            cls.objects.filter(cache_key__in=evicted_keys).update(
+                cache_key=None)
+        return len(evicted_keys)
 
 
 def _b64_xls_to_dict(base64_encoded_upload):
@@ -1,19 +1,28 @@
 from collections import defaultdict
 from django.apps import apps
 from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError, ImproperlyConfigured
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import User, AnonymousUser, Permission
 from django.conf import settings
+from django.core.cache import caches
 from django.shortcuts import _get_queryset
 import copy
+import functools
 import re
+import threading
+import uuid
 
 from ..fields import KpiUidField
 from ..deployment_backends.kc_access.utils import (
     remove_applicable_kc_permissions,
-    assign_applicable_kc_permissions
+    assign_applicable_kc_permissions,
+    bulk_remove_applicable_kc_permissions,
+    bulk_assign_applicable_kc_permissions
 )
 
 
@@ -75,8 +84,8 @@ def get_objects_for_user(user, perms, klass=None):
             codename = perm
         codenames.add(codename)
         if app_label is not None:
-            new_ctype = ContentType.objects.get(app_label=app_label,
-                permission__codename=codename)
+            new_ctype = permission_registry.get_by_codename(
+                codename, app_label=app_label).content_type
             if ctype is not None and ctype != new_ctype:
                 raise ValidationError("Computed ContentTypes do not match "
                     "(%s != %s)" % (ctype, new_ctype))
@@ -107,21 +116,29 @@ def get_objects_for_user(user, perms, klass=None):
     if user.is_anonymous():
         user = get_anonymous_user()
 
-    # Now we should extract list of pk values for which we would filter queryset
-    user_obj_perms_queryset = (ObjectPermission.objects
-        .filter(user=user)
-        .filter(permission__content_type=ctype)
-        .filter(permission__codename__in=codenames)
-        .filter(deny=False))
-
-    if len(codenames) > 1:
-        counts = user_obj_perms_queryset.values('object_id').annotate(
-            object_pk_count=models.Count('object_id'))
-        user_obj_perms_queryset = counts.filter(object_pk_count__gte=len(codenames))
+    # Translate the codenames into a bitmask that can be compared against
+    # `EffectiveObjectPermission.permission_bits`
+    required_bits = 0
+    try:
+        bits_by_codename = get_permission_bits(ctype.pk)[1]
+    except Permission.DoesNotExist:
+        # This content type has no permissions at all
+        return queryset.none()
+    for codename in codenames:
+        try:
+            required_bits |= bits_by_codename[codename]
+        except KeyError:
+            # Nothing can be granted a permission that does not exist
+            return queryset.none()
 
-    values = user_obj_perms_queryset.values_list('object_id', flat=True)
-    values = list(values)
-    objects = queryset.filter(pk__in=values)
+    # Let the database match the objects with a subquery instead of pulling
+    # a list of primary keys into Python
+    effective_perms_queryset = (EffectiveObjectPermission.objects
+        .filter(user=user, content_type=ctype)
+        .annotate(matched_bits=F('permission_bits').bitand(required_bits))
+        .filter(matched_bits=required_bits))
+    objects = queryset.filter(
+        pk__in=effective_perms_queryset.values('object_id'))
 
     return objects
 
@@ -141,6 +158,338 @@ def get_anonymous_user():
         )
     return user
 
+def _get_allowed_anonymous_permission_pks(content_type):
+    ''' Translate settings.ALLOWED_ANONYMOUS_PERMISSIONS to the primary keys
+    of those permissions that apply to `content_type` '''
+    codenames = set()
+    for perm in settings.ALLOWED_ANONYMOUS_PERMISSIONS:
+        app_label, codename = perm_parse(perm)
+        if app_label == content_type.app_label:
+            codenames.add(codename)
+    return permission_registry.get_pks(content_type, codenames)
+
+
+class PermissionRegistry(object):
+    ''' An in-process registry of every `Permission`, loaded with a single
+    query the first time it is needed. Lookups that miss reload the registry
+    once, in case permissions were created after it was loaded, before raising
+    `Permission.DoesNotExist`. The `share_` and `delete_` permissions
+    calculated by `ObjectPermissionMixin` are precomputed for each content
+    type. Use the module-level `permission_registry` instance. '''
+    def __init__(self):
+        self._loaded = False
+
+    def clear(self):
+        self._loaded = False
+
+    def _load(self):
+        by_pk = {}
+        by_app_label_and_codename = {}
+        by_content_type = defaultdict(list)
+        for permission in Permission.objects.select_related(
+                'content_type').order_by('pk'):
+            by_pk[permission.pk] = permission
+            by_app_label_and_codename[(
+                permission.content_type.app_label, permission.codename
+            )] = permission
+            by_content_type[permission.content_type_id].append(permission)
+        share_pk_by_change_pk = {}
+        delete_pks = {}
+        for content_type_id, permissions in by_content_type.iteritems():
+            pks_by_codename = {p.codename: p.pk for p in permissions}
+            for permission in permissions:
+                if permission.codename.startswith('change_'):
+                    share_codename = re.sub(
+                        '^change_', 'share_', permission.codename, 1)
+                    if share_codename in pks_by_codename:
+                        share_pk_by_change_pk[permission.pk] = \
+                            pks_by_codename[share_codename]
+            delete_pks[content_type_id] = [
+                p.pk for p in permissions if p.codename.startswith('delete_')
+            ]
+        self._by_pk = by_pk
+        self._by_app_label_and_codename = by_app_label_and_codename
+        self._by_content_type_and_codename = {
+            (p.content_type_id, p.codename): p for p in by_pk.itervalues()
+        }
+        self._by_content_type = dict(by_content_type)
+        self._share_pk_by_change_pk = share_pk_by_change_pk
+        self._delete_pks = delete_pks
+        # Bits are only allocated for content types whose effective
+        # permissions are stored; see `get_bits()`
+        self._bits = {}
+        self._loaded = True
+
+    def _lookup(self, attribute, key):
+        if not self._loaded:
+            self._load()
+        try:
+            return getattr(self, attribute)[key]
+        except KeyError:
+            # Perhaps the permission was created after we loaded
+            self._load()
+        try:
+            return getattr(self, attribute)[key]
+        except KeyError:
+            raise Permission.DoesNotExist(
+                'No permission matches {}'.format(repr(key)))
+
+    def get(self, pk):
+        ''' Return the `Permission` with primary key `pk` '''
+        return self._lookup('_by_pk', pk)
+
+    def get_by_codename(self, codename, app_label=None, content_type=None):
+        ''' Return the `Permission` with the given `codename`, qualified by
+        either `app_label` or `content_type` (an instance or primary key) '''
+        if content_type is not None:
+            return self._lookup('_by_content_type_and_codename', (
+                getattr(content_type, 'pk', content_type), codename))
+        return self._lookup('_by_app_label_and_codename', (app_label, codename))
+
+    def get_pks(self, content_type, codenames):
+        ''' Return the primary keys of all `Permission`s of `content_type`
+        whose codename is in `codenames`, silently skipping unknown ones '''
+        pks = []
+        for codename in codenames:
+            try:
+                pks.append(self.get_by_codename(
+                    codename, content_type=content_type).pk)
+            except Permission.DoesNotExist:
+                continue
+        return pks
+
+    def get_share_pk_by_change_pk(self):
+        ''' Return a dictionary mapping the primary key of each `change_`
+        permission to that of its corresponding `share_` permission '''
+        if not self._loaded:
+            self._load()
+        return self._share_pk_by_change_pk
+
+    def get_delete_pks(self, content_type):
+        ''' Return the primary keys of every `delete_` permission of
+        `content_type` '''
+        if not self._loaded:
+            self._load()
+        return self._delete_pks.get(getattr(content_type, 'pk', content_type), [])
+
+    def get_bits(self, content_type):
+        ''' See `get_permission_bits()`. Bits are allocated the first time a
+        content type asks for them, so that only content types which store
+        `EffectiveObjectPermission`s are limited to 63 permissions '''
+        content_type_id = getattr(content_type, 'pk', content_type)
+        if not self._loaded:
+            self._load()
+        try:
+            return self._bits[content_type_id]
+        except KeyError:
+            pass
+        permissions = self._lookup('_by_content_type', content_type_id)
+        if len(permissions) > 63:
+            raise ImproperlyConfigured(
+                'Too many permissions for content type {} to fit in '
+                '`EffectiveObjectPermission.permission_bits`'.format(
+                    content_type_id)
+            )
+        bits = (
+            {p.pk: 1 << index for index, p in enumerate(permissions)},
+            {p.codename: 1 << index for index, p in enumerate(permissions)}
+        )
+        self._bits[content_type_id] = bits
+        return bits
+
+permission_registry = PermissionRegistry()
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(post_migrate)
+def clear_permission_registry(sender, **kwargs):
+    permission_registry.clear()
+
+
+def get_permission_bits(content_type_id, permission_model=Permission):
+    ''' Return a tuple of two dictionaries that map, respectively, the
+    primary keys and the codenames of every `Permission` for the given content
+    type to a single bit of `EffectiveObjectPermission.permission_bits`. Bits
+    are allocated in primary key order, so they remain stable as long as
+    `Permission`s are never deleted; if one is, run the
+    `rebuild_effective_permissions` management command. Pass the historical
+    `permission_model` when calling from a migration. '''
+    if permission_model is Permission:
+        return permission_registry.get_bits(content_type_id)
+    permissions = permission_model.objects.filter(
+        content_type_id=content_type_id).order_by('pk')
+    bits_by_pk = {}
+    bits_by_codename = {}
+    for index, (pk, codename) in enumerate(
+            permissions.values_list('pk', 'codename')):
+        bits_by_pk[pk] = 1 << index
+        bits_by_codename[codename] = 1 << index
+    return bits_by_pk, bits_by_codename
+
+def calculate_effective_permission_bits(permission_rows, bits_by_pk):
+    ''' Reconcile grant and deny permissions into effective grants.
+    `permission_rows` is an iterable of
+    `(object_id, user_id, permission_id, deny)` tuples, and `bits_by_pk` is
+    the first dictionary returned by `get_permission_bits()`. Returns a
+    dictionary of `{(object_id, user_id): permission_bits}`, omitting any pairs
+    left without a single effective grant. '''
+    grant_bits = defaultdict(int)
+    deny_bits = defaultdict(int)
+    for object_id, user_id, permission_id, deny in permission_rows:
+        bits = deny_bits if deny else grant_bits
+        bits[(object_id, user_id)] |= bits_by_pk[permission_id]
+    effective_bits = {}
+    for key, bits in grant_bits.iteritems():
+        bits &= ~deny_bits.get(key, 0)
+        if bits:
+            effective_bits[key] = bits
+    return effective_bits
+
+# Process-local permission cache versions, keyed by
+# `(content_type_id, object_id)`. See `get_permission_cache_version()`
+_local_permission_versions = {}
+# Incremented whenever `_local_permission_versions` is emptied, so that
+# versions never repeat within a process
+_local_permission_generation = [0]
+MAX_LOCAL_PERMISSION_VERSIONS = 10000
+BULK_CREATE_BATCH_SIZE = 1000
+# Objects whose permissions were written inside a transaction that has not
+# committed yet, as `(content_type_id, object_id)` tuples. Their cache versions
+# change again once it commits; see `flush_permission_cache_invalidations()`
+_pending_permission_invalidations = threading.local()
+# Read with `get_permission_cache_stats()`
+_permission_cache_stats = {'hits': 0, 'misses': 0}
+
+def _get_shared_permission_cache():
+    ''' Return the cache named by `settings.OBJECT_PERMISSION_CACHE`, or
+    `None` if permissions should not be cached across requests '''
+    alias = getattr(settings, 'OBJECT_PERMISSION_CACHE', None)
+    if alias:
+        return caches[alias]
+
+def _shared_permission_version_key(content_type_id, object_id):
+    return 'kpi:object_permission_version:{}:{}'.format(
+        content_type_id, object_id)
+
+def get_permission_cache_version(content_type_id, object_id):
+    ''' Return a value that changes every time the `ObjectPermission`s of
+    the given object are written. When a shared cache is configured, the
+    version is stored there so that writes made by any process are noticed;
+    otherwise, only writes made by the current process are '''
+    flush_permission_cache_invalidations()
+    shared_cache = _get_shared_permission_cache()
+    if shared_cache is None:
+        return (
+            _local_permission_generation[0],
+            _local_permission_versions.get((content_type_id, object_id), 0)
+        )
+    key = _shared_permission_version_key(content_type_id, object_id)
+    version = shared_cache.get(key)
+    if version is None:
+        # Never start from a predictable value: it could match results cached
+        # before the version was evicted
+        shared_cache.add(key, uuid.uuid4().hex, None)
+        version = shared_cache.get(key)
+    return version
+
+def invalidate_permission_cache(content_type, object_ids):
+    ''' Discard all cached results of `_get_effective_perms()` for the
+    objects of `content_type` whose primary keys are in `object_ids`. When
+    called inside a transaction, other processes may still read the old
+    permissions from the database and cache them under the new version, so
+    the version changes again once `flush_permission_cache_invalidations()`
+    runs after the transaction commits '''
+    content_type_id = getattr(content_type, 'pk', content_type)
+    if transaction.get_connection().in_atomic_block:
+        try:
+            pending = _pending_permission_invalidations.keys
+        except AttributeError:
+            pending = _pending_permission_invalidations.keys = set()
+        pending.update(
+            (content_type_id, object_id) for object_id in object_ids)
+    if len(_local_permission_versions) > MAX_LOCAL_PERMISSION_VERSIONS:
+        _local_permission_versions.clear()
+        _local_permission_generation[0] += 1
+    for object_id in object_ids:
+        key = (content_type_id, object_id)
+        _local_permission_versions[key] = (
+            _local_permission_versions.get(key, 0) + 1)
+    shared_cache = _get_shared_permission_cache()
+    if shared_cache is not None:
+        shared_cache.set_many({
+            _shared_permission_version_key(content_type_id, object_id):
+                uuid.uuid4().hex for object_id in object_ids
+        }, None)
+
+def flush_permission_cache_invalidations():
+    ''' Change the cache versions of all objects whose permissions were
+    written by this thread inside a transaction, provided that the
+    transaction has ended. Called after every method of
+    `ObjectPermissionMixin` that writes permissions, and before reading cache
+    versions; code that writes permissions by other means inside its own
+    transaction should call it after committing '''
+    pending = getattr(_pending_permission_invalidations, 'keys', None)
+    if not pending or transaction.get_connection().in_atomic_block:
+        return
+    _pending_permission_invalidations.keys = set()
+    object_ids_by_content_type = defaultdict(list)
+    for content_type_id, object_id in pending:
+        object_ids_by_content_type[content_type_id].append(object_id)
+    for content_type_id, object_ids in object_ids_by_content_type.iteritems():
+        invalidate_permission_cache(content_type_id, object_ids)
+
+def invalidates_permission_cache(method):
+    ''' Decorate a method that writes permissions in a transaction, outside
+    `transaction.atomic`, so that cache versions change again once the
+    outermost transaction commits '''
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        finally:
+            flush_permission_cache_invalidations()
+    return wrapper
+
+def get_permission_cache_stats():
+    ''' Return the number of cache hits and misses of `_get_effective_perms()`
+    in this process as a dictionary with the keys `hits` and `misses` '''
+    return dict(_permission_cache_stats)
+
+def reset_permission_cache_stats():
+    for key in _permission_cache_stats:
+        _permission_cache_stats[key] = 0
+
+def refresh_effective_perms(content_type, object_ids):
+    ''' Recalculate the `EffectiveObjectPermission`s of every object of
+    `content_type` whose primary key is in `object_ids`. Must be called after
+    writing `ObjectPermission`s by any means other than `assign_perm()`,
+    `remove_perm()`, or the recalculation methods of `ObjectPermissionMixin`,
+    all of which take care of it already. Also invalidates any cached
+    permissions for the objects. '''
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+    content_type_id = getattr(content_type, 'pk', content_type)
+    invalidate_permission_cache(content_type_id, object_ids)
+    bits_by_pk = get_permission_bits(content_type_id)[0]
+    permission_rows = ObjectPermission.objects.filter(
+        content_type_id=content_type_id, object_id__in=object_ids
+    ).values_list('object_id', 'user_id', 'permission_id', 'deny')
+    effective_bits = calculate_effective_permission_bits(
+        permission_rows, bits_by_pk)
+    EffectiveObjectPermission.objects.filter(
+        content_type_id=content_type_id, object_id__in=object_ids
+    ).delete()
+    EffectiveObjectPermission.objects.bulk_create([
+        EffectiveObjectPermission(
+            user_id=user_id,
+            content_type_id=content_type_id,
+            object_id=object_id,
+            permission_bits=bits
+        ) for (object_id, user_id), bits in effective_bits.iteritems()
+    ])
+
 
 class ObjectPermissionManager(models.Manager):
     def _rewrite_query_args(self, method, content_object, **kwargs):
@@ -222,6 +571,23 @@ class ObjectPermission(models.Model):
         )
 
 
+class EffectiveObjectPermission(models.Model):
+    ''' A denormalized summary of the `ObjectPermission`s a user holds on a
+    specific object: all grants, inherited or not, minus all denials. Each
+    permission is represented by one bit of `permission_bits`; see
+    `get_permission_bits()`. Calculated permissions are never included.
+    Maintained by `ObjectPermissionMixin` and used by `get_objects_for_user()`
+    to find objects without collecting primary keys in Python '''
+    user = models.ForeignKey('auth.User')
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    permission_bits = models.BigIntegerField()
+    objects = ObjectPermissionManager()
+
+    class Meta:
+        unique_together = ('user', 'content_type', 'object_id')
+
+
 class ObjectPermissionMixin(object):
     ''' A mixin class that adds the methods necessary for object-level
     permissions to a model (either models.Model or MPTTModel). The model must
@@ -244,6 +610,7 @@ class ObjectPermissionMixin(object):
                 self._meta.app_label, self._meta.model_name
             ).ASSIGNABLE_PERMISSIONS
 
+    @invalidates_permission_cache
     @transaction.atomic
     def copy_permissions_from(self, source_object):
         """
@@ -266,10 +633,12 @@ class ObjectPermissionMixin(object):
                     perm=source_permission.permission.codename,
                     deny=source_permission.deny)
             self._recalculate_inherited_perms()
+            self._refresh_effective_perms()
             return True
         else:
             return False
 
+    @invalidates_permission_cache
     @transaction.atomic
     def save(self, *args, **kwargs):
         # Make sure we exist in the database before proceeding
@@ -282,20 +651,17 @@ class ObjectPermissionMixin(object):
         fresh_self._recalculate_inherited_perms()
         fresh_self.recalculate_descendants_perms()
 
+    def _refresh_effective_perms(self):
+        ''' Recalculate the `EffectiveObjectPermission`s for this object '''
+        refresh_effective_perms(
+            ContentType.objects.get_for_model(self), [self.pk])
+
     def _filter_anonymous_perms(self, unfiltered_set):
         ''' Restrict a set of tuples in the format (user_id, permission_id) to
         only those permissions that apply to the content_type of this object
         and are listed in settings.ALLOWED_ANONYMOUS_PERMISSIONS. '''
-        content_type = ContentType.objects.get_for_model(self)
-        # Translate settings.ALLOWED_ANONYMOUS_PERMISSIONS to primary keys
-        codenames = set()
-        for perm in settings.ALLOWED_ANONYMOUS_PERMISSIONS:
-            app_label, codename = perm_parse(perm)
-            if app_label == content_type.app_label:
-                codenames.add(codename)
-        allowed_permissions = Permission.objects.filter(
-            content_type=content_type, codename__in=codenames
-        ).values_list('pk', flat=True)
+        allowed_permissions = _get_allowed_anonymous_permission_pks(
+            ContentType.objects.get_for_model(self))
         filtered_set = copy.copy(unfiltered_set)
         for user_id, permission_id in unfiltered_set:
             if user_id == settings.ANONYMOUS_USER_ID:
@@ -308,7 +674,61 @@ class ObjectPermissionMixin(object):
     ):
         ''' Reconcile all grant and deny permissions, and return an
         authoritative set of grant permissions (i.e. deny=False) for the
-        current object. '''
+        current object. Results are cached on this instance, which usually
+        lives only as long as a request, and also in
+        `settings.OBJECT_PERMISSION_CACHE` if it is set. Either way, they are
+        keyed by a version that changes whenever the permissions of this
+        object are written. '''
+        content_type_id = ContentType.objects.get_for_model(self).pk
+        version = get_permission_cache_version(content_type_id, self.pk)
+        user_id = None if user is None else user.pk
+        instance_cache_key = (version, user_id, codename, include_calculated)
+        try:
+            instance_cache = self._effective_perms_cache
+        except AttributeError:
+            instance_cache = self._effective_perms_cache = {}
+        try:
+            effective_perms = instance_cache[instance_cache_key]
+        except KeyError:
+            pass
+        else:
+            _permission_cache_stats['hits'] += 1
+            return set(effective_perms)
+
+        shared_cache = _get_shared_permission_cache()
+        if shared_cache is not None:
+            shared_cache_key = 'kpi:effective_perms:{}:{}:{}:{}:{}:{}'.format(
+                content_type_id, self.pk, version, user_id, codename,
+                include_calculated
+            )
+            effective_perms = shared_cache.get(shared_cache_key)
+            if effective_perms is not None:
+                _permission_cache_stats['hits'] += 1
+                instance_cache[instance_cache_key] = effective_perms
+                return set(effective_perms)
+
+        _permission_cache_stats['misses'] += 1
+        effective_perms = self._calculate_effective_perms(
+            user=user, codename=codename,
+            include_calculated=include_calculated
+        )
+        # Results for old versions are useless; don't let them pile up
+        if len(instance_cache) > 100:
+            instance_cache.clear()
+        instance_cache[instance_cache_key] = effective_perms
+        if shared_cache is not None:
+            shared_cache.set(
+                shared_cache_key,
+                effective_perms,
+                getattr(settings, 'OBJECT_PERMISSION_CACHE_TIMEOUT', 3600)
+            )
+        return set(effective_perms)
+
+    def _calculate_effective_perms(
+        self, user=None, codename=None, include_calculated=True
+    ):
+        ''' Do the work of `_get_effective_perms()`, bypassing the cache '''
+        content_type = ContentType.objects.get_for_model(self)
         # Including calculated permissions means we can't just pass kwargs
         # through to filter(), but we'll map the ones we understand.
         kwargs = {}
@@ -317,10 +737,11 @@ class ObjectPermissionMixin(object):
         if codename is not None:
             # share_ requires loading change_ from the database
             if codename.startswith('share_'):
-                kwargs['permission__codename'] = re.sub(
-                    '^share_', 'change_', codename, 1)
+                stored_codename = re.sub('^share_', 'change_', codename, 1)
             else:
-                kwargs['permission__codename'] = codename
+                stored_codename = codename
+            kwargs['permission_id__in'] = permission_registry.get_pks(
+                content_type, [stored_codename])
         grant_perms = set(ObjectPermission.objects.filter_for_object(self,
             deny=False, **kwargs).values_list('user_id', 'permission_id'))
         deny_perms = set(ObjectPermission.objects.filter_for_object(self,
@@ -339,7 +760,6 @@ class ObjectPermissionMixin(object):
                 return effective_perms
 
         # Add on the calculated permissions
-        content_type = ContentType.objects.get_for_model(self)
         if codename in self.CALCULATED_PERMISSIONS:
             # A sepecific query for a calculated permission should not return
             # any explicitly assigned permissions, e.g. share_ should not
@@ -352,45 +772,35 @@ class ObjectPermissionMixin(object):
                 codename is None or codename.startswith('share_')
         ):
             # Everyone with change_ should also get share_
-            change_permissions = Permission.objects.filter(
-                content_type=content_type,
-                codename__startswith='change_'
-            )
-            for change_permission in change_permissions:
-                share_permission_codename = re.sub(
-                    '^change_', 'share_', change_permission.codename, 1)
-                if (codename is not None and
-                        share_permission_codename != codename
-                ):
-                    # If the caller specified `codename`, skip anything that
-                    # doesn't match exactly. Necessary because `Asset` has
-                    # `*_submissions` in addition to `*_asset`
+            share_pk_by_change_pk = \
+                permission_registry.get_share_pk_by_change_pk()
+            if codename is not None:
+                # If the caller specified `codename`, skip anything that
+                # doesn't match exactly. Necessary because `Asset` has
+                # `*_submissions` in addition to `*_asset`
+                wanted_share_pks = set(permission_registry.get_pks(
+                    content_type, [codename]))
+            for user_id, permission_id in effective_perms_copy:
+                try:
+                    share_pk = share_pk_by_change_pk[permission_id]
+                except KeyError:
                     continue
-                share_permission = Permission.objects.get(
-                    content_type=content_type,
-                    codename=share_permission_codename
-                )
-                for user_id, permission_id in effective_perms_copy:
-                    if permission_id == change_permission.pk:
-                        effective_perms.add((user_id, share_permission.pk))
+                if codename is None or share_pk in wanted_share_pks:
+                    effective_perms.add((user_id, share_pk))
         # The owner has the delete_ permission
-        if self.owner is not None and (
-                user is None or user.pk == self.owner.pk) and (
+        if self.owner_id is not None and (
+                user is None or user.pk == self.owner_id) and (
                 codename is None or codename.startswith('delete_')
         ):
-            delete_permissions = Permission.objects.filter(
-                content_type=content_type,
-                codename__startswith='delete_'
-            )
-            for delete_permission in delete_permissions:
+            for delete_pk in permission_registry.get_delete_pks(content_type):
                 if (codename is not None and
-                        delete_permission.codename != codename
+                        permission_registry.get(delete_pk).codename != codename
                 ):
                     # If the caller specified `codename`, skip anything that
                     # doesn't match exactly. Necessary because `Asset` has
                     # `delete_submissions` in addition to `delete_asset`
                     continue
-                effective_perms.add((self.owner.pk, delete_permission.pk))
+                effective_perms.add((self.owner_id, delete_pk))
         # We may have calculated more permissions for anonymous users
         # than they are allowed to have. Remove them.
         if user is None or user.pk == settings.ANONYMOUS_USER_ID:
@@ -400,9 +810,183 @@ class ObjectPermissionMixin(object):
             return effective_perms
 
     def recalculate_descendants_perms(self):
-        ''' Recalculate the inherited permissions of all descendants. Expects
-        either self.get_mixed_children() or self.get_children() to exist. The
-        former will be used preferentially if it exists. '''
+        ''' Recalculate the inherited permissions of all descendants. Models
+        that define get_descendant_querysets() are handled in bulk by
+        `_bulk_recalculate_descendants_perms()`; all others are walked one
+        parent at a time by `_walk_recalculate_descendants_perms()` '''
+        if hasattr(self, 'get_descendant_querysets'):
+            self._bulk_recalculate_descendants_perms()
+        else:
+            self._walk_recalculate_descendants_perms()
+
+    @invalidates_permission_cache
+    @transaction.atomic
+    def _bulk_recalculate_descendants_perms(self):
+        ''' Recalculate the inherited permissions of all descendants using a
+        fixed number of queries, however large or deep the tree may be.
+        Expects self.get_descendant_querysets() to return one QuerySet per
+        descendant model, together matching every descendant (e.g. by MPTT
+        `lft` and `rght` values). Each of those models must have `parent` and
+        `owner` fields. Gives the same results as
+        `_walk_recalculate_descendants_perms()` '''
+        own_key = (ContentType.objects.get_for_model(self).pk, self.pk)
+        # Describe each descendant model once
+        descendant_models = []
+        for queryset in self.get_descendant_querysets():
+            model = queryset.model
+            content_type = ContentType.objects.get_for_model(model)
+            parent_content_type = ContentType.objects.get_for_model(
+                model._meta.get_field('parent').related_model)
+            if hasattr(model, 'MAPPED_PARENT_PERMISSIONS'):
+                # Translate parent permission pks directly into our own
+                translate_perm = {}
+                for parent_codename, codename in \
+                        model.MAPPED_PARENT_PERMISSIONS.iteritems():
+                    try:
+                        translate_perm[permission_registry.get_by_codename(
+                            parent_codename, content_type=parent_content_type
+                        ).pk] = permission_registry.get_by_codename(
+                            codename, content_type=content_type).pk
+                    except Permission.DoesNotExist:
+                        continue
+            elif content_type != parent_content_type:
+                raise ImproperlyConfigured(
+                    'Parent of {} is a {}, but the child has not defined '
+                    'MAPPED_PARENT_PERMISSIONS.'.format(
+                        model, parent_content_type.model_class())
+                )
+            else:
+                translate_perm = None
+            descendant_models.append((
+                queryset.order_by().values('pk'),
+                content_type,
+                parent_content_type,
+                # The owner gets every assignable permission
+                permission_registry.get_pks(
+                    content_type, model.ASSIGNABLE_PERMISSIONS),
+                translate_perm,
+                queryset.order_by().values_list('pk', 'parent_id', 'owner_id')
+            ))
+
+        # Read the shape of the whole tree in one query per model
+        owner_ids = {}
+        children = defaultdict(list)
+        for _, content_type, parent_content_type, _, _, rows in \
+                descendant_models:
+            for pk, parent_id, owner_id in rows:
+                key = (content_type.pk, pk)
+                owner_ids[key] = owner_id
+                children[(parent_content_type.pk, parent_id)].append(key)
+        # Only descendants that are themselves parents need their direct
+        # grants and denials, in order to calculate their effective
+        # permissions
+        parent_content_type_ids = {
+            parent_content_type.pk for _, _, parent_content_type, _, _, _
+                in descendant_models
+        }
+        direct_perms = defaultdict(lambda: (set(), set()))
+        for pks, content_type, _, _, _, _ in descendant_models:
+            if content_type.pk not in parent_content_type_ids:
+                continue
+            for object_id, user_id, permission_id, deny in \
+                    ObjectPermission.objects.filter(
+                        content_type=content_type,
+                        object_id__in=pks,
+                        inherited=False
+                    ).values_list(
+                        'object_id', 'user_id', 'permission_id', 'deny'
+                    ):
+                direct_perms[(content_type.pk, object_id)][int(deny)].add(
+                    (user_id, permission_id))
+
+        # Propagate effective permissions down the tree in memory, mirroring
+        # `_recalculate_inherited_perms()`
+        descriptions = {
+            content_type.pk: (
+                owner_permission_ids,
+                translate_perm,
+                _get_allowed_anonymous_permission_pks(content_type)
+            ) for _, content_type, _, owner_permission_ids, translate_perm, _
+                in descendant_models
+        }
+        inherited_perms = []
+        effective_perms = {
+            own_key: self._get_effective_perms(include_calculated=False)}
+        parents = [own_key]
+        while parents:
+            parent_key = parents.pop()
+            parent_effective_perms = effective_perms.pop(parent_key)
+            for child_key in children.get(parent_key, ()):
+                content_type_id, object_id = child_key
+                (owner_permission_ids, translate_perm,
+                    allowed_anonymous_perms) = descriptions[content_type_id]
+                owner_id = owner_ids[child_key]
+                child_perms = set()
+                if owner_id is not None:
+                    child_perms.update(
+                        (owner_id, permission_id)
+                            for permission_id in owner_permission_ids
+                    )
+                for user_id, permission_id in parent_effective_perms:
+                    if user_id == owner_id:
+                        # The owner already has every assignable permission
+                        continue
+                    if translate_perm is not None:
+                        try:
+                            permission_id = translate_perm[permission_id]
+                        except KeyError:
+                            # We haven't been configured to inherit this
+                            # permission from our parent, so skip it
+                            continue
+                    child_perms.add((user_id, permission_id))
+                inherited_perms.extend(
+                    (content_type_id, object_id, user_id, permission_id)
+                        for user_id, permission_id in child_perms
+                )
+                if child_key in children:
+                    grants, denies = direct_perms[child_key]
+                    # Like `_filter_anonymous_perms()`, pass down only the
+                    # anonymous permissions allowed by the settings
+                    effective_perms[child_key] = {
+                        (user_id, permission_id) for user_id, permission_id
+                            in (child_perms | grants) - denies
+                        if user_id != settings.ANONYMOUS_USER_ID or
+                            permission_id in allowed_anonymous_perms
+                    }
+                    parents.append(child_key)
+
+        # Replace all inherited permissions at once
+        for pks, content_type, _, _, _, _ in descendant_models:
+            ObjectPermission.objects.filter(
+                content_type=content_type,
+                object_id__in=pks,
+                inherited=True
+            ).delete()
+        uid_field = ObjectPermission._meta.get_field('uid')
+        ObjectPermission.objects.bulk_create([
+            ObjectPermission(
+                content_type_id=content_type_id,
+                object_id=object_id,
+                user_id=user_id,
+                permission_id=permission_id,
+                inherited=True,
+                uid=uid_field.generate_uid()
+            ) for content_type_id, object_id, user_id, permission_id
+                in inherited_perms
+        ], batch_size=BULK_CREATE_BATCH_SIZE)
+        # Bring the denormalized effective permissions up to date as well
+        pks_by_content_type = defaultdict(list)
+        for content_type_id, object_id in owner_ids:
+            pks_by_content_type[content_type_id].append(object_id)
+        for content_type_id, pks in pks_by_content_type.iteritems():
+            refresh_effective_perms(content_type_id, pks)
+
+    @invalidates_permission_cache
+    def _walk_recalculate_descendants_perms(self):
+        ''' Recalculate the inherited permissions of all descendants, one
+        parent at a time. Expects either self.get_mixed_children() or
+        self.get_children() to exist. The former will be used preferentially
+        if it exists. '''
 
         GET_CHILDREN_METHODS = ('get_mixed_children', 'get_children')
         can_have_children = False
@@ -473,7 +1057,11 @@ class ObjectPermissionMixin(object):
                 )
                 objects_to_create += new_permissions
             ObjectPermission.objects.bulk_create(objects_to_create)
+            # Bring the denormalized effective permissions up to date as well
+            for content_type, pks in delete_pks_by_content_type.iteritems():
+                refresh_effective_perms(content_type, pks)
 
+    @invalidates_permission_cache
     def _recalculate_inherited_perms(
             self,
             parent_effective_perms=None,
@@ -496,17 +1084,15 @@ class ObjectPermissionMixin(object):
             # if we use it when we're not supposed to
             objects_to_return = []
         # The owner gets every assignable permission
-        if self.owner is not None:
-            for perm in Permission.objects.filter(
-                content_type=content_type,
-                codename__in=self.get_assignable_permissions()
-            ):
+        if self.owner_id is not None:
+            for permission_id in permission_registry.get_pks(
+                    content_type, self.get_assignable_permissions()):
                 new_permission = ObjectPermission()
                 new_permission.content_object = self
                 # `user_id` instead of `user` is another workaround for
                 # migrations
                 new_permission.user_id = self.owner_id
-                new_permission.permission = perm
+                new_permission.permission_id = permission_id
                 new_permission.inherited = True
                 new_permission.uid = new_permission._meta.get_field(
                     'uid').generate_uid()
@@ -532,7 +1118,7 @@ class ObjectPermissionMixin(object):
                     try:
                         translated_id = translate_perm[permission_id]
                     except KeyError:
-                        parent_perm = Permission.objects.get(pk=permission_id)
+                        parent_perm = permission_registry.get(permission_id)
                         try:
                             translated_codename = \
                                 self.MAPPED_PARENT_PERMISSIONS[
@@ -541,10 +1127,9 @@ class ObjectPermissionMixin(object):
                             # We haven't been configured to inherit this
                             # permission from our parent, so skip it
                             continue
-                        translated_id = Permission.objects.get(
-                            content_type__app_label=\
-                                parent_perm.content_type.app_label,
-                            codename=translated_codename
+                        translated_id = permission_registry.get_by_codename(
+                            translated_codename,
+                            app_label=parent_perm.content_type.app_label
                         ).pk
                         translate_perm[permission_id] = translated_id
                     permission_id = translated_id
@@ -569,6 +1154,7 @@ class ObjectPermissionMixin(object):
                     new_permission.save()
         if return_instead_of_creating:
             return objects_to_return
+        self._refresh_effective_perms()
 
     def _get_implied_perms(self, explicit_perm, reverse=False):
         """ Determine which permissions are implied by `explicit_perm` based on
@@ -603,10 +1189,11 @@ class ObjectPermissionMixin(object):
             result.update(implied_perms)
         return result
 
+    @invalidates_permission_cache
     @transaction.atomic
     def assign_perm(
             self, user_obj, perm, deny=False, defer_recalc=False,
-            skip_kc=False
+            skip_kc=False, skip_refresh=False
     ):
         r"""
             Assign `user_obj` the given `perm` on this object, or break
@@ -620,30 +1207,13 @@ class ObjectPermissionMixin(object):
                 descendants
             :param skip_kc bool: When `True`, skip assignment of applicable KC
                 permissions
+            :param skip_refresh bool: When `True`, skip refreshing the
+                effective permissions of this object, which the caller will do
         """
-        app_label, codename = perm_parse(perm, self)
-        if codename not in self.get_assignable_permissions():
-            # Some permissions are calculated and not stored in the database
-            raise ValidationError(
-                '{} cannot be assigned explicitly to {} objects.'.format(
-                    codename, self._meta.model_name)
-            )
-        if isinstance(user_obj, AnonymousUser) or (
-            user_obj.pk == settings.ANONYMOUS_USER_ID
-        ):
-            # Is an anonymous user allowed to have this permission?
-            fq_permission = '{}.{}'.format(app_label, codename)
-            if not fq_permission in settings.ALLOWED_ANONYMOUS_PERMISSIONS:
-                raise ValidationError(
-                    'Anonymous users cannot have the permission {}.'.format(
-                        codename)
-                )
-            # Get the User database representation for AnonymousUser
-            user_obj = get_anonymous_user()
-        perm_model = Permission.objects.get(
-            content_type__app_label=app_label,
-            codename=codename
-        )
+        user_obj, app_label, codename = self._validate_assignment(
+            user_obj, perm)
+        perm_model = permission_registry.get_by_codename(
+            codename, app_label=app_label)
         existing_perms = ObjectPermission.objects.filter_for_object(
             self,
             user=user_obj,
@@ -685,7 +1255,11 @@ class ObjectPermissionMixin(object):
         implied_perms = self._get_implied_perms(codename, reverse=deny)
         for implied_perm in implied_perms:
             self.assign_perm(
-                user_obj, implied_perm, deny=deny, defer_recalc=True)
+                user_obj, implied_perm, deny=deny, defer_recalc=True,
+                skip_refresh=True)
+        # Refresh once, when the outermost call has assigned everything
+        if not skip_refresh:
+            self._refresh_effective_perms()
         # We might have been called by ourself to assign a related
         # permission. In that case, don't recalculate here.
         if defer_recalc:
@@ -696,13 +1270,210 @@ class ObjectPermissionMixin(object):
         fresh_self.recalculate_descendants_perms()
         return new_permission
 
+    def _validate_assignment(self, user_obj, perm):
+        ''' Make sure `perm` may be assigned to `user_obj` on this object,
+        raising `ValidationError` otherwise. Returns a tuple of the user,
+        replaced by its database representation if anonymous, the app label,
+        and the codename '''
+        app_label, codename = perm_parse(perm, self)
+        if codename not in self.get_assignable_permissions():
+            # Some permissions are calculated and not stored in the database
+            raise ValidationError(
+                '{} cannot be assigned explicitly to {} objects.'.format(
+                    codename, self._meta.model_name)
+            )
+        if isinstance(user_obj, AnonymousUser) or (
+            user_obj.pk == settings.ANONYMOUS_USER_ID
+        ):
+            # Is an anonymous user allowed to have this permission?
+            fq_permission = '{}.{}'.format(app_label, codename)
+            if not fq_permission in settings.ALLOWED_ANONYMOUS_PERMISSIONS:
+                raise ValidationError(
+                    'Anonymous users cannot have the permission {}.'.format(
+                        codename)
+                )
+            # Get the User database representation for AnonymousUser
+            user_obj = get_anonymous_user()
+        return user_obj, app_label, codename
+
+    @invalidates_permission_cache
+    @transaction.atomic
+    def assign_perms(
+            self, assignments, deny=False, defer_recalc=False, skip_kc=False
+    ):
+        r"""
+            Like `assign_perm()`, but for many `(user_obj, perm)` pairs at
+            once. Implied permissions are resolved and deduplicated up front,
+            new permissions are written with a single `bulk_create()`, KC
+            permissions are written in batches, and descendants are
+            recalculated only once. Returns a list of the newly created
+            `ObjectPermission`s.
+            :param assignments: iterable of `(user_obj, perm)` tuples
+            :param deny bool: When `True`, break inheritance from parent object
+            :param defer_recalc bool: When `True`, skip recalculating
+                descendants
+            :param skip_kc bool: When `True`, skip assignment of applicable KC
+                permissions
+        """
+        content_type = ContentType.objects.get_for_model(self)
+        users = {}
+        codenames_by_user_id = defaultdict(set)
+        for user_obj, perm in assignments:
+            user_obj, app_label, codename = self._validate_assignment(
+                user_obj, perm)
+            users[user_obj.pk] = user_obj
+            codenames = {codename}
+            codenames.update(self._get_implied_perms(codename, reverse=deny))
+            for implied_codename in codenames - {codename}:
+                # Implied permissions must be valid in their own right
+                self._validate_assignment(
+                    user_obj, '{}.{}'.format(app_label, implied_codename))
+            codenames_by_user_id[user_obj.pk].update(codenames)
+        if not users:
+            return []
+        wanted_perms = set()
+        for user_id, codenames in codenames_by_user_id.iteritems():
+            for codename in codenames:
+                wanted_perms.add((user_id, permission_registry.get_by_codename(
+                    codename, content_type=content_type).pk))
+        identical_perms = set()
+        contradictory_pks = []
+        contradictory_codenames_by_user_id = defaultdict(list)
+        for pk, user_id, permission_id, existing_deny in \
+                ObjectPermission.objects.filter_for_object(
+                    self, user_id__in=users.keys(), inherited=False
+                ).values_list('pk', 'user_id', 'permission_id', 'deny'):
+            if (user_id, permission_id) not in wanted_perms:
+                continue
+            if existing_deny == deny:
+                # The user already has this permission directly applied
+                identical_perms.add((user_id, permission_id))
+            else:
+                # Remove any explicitly-defined contradictory grants or
+                # denials
+                contradictory_pks.append(pk)
+                contradictory_codenames_by_user_id[user_id].append(
+                    permission_registry.get(permission_id).codename)
+        if contradictory_pks:
+            ObjectPermission.objects.filter(pk__in=contradictory_pks).delete()
+        # Check if any KC permissions should be removed as well
+        if deny and not skip_kc and contradictory_codenames_by_user_id:
+            bulk_remove_applicable_kc_permissions(self, {
+                users[user_id]: codenames for user_id, codenames
+                    in contradictory_codenames_by_user_id.iteritems()
+            })
+        uid_field = ObjectPermission._meta.get_field('uid')
+        new_permissions = [
+            ObjectPermission(
+                content_type=content_type,
+                object_id=self.pk,
+                user_id=user_id,
+                permission=permission_registry.get(permission_id),
+                deny=deny,
+                inherited=False,
+                uid=uid_field.generate_uid()
+            ) for user_id, permission_id in wanted_perms - identical_perms
+        ]
+        ObjectPermission.objects.bulk_create(
+            new_permissions, batch_size=BULK_CREATE_BATCH_SIZE)
+        # Assign any applicable KC permissions
+        if not deny and not skip_kc and new_permissions:
+            new_codenames_by_user = defaultdict(list)
+            for new_permission in new_permissions:
+                new_codenames_by_user[users[new_permission.user_id]].append(
+                    permission_registry.get(
+                        new_permission.permission_id).codename
+                )
+            bulk_assign_applicable_kc_permissions(self, new_codenames_by_user)
+        self._refresh_effective_perms()
+        if not defer_recalc:
+            # Recalculate all descendants, re-fetching ourself first to guard
+            # against stale MPTT values
+            fresh_self = type(self).objects.get(pk=self.pk)
+            fresh_self.recalculate_descendants_perms()
+        return new_permissions
+
+    @invalidates_permission_cache
+    @transaction.atomic
+    def remove_perms(self, removals, defer_recalc=False, skip_kc=False):
+        r"""
+            Like `remove_perm()`, but for many `(user_obj, perm)` pairs at
+            once, with implied permissions deduplicated, a fixed number of
+            queries, batched KC permission removal, and a single recalculation
+            of descendants.
+            :param removals: iterable of `(user_obj, perm)` tuples
+            :param defer_recalc bool: When `True`, skip recalculating
+                descendants
+            :param skip_kc bool: When `True`, skip removal of applicable KC
+                permissions
+        """
+        content_type = ContentType.objects.get_for_model(self)
+        users = {}
+        codenames_by_user_id = defaultdict(set)
+        for user_obj, perm in removals:
+            if isinstance(user_obj, AnonymousUser):
+                # Get the User database representation for AnonymousUser
+                user_obj = get_anonymous_user()
+            app_label, codename = perm_parse(perm, self)
+            if codename not in self.get_assignable_permissions():
+                # Some permissions are calculated and not stored in the
+                # database
+                raise ValidationError('{} cannot be removed explicitly.'.format(
+                    codename)
+                )
+            users[user_obj.pk] = user_obj
+            codenames_by_user_id[user_obj.pk].add(codename)
+            # Resolve implied permissions, e.g. revoking view implies revoking
+            # change
+            codenames_by_user_id[user_obj.pk].update(
+                self._get_implied_perms(codename, reverse=True))
+        if not users:
+            return
+        unwanted_perms = set()
+        for user_id, codenames in codenames_by_user_id.iteritems():
+            for codename in codenames:
+                unwanted_perms.add((user_id, permission_registry.get_by_codename(
+                    codename, content_type=content_type).pk))
+        pks_to_delete = []
+        perms_to_deny = set()
+        for pk, user_id, permission_id, inherited in \
+                ObjectPermission.objects.filter_for_object(
+                    self, user_id__in=users.keys(), deny=False
+                ).values_list('pk', 'user_id', 'permission_id', 'inherited'):
+            if (user_id, permission_id) not in unwanted_perms:
+                continue
+            pks_to_delete.append(pk)
+            if inherited:
+                perms_to_deny.add((user_id, permission_id))
+        if pks_to_delete:
+            ObjectPermission.objects.filter(pk__in=pks_to_delete).delete()
+        if perms_to_deny:
+            # Add deny permissions to block future inheritance. No grants are
+            # left to contradict them, so there is nothing for KC to do
+            self.assign_perms([
+                (users[user_id], permission_registry.get(permission_id).codename)
+                    for user_id, permission_id in perms_to_deny
+            ], deny=True, defer_recalc=True, skip_kc=True)
+        # Remove any applicable KC permissions
+        if not skip_kc:
+            bulk_remove_applicable_kc_permissions(self, {
+                users[user_id]: codenames for user_id, codenames
+                    in codenames_by_user_id.iteritems()
+            })
+        self._refresh_effective_perms()
+        if defer_recalc:
+            return
+        # Recalculate all descendants, re-fetching ourself first to guard
+        # against stale MPTT values
+        fresh_self = type(self).objects.get(pk=self.pk)
+        fresh_self.recalculate_descendants_perms()
+
     def get_perms(self, user_obj):
         ''' Return a list of codenames of all effective grant permissions that
         user_obj has on this object. '''
         user_perm_ids = self._get_effective_perms(user=user_obj)
         perm_ids = [x[1] for x in user_perm_ids]
-        return Permission.objects.filter(pk__in=perm_ids).values_list(
-            'codename', flat=True)
+        return [permission_registry.get(pk).codename for pk in set(perm_ids)]
 
     def get_users_with_perms(self, attach_perms=False):
         ''' Return a QuerySet of all users with any effective grant permission
@@ -713,10 +1484,11 @@ class ObjectPermissionMixin(object):
             user_perm_dict = {}
             for user_id, perm_id in user_perm_ids:
                 perm_list = user_perm_dict.get(user_id, [])
-                perm_list.append(Permission.objects.get(pk=perm_id).codename)
+                perm_list.append(permission_registry.get(perm_id).codename)
                 user_perm_dict[user_id] = perm_list
             # Resolve user ids into actual user objects
-            user_perm_dict = {User.objects.get(pk=key): value for (key, value)
+            users = User.objects.in_bulk(user_perm_dict.keys())
+            user_perm_dict = {users[key]: value for (key, value)
                 in user_perm_dict.iteritems()}
             return user_perm_dict
         else:
@@ -751,8 +1523,10 @@ class ObjectPermissionMixin(object):
                 return False
         return result
 
+    @invalidates_permission_cache
     @transaction.atomic
-    def remove_perm(self, user_obj, perm, defer_recalc=False, skip_kc=False):
+    def remove_perm(self, user_obj, perm, defer_recalc=False, skip_kc=False,
+                    skip_refresh=False):
         r"""
             Revoke the given `perm` on this object from `user_obj`. By default,
             recalculate descendant objects' permissions and remove any
@@ -770,6 +1544,8 @@ class ObjectPermissionMixin(object):
                 descendants
             :param skip_kc bool: When `True`, skip assignment of applicable KC
                 permissions
+            :param skip_refresh bool: When `True`, skip refreshing the
+                effective permissions of this object, which the caller will do
         """
         if isinstance(user_obj, AnonymousUser):
             # Get the User database representation for AnonymousUser
@@ -783,7 +1559,8 @@ class ObjectPermissionMixin(object):
         all_permissions = ObjectPermission.objects.filter_for_object(
             self,
             user=user_obj,
-            permission__codename=codename,
+            permission_id=permission_registry.get_by_codename(
+                codename, app_label=app_label).pk,
             deny=False
         )
         direct_permissions = all_permissions.filter(inherited=False)
@@ -793,17 +1570,21 @@ class ObjectPermissionMixin(object):
         implied_perms = self._get_implied_perms(codename, reverse=True)
         for implied_perm in implied_perms:
             self.remove_perm(
-                user_obj, implied_perm, defer_recalc=True)
+                user_obj, implied_perm, defer_recalc=True, skip_refresh=True)
         # Delete directly assigned permissions, if any
         direct_permissions.delete()
         if inherited_permissions.exists():
             # Delete inherited permissions
             inherited_permissions.delete()
             # Add a deny permission to block future inheritance
-            self.assign_perm(user_obj, perm, deny=True, defer_recalc=True)
+            self.assign_perm(user_obj, perm, deny=True, defer_recalc=True,
+                             skip_refresh=True)
         # Remove any applicable KC permissions
         if not skip_kc:
             remove_applicable_kc_permissions(self, user_obj, codename)
+        # Refresh once, when the outermost call has removed everything
+        if not skip_refresh:
+            self._refresh_effective_perms()
         # We might have been called by ourself to assign a related
         # permission. In that case, don't recalculate here.
         if defer_recalc:
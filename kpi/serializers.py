@@ -447,10 +447,13 @@ class AssetVersionListSerializer(serializers.Serializer):
     # `select_related()` calls  in `AssetVersionViewSet.get_queryset()`
     uid = serializers.ReadOnlyField()
     url = serializers.SerializerMethodField()
-    content_hash = serializers.ReadOnlyField()
+    content_hash = serializers.SerializerMethodField(read_only=True)
     date_deployed = serializers.SerializerMethodField(read_only=True)
     date_modified = serializers.CharField(read_only=True)
 
+    def get_content_hash(self, obj):
+        return obj.ensure_content_hash()
+
     def get_date_deployed(self, obj):
         return obj.deployed and obj.date_modified
 
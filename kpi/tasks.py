@@ -2,7 +2,8 @@ from __future__ import absolute_import
 from celery import shared_task
 from django.core.management import call_command
 from django.conf import settings
-from .models import ImportTask, ExportTask
+from .models import ImportTask, ExportTask, Asset, AssetVersion, \
+    CachedXForm
 
 @shared_task
 def update_search_index():
@@ -18,6 +19,11 @@ def export_in_background(export_task_uid):
     export_task = ExportTask.objects.get(uid=export_task_uid)
     export_task.run()
 
+@shared_task
+def render_export_shard(export_task_uid, shard_index):
+    export_task = ExportTask.objects.get(uid=export_task_uid)
+    export_task.render_shard(shard_index)
+
 @shared_task
 def sync_kobocat_xforms(username=None, quiet=True):
     call_command('sync_kobocat_xforms', username=username, quiet=quiet)
@@ -25,3 +31,23 @@ def sync_kobocat_xforms(username=None, quiet=True):
 @shared_task
 def import_survey_drafts_from_dkobo(**kwargs):
     call_command('import_survey_drafts_from_dkobo', **kwargs)
+
+@shared_task
+def clean_xform_cache():
+    call_command('delete_assets_snapshots',
+                 days=settings.ASSET_SNAPSHOT_MAXIMUM_AGE_DAYS, verbosity=0)
+    CachedXForm.evict()
+
+@shared_task
+def generate_asset_snapshot(asset_version_id):
+    asset_id = AssetVersion.objects.filter(pk=asset_version_id).values_list(
+        'asset_id', flat=True).first()
+    if asset_id is None:
+        return
+    asset = Asset.objects.get(pk=asset_id)
+    latest_version = asset.latest_version
+    # Debounce rapid successive saves: only the task scheduled for the latest
+    # version does any work
+    if latest_version is None or latest_version.pk != asset_version_id:
+        return
+    asset.snapshot
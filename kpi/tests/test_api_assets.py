@@ -129,6 +129,7 @@ class AssetVersionApiTests(APITestCase):
         self.assertEqual(len(resp2.data['content']['survey']), 2)
 
     def test_asset_version_content_hash(self):
+        AssetVersion.objects.update(content_hash=None)
         resp = self.client.get(self.version_list_url, format='json')
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         first_version = resp.data['results'][0]
@@ -306,6 +307,18 @@ class AssetsDetailApiTests(APITestCase):
         self.assertEqual(response.data['version__content_hash'],
                          self.asset.latest_version.content_hash)
 
+    def test_missing_content_hash_is_filled_in(self):
+        expected_hash = self.asset.latest_version.content_hash
+        AssetVersion.objects.update(content_hash=None)
+        response = self.client.get(self.asset_url, format='json')
+        self.assertEqual(response.data['version__content_hash'],
+                         expected_hash)
+        self.assertEqual(
+            AssetVersion.objects.values_list('content_hash', flat=True).get(
+                pk=self.asset.latest_version.pk),
+            expected_hash
+        )
+
 
 class AssetsXmlExportApiTests(KpiTestCase):
     fixtures = ['test_data']
@@ -447,3 +447,52 @@ class ApiPermissionsTestCase(KpiTestCase):
                                                   self.child_collection.uid})
         response= self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_assign_and_remove_permissions(self):
+        self.client.login(username=self.admin.username,
+                          password=self.admin_password)
+        asset_url = reverse('asset-detail',
+                            kwargs={'uid': self.admin_asset.uid})
+        data = [
+            {
+                'user': reverse('user-detail',
+                                kwargs={'username': user.username}),
+                'permission': 'change_asset',
+                'content_object': asset_url,
+            } for user in (self.someuser, self.anotheruser)
+        ]
+        response = self.client.post(reverse('objectpermission-bulk'), data,
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Implied `view_asset` permissions are included
+        self.assertEqual(len(response.data), 4)
+        for user in (self.someuser, self.anotheruser):
+            self.assertTrue(user.has_perm('change_asset', self.admin_asset))
+            self.assertTrue(user.has_perm('view_asset', self.admin_asset))
+
+        # Revoking `view_asset` also revokes the implied `change_asset`
+        uids = [p['uid'] for p in response.data
+                if p['permission'] == 'view_asset']
+        response = self.client.delete(reverse('objectpermission-bulk'), uids,
+                                      format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        for user in (self.someuser, self.anotheruser):
+            self.assertFalse(user.has_perm('change_asset', self.admin_asset))
+            self.assertFalse(user.has_perm('view_asset', self.admin_asset))
+
+    def test_bulk_assign_requires_share_permission(self):
+        self.add_perm(self.admin_asset, self.someuser, 'view_')
+        self.client.login(username=self.someuser.username,
+                          password=self.someuser_password)
+        data = [{
+            'user': reverse('user-detail',
+                            kwargs={'username': self.anotheruser.username}),
+            'permission': 'view_asset',
+            'content_object': reverse('asset-detail',
+                                      kwargs={'uid': self.admin_asset.uid}),
+        }]
+        response = self.client.post(reverse('objectpermission-bulk'), data,
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(
+            self.anotheruser.has_perm('view_asset', self.admin_asset))
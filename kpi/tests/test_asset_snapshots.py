@@ -1,11 +1,19 @@
+import copy
 import json
+from datetime import timedelta
 
+import mock
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from .test_api_asset_snapshots import TestAssetSnapshotList
 from ..models import Asset
 from ..models import AssetSnapshot
+from ..models import CachedXForm
+from ..tasks import clean_xform_cache, generate_asset_snapshot
 
 
 class AssetSnapshotsTestCase(TestCase):
@@ -53,3 +61,93 @@ class CreateAssetSnapshots(AssetSnapshotsTestCase):
         asset = Asset.objects.create(asset_type='survey', content=content)
         _snapshot = asset.snapshot
         self.assertEqual(_snapshot.source.get('settings')['form_title'], 'no_title_asset')
+
+
+class CachedXFormsTestCase(AssetSnapshotsTestCase):
+
+    def test_snapshots_share_cached_xml(self):
+        source = copy.deepcopy(self.asset.content)
+        for row in source['survey']:
+            row['$kuid'] = row['$kuid'][::-1]
+        with mock.patch('kpi.models.asset.FormPack') as FormPack:
+            snapshot = AssetSnapshot.objects.create(asset=self.asset,
+                                                    source=source)
+        self.assertFalse(FormPack.called)
+        self.assertEqual(snapshot.xml, self.asset_snapshot.xml)
+        self.assertEqual(snapshot.details, self.asset_snapshot.details)
+        self.assertEqual(CachedXForm.objects.count(), 1)
+
+    def test_failures_are_not_cached(self):
+        AssetSnapshot.objects.create(source={'survey': [{'type': 'bogus'}]})
+        self.assertEqual(CachedXForm.objects.count(), 1)
+
+    def test_evict(self):
+        source = copy.deepcopy(self.asset.content)
+        source['survey'][0]['label'] = 'Question 0'
+        AssetSnapshot.objects.create(asset=self.asset, source=source)
+        source['survey'][0]['label'] = 'Question -1'
+        AssetSnapshot.objects.create(asset=self.asset, source=source)
+        CachedXForm.objects.filter(
+            xml__contains='Question 0').update(
+                date_accessed=timezone.now() - timedelta(days=31))
+        self.assertEqual(CachedXForm.evict(maximum_age_days=30,
+                                           maximum_entries=1), 2)
+        self.assertEqual(
+            list(CachedXForm.objects.values_list('xml', flat=True)),
+            [AssetSnapshot.objects.latest('pk').xml]
+        )
+
+    def test_delete_expired_snapshots(self):
+        latest_version_snapshot = self.asset.snapshot
+        AssetSnapshot.objects.update(
+            date_created=timezone.now() - timedelta(days=365))
+        fresh_snapshot = AssetSnapshot.objects.create(
+            source=copy.deepcopy(self.asset.content))
+        clean_xform_cache()
+        self.assertEqual(
+            set(AssetSnapshot.objects.all()),
+            set([latest_version_snapshot, fresh_snapshot])
+        )
+
+
+class PregenerateAssetSnapshotsTestCase(AssetSnapshotsTestCase):
+
+    @override_settings(PREGENERATE_ASSET_SNAPSHOTS=True,
+                       ASSET_SNAPSHOT_PREGENERATION_DELAY=10)
+    def test_pregenerate_latest_version_only(self):
+        with mock.patch.object(generate_asset_snapshot,
+                               'apply_async') as apply_async:
+            self.asset.save()
+            first_version = self.asset.latest_version
+            self.asset.content['survey'][0]['label'] = 'Question 0'
+            self.asset.save()
+            latest_version = self.asset.latest_version
+        self.assertEqual(apply_async.call_args_list, [
+            mock.call(args=(version.pk,), countdown=10)
+            for version in (first_version, latest_version)
+        ])
+
+        generate_asset_snapshot(first_version.pk)
+        self.assertFalse(AssetSnapshot.objects.filter(
+            asset_version=first_version).exists())
+        generate_asset_snapshot(latest_version.pk)
+        snapshot = AssetSnapshot.objects.get(asset_version=latest_version)
+        self.assertEqual(self.asset.snapshot, snapshot)
+
+    def _snapshot_lock_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            self.asset._snapshot()
+        return [query for query in context.captured_queries
+                if 'pg_advisory_xact_lock' in query['sql']]
+
+    @override_settings(PREGENERATE_ASSET_SNAPSHOTS=False)
+    def test_no_lock_without_pregeneration(self):
+        self.assertEqual(self._snapshot_lock_queries(), [])
+
+    @override_settings(PREGENERATE_ASSET_SNAPSHOTS=True)
+    def test_lock_leaves_version_row_writable(self):
+        self.assertEqual(len(self._snapshot_lock_queries()), 1)
+        with CaptureQueriesContext(connection) as context:
+            self.asset._snapshot()
+        self.assertFalse(any('FOR UPDATE' in query['sql']
+                             for query in context.captured_queries))
@@ -1,14 +1,17 @@
 import json
 import hashlib
 import unittest
+from mock import patch
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from copy import deepcopy
 
 from formpack.utils.expand_content import SCHEMA_VERSION
 
 from ..models import Asset
 from ..models import AssetVersion
+from ..models.asset_version import get_content_digest, get_content_hash
 from kpi.exceptions import BadAssetTypeException
 
 
@@ -47,6 +50,22 @@ class AssetVersionTestCase(TestCase):
         new_asset.save()
         self.assertEqual(av_count + 2, AssetVersion.objects.count())
 
+    def test_expanded_content_is_saved(self):
+        asset = Asset.objects.create(asset_type='survey', content={
+            'survey': [{'type': 'note', 'label': 'Read me', 'name': 'n1'}]
+        })
+        version = asset.latest_version
+        self.assertIsNone(version.expanded_content)
+        schema = version.to_formpack_schema()
+        self.assertEqual(
+            AssetVersion.objects.get(pk=version.pk).expanded_content,
+            schema['content']
+        )
+        with patch('kpi.models.asset_version.expand_content') as expand:
+            version = AssetVersion.objects.get(pk=version.pk)
+            self.assertEqual(version.to_formpack_schema(), schema)
+        self.assertFalse(expand.called)
+
     def test_asset_deployment(self):
         self.asset = Asset.objects.create(asset_type='survey', content={
             'survey': [{'type': 'note', 'label': 'Read me', 'name': 'n1'}]
@@ -76,6 +95,8 @@ class AssetVersionTestCase(TestCase):
         self.template_asset = Asset.objects.create(asset_type='template')
         self.assertEqual(self.template_asset.asset_versions.count(), 1)
         self.assertEqual(self.template_asset.latest_version.deployed, False)
+        self.template_asset.content['survey'] = [
+            {'type': 'note', 'label': 'Read me', 'name': 'n1'}]
         self.template_asset.save()
         self.assertEqual(self.template_asset.asset_versions.count(), 2)
         self.assertEqual(self.template_asset.latest_version.deployed, False)
@@ -99,9 +120,108 @@ class AssetVersionTestCase(TestCase):
         self.assertEqual(new_asset.latest_version.content_hash, expected_hash)
         return new_asset
 
+    def test_unchanged_content_does_not_create_version(self):
+        asset = Asset.objects.create(asset_type='survey', content={
+            'survey': [{'type': 'note', 'label': 'Read me', 'name': 'n1'}]
+        })
+        version = asset.latest_version
+        self.assertEqual(version.content_digest,
+                         get_content_digest(version.version_content))
+        asset.content['survey'][0]['$kuid'] = 'changed'
+        asset.save()
+        self.assertEqual(asset.asset_versions.count(), 1)
+        # Versions without a digest get one
+        AssetVersion.objects.update(content_digest=None)
+        asset.save()
+        self.assertEqual(asset.asset_versions.count(), 1)
+        self.assertEqual(
+            AssetVersion.objects.get(pk=version.pk).content_digest,
+            version.content_digest
+        )
+        asset.name = 'Renamed'
+        asset.save()
+        self.assertEqual(asset.asset_versions.count(), 2)
+
+    def test_content_hash_is_stored(self):
+        asset = self.test_version_content_hash()
+        expected_hash = asset.latest_version.content_hash
+        self.assertEqual(
+            AssetVersion.objects.filter(content_hash=expected_hash).get(),
+            asset.latest_version
+        )
+        AssetVersion.objects.update(content_hash=None)
+        call_command('populate_assetversion_content_hashes')
+        self.assertEqual(
+            AssetVersion.objects.values_list('content_hash', flat=True).get(),
+            expected_hash
+        )
+
     def test_version_content_hash_same_after_non_content_change(self):
         new_asset = self.test_version_content_hash()
         expected_hash = new_asset.latest_version.content_hash
         new_asset.settings['description'] = 'Loco el que lee'
         new_asset.save()
         self.assertEqual(new_asset.latest_version.content_hash, expected_hash)
+
+
+@override_settings(ASSET_VERSION_DELTA_STORAGE=True,
+                   ASSET_VERSION_KEYFRAME_INTERVAL=3)
+class AssetVersionDeltaStorageTestCase(TestCase):
+    def setUp(self):
+        self.asset = Asset.objects.create(asset_type='survey', content={
+            'survey': [{'type': 'note', 'label': 'Read me', 'name': 'n%d' % i}
+                       for i in xrange(10)]
+        })
+        self.contents = [deepcopy(self.asset.content)]
+        for index in xrange(4):
+            self.asset.content['survey'][index]['label'] = ['Edited']
+            self.asset.save()
+            self.contents.append(deepcopy(self.asset.content))
+
+    def _versions(self):
+        return list(AssetVersion.objects.filter(
+            asset=self.asset).order_by('pk'))
+
+    def test_versions_are_stored_as_deltas(self):
+        versions = self._versions()
+        self.assertEqual([version._keyframe_id for version in versions], [
+            None, versions[0].pk, versions[0].pk, None, versions[3].pk
+        ])
+        self.assertIsNone(versions[1]._version_content)
+        self.assertEqual([version.version_content for version in versions],
+                         self.contents)
+
+    def test_deleting_keyframe_keeps_dependent_versions(self):
+        self._versions()[0].delete()
+        versions = self._versions()
+        self.assertEqual([version._keyframe_id for version in versions], [
+            None, None, None, versions[2].pk
+        ])
+        self.assertEqual([version.version_content for version in versions],
+                         self.contents[1:])
+
+    def test_convert_storage(self):
+        call_command('convert_assetversion_storage', to='full')
+        versions = self._versions()
+        self.assertEqual(
+            [version._keyframe_id for version in versions], [None] * 5)
+        self.assertEqual([version.version_content for version in versions],
+                         self.contents)
+
+        call_command('convert_assetversion_storage', to='deltas')
+        versions = self._versions()
+        self.assertEqual([version._keyframe_id for version in versions], [
+            None, versions[0].pk, versions[0].pk, None, versions[3].pk
+        ])
+        self.assertEqual([version.version_content for version in versions],
+                         self.contents)
+
+        AssetVersion.objects.update(content_hash=None)
+        call_command('populate_assetversion_content_hashes')
+        self.assertEqual(
+            [version.content_hash for version in self._versions()],
+            [get_content_hash(content) for content in self.contents]
+        )
+
+        self.asset.delete()
+        self.assertFalse(AssetVersion.objects.exists())
@@ -3,15 +3,17 @@ from __future__ import unicode_literals
 
 from copy import deepcopy
 import json
-from collections import OrderedDict
+import mock
+from collections import Counter, OrderedDict
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from kobo.apps.reports import report_data
 from formpack import FormPack
 
-from kpi.models import Asset
+from kpi.deployment_backends.mock_backend import MockDeploymentBackend
+from kpi.models import Asset, AssetReportAggregate, AssetVersion
 
 from formpack.utils import json_hash
 
@@ -170,6 +172,114 @@ class MockDataReports(TestCase):
                           u'\u0627\u0644\u062e\u064a\u0627\u0631 '
                           u'\u0627\u0644\u062b\u0627\u0646\u064a'))
 
+    def test_count_responses_matches_autoreport(self):
+        pack, submission_stream = report_data.build_formpack(
+            self.asset, deepcopy(self.submissions))
+        versions = sorted(pack.versions.keys())
+        fields = pack.get_fields_for_versions(versions=versions)
+        counters = {}
+        self.assertEqual(
+            report_data._count_responses(
+                counters, fields, versions, submission_stream)[0],
+            len(self.submissions)
+        )
+
+        submission_stream = report_data.build_formpack(
+            self.asset, deepcopy(self.submissions))[1]
+        report = pack.autoreport(versions=versions)
+        expected_stats = report.get_stats(
+            submission_stream, [field.name for field in fields]).stats
+        for field, _, expected in expected_stats:
+            self.assertEqual(
+                field.get_stats(Counter(counters.get(field.name, {}))),
+                expected
+            )
+
+    @override_settings(INCREMENTAL_REPORTS=True)
+    def test_kobo_apps_reports_report_data_from_aggregate(self):
+        submissions = self.asset.deployment.get_submissions()
+        for index, submission in enumerate(submissions):
+            submission['_id'] = index + 1
+        self.asset.deployment.mock_submissions(submissions)
+        self.assertEqual(
+            report_data.data_by_identifiers(self.asset),
+            report_data.data_by_identifiers(
+                self.asset, submission_stream=deepcopy(submissions))
+        )
+        aggregate = AssetReportAggregate.objects.get(asset=self.asset)
+        self.assertEqual(aggregate.submission_count, 4)
+        self.assertEqual(aggregate.last_submission_id, 4)
+
+        # Only the new submission should be read
+        new_submission = deepcopy(submissions[2])
+        new_submission['_id'] = 5
+        submissions.append(new_submission)
+        self.asset.deployment.mock_submissions(submissions)
+        get_submissions = MockDeploymentBackend.get_submissions
+        with mock.patch.object(
+                MockDeploymentBackend, 'get_submissions', autospec=True,
+                side_effect=get_submissions
+        ) as patched_get_submissions:
+            values = report_data.data_by_identifiers(
+                self.asset, field_names=('Select_one',))
+        self.assertEqual(patched_get_submissions.call_count, 1)
+        self.assertEqual(
+            patched_get_submissions.call_args[1]['start_after'], 4)
+        self.assertEqual(values[0]['data']['frequencies'], (3, 2))
+        self.assertEqual(
+            report_data.data_by_identifiers(self.asset),
+            report_data.data_by_identifiers(
+                self.asset, submission_stream=deepcopy(submissions))
+        )
+
+        # Deleting a submission starts the tallies over
+        del submissions[0]
+        self.asset.deployment.mock_submissions(submissions)
+        values = report_data.data_by_identifiers(
+            self.asset, field_names=('Select_one',))
+        self.assertEqual(values[0]['data']['frequencies'], (2, 2))
+        aggregate = AssetReportAggregate.objects.get(asset=self.asset)
+        self.assertEqual(aggregate.submission_count, 4)
+
+    def test_reports_ignore_aggregate_by_default(self):
+        report_data.data_by_identifiers(self.asset)
+        self.assertFalse(
+            AssetReportAggregate.objects.filter(asset=self.asset).exists())
+
+    def test_formpack_is_cached_by_version(self):
+        pack = report_data.build_formpack(self.asset, [])[0]
+        with mock.patch.object(AssetVersion, 'to_formpack_schema') as schema:
+            self.assertIs(report_data.build_formpack(self.asset, [])[0], pack)
+        self.assertFalse(schema.called)
+
+        self.asset.content['survey'].append(
+            {'type': 'text', 'name': 'added', 'label': ['Added', '', '']})
+        self.asset.save()
+        self.asset.deploy(backend='mock', active=True)
+        self.asset.save()
+        new_pack = report_data.build_formpack(self.asset, [])[0]
+        self.assertIsNot(new_pack, pack)
+        self.assertEqual(len(new_pack.versions), 2)
+
+    def test_infer_version_id(self):
+        version_ids_newest_first = ['vNew', '2', 'vOld', '1']
+        version_ranks = report_data.get_version_ranks(
+            version_ids_newest_first, {'20': 'vNew', '10': 'vGone'})
+        infer_version_id = report_data.make_version_id_inferrer(
+            version_ids_newest_first, version_ranks)
+
+        def inferred(**submission):
+            return infer_version_id(submission)[
+                report_data.INFERRED_VERSION_ID_KEY]
+
+        self.assertEqual(inferred(__version__='vOld'), 'vOld')
+        self.assertEqual(inferred(__version__='1', _version_='2'), '2')
+        self.assertEqual(inferred(__version__='vOld', _version__001='20'),
+                         'vNew')
+        # Unknown versions fall back on the newest one
+        self.assertEqual(inferred(__version__='10'), 'vNew')
+        self.assertEqual(inferred(some_question='vOld'), 'vNew')
+
     def test_export_works_if_no_version_value_provided_in_submission(self):
         submissions = self.asset.deployment.get_submissions()
 
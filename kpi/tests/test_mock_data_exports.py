@@ -17,7 +17,10 @@ from django.test import TestCase
 from kobo.apps.reports import report_data
 from formpack import FormPack
 
+from kpi.constants import SUBMISSION_TIME_FORMAT
+from kpi.deployment_backends.mock_backend import MockDeploymentBackend
 from kpi.models import Asset, ExportTask
+from kpi.tasks import render_export_shard
 
 
 class MockDataExports(TestCase):
@@ -303,6 +306,192 @@ class MockDataExports(TestCase):
         ]
         self.run_csv_export_test(expected_lines, export_options)
 
+    def run_complete_csv_export(self, export_options=None):
+        export_task = ExportTask()
+        export_task.user = self.user
+        export_task.data = {
+            'source': reverse('asset-detail', args=[self.asset.uid]),
+            'type': 'csv',
+            'lang': 'English',
+        }
+        if export_options:
+            export_task.data.update(export_options)
+        messages = defaultdict(list)
+        export_task._run_task(messages)
+        self.assertFalse(messages)
+        export_task.status = ExportTask.COMPLETE
+        export_task.save()
+        return export_task
+
+    def test_csv_export_incremental(self):
+        base_export = self.run_complete_csv_export()
+        self.assertEqual(base_export.data['submission_count'], 3)
+
+        new_submission = dict(self.submissions[-1])
+        new_submission.update({
+            '_id': 64,
+            '_uuid': 'f0b9e0e9-1b3c-4c5e-9d0e-5e2f7f1d6d2a',
+            '_submission_time': '2017-10-23T09:43:02',
+        })
+        self.asset.deployment.mock_submissions(
+            self.submissions + [new_submission])
+
+        get_submissions = MockDeploymentBackend.get_submissions
+        with mock.patch.object(
+                MockDeploymentBackend, 'get_submissions', autospec=True,
+                side_effect=get_submissions
+        ) as patched_get_submissions:
+            incremental_export = self.run_complete_csv_export(
+                {'incremental': 'true'})
+        self.assertEqual(
+            patched_get_submissions.call_args[1]['submitted_after'],
+            base_export.last_submission_time
+        )
+        self.assertEqual(incremental_export.data['submission_count'], 4)
+        self.assertEqual(
+            incremental_export.last_submission_time.strftime(
+                '%Y-%m-%dT%H:%M:%S'),
+            '2017-10-23T09:43:02'
+        )
+
+        # Keep the full export from copying the cached incremental one
+        ExportTask.objects.update(cache_key=None)
+        full_export = self.run_complete_csv_export()
+        incremental_lines = list(incremental_export.result)
+        self.assertEqual(incremental_lines, list(full_export.result))
+        self.assertTrue(incremental_lines[-1].endswith(b'"4"\r\n'))
+
+    def test_csv_export_incremental_after_deletion(self):
+        self.run_complete_csv_export()
+        # Deleting a submission invalidates the `_index` of every later row
+        self.asset.deployment.mock_submissions(self.submissions[1:])
+        incremental_export = self.run_complete_csv_export(
+            {'incremental': 'true'})
+        self.assertEqual(incremental_export.data['submission_count'], 2)
+        ExportTask.objects.update(cache_key=None)
+        full_export = self.run_complete_csv_export()
+        self.assertEqual(
+            list(incremental_export.result), list(full_export.result))
+
+    def test_csv_export_incremental_after_edit(self):
+        base_export = self.run_complete_csv_export()
+        submissions = [dict(submission) for submission in self.submissions]
+        submissions[0].update({
+            'external_characteristics/'
+            'How_many_segments_does_your_body_have': '7',
+            '_last_edited': (
+                base_export.date_created + datetime.timedelta(seconds=1)
+            ).strftime(SUBMISSION_TIME_FORMAT),
+        })
+        self.asset.deployment.mock_submissions(submissions)
+        incremental_export = self.run_complete_csv_export(
+            {'incremental': 'true'})
+        ExportTask.objects.update(cache_key=None)
+        full_export = self.run_complete_csv_export()
+        incremental_lines = list(incremental_export.result)
+        self.assertEqual(incremental_lines, list(full_export.result))
+        self.assertIn(b'"7"', incremental_lines[2])
+
+    def test_unchanged_export_is_copied_from_cache(self):
+        first_export = self.run_complete_csv_export()
+        self.assertIsNotNone(first_export.cache_key)
+        self.assertEqual(
+            first_export.data['result_size'], first_export.result.size)
+
+        with mock.patch(
+                'kpi.models.import_export_task.build_formpack'
+        ) as patched_build_formpack:
+            cached_export = self.run_complete_csv_export()
+        self.assertFalse(patched_build_formpack.called)
+        self.assertEqual(cached_export.cache_key, first_export.cache_key)
+        self.assertNotEqual(cached_export.result.name, first_export.result.name)
+        self.assertEqual(
+            list(cached_export.result), list(first_export.result))
+        self.assertEqual(
+            cached_export.last_submission_time,
+            first_export.last_submission_time
+        )
+
+        # Different options or new submissions must not hit the cache
+        other_export = self.run_complete_csv_export({'lang': 'Spanish'})
+        self.assertNotEqual(other_export.cache_key, first_export.cache_key)
+        self.asset.deployment.mock_submissions(self.submissions[:2])
+        fewer_export = self.run_complete_csv_export()
+        self.assertNotEqual(fewer_export.cache_key, first_export.cache_key)
+        self.assertEqual(len(list(fewer_export.result)), 4)
+
+    def test_edited_submissions_miss_the_cache(self):
+        first_export = self.run_complete_csv_export()
+        # e.g. a submission was edited or its validation status changed
+        last_modification_time = (
+            self.asset.deployment.last_modification_time +
+            datetime.timedelta(days=1)
+        )
+        with mock.patch.object(
+                MockDeploymentBackend, '_last_modification_time',
+                return_value=last_modification_time):
+            edited_export = self.run_complete_csv_export()
+        self.assertNotEqual(edited_export.cache_key, first_export.cache_key)
+
+    def test_evict_from_cache(self):
+        source = reverse('asset-detail', args=[self.asset.uid])
+        english_export = self.run_complete_csv_export()
+        spanish_export = self.run_complete_csv_export({'lang': 'Spanish'})
+        # Copies of cached results count only once
+        self.run_complete_csv_export({'lang': 'Spanish'})
+        with self.settings(
+                MAXIMUM_EXPORT_CACHE_BYTES_PER_FORM=(
+                    spanish_export.data['result_size'])
+        ):
+            self.assertEqual(ExportTask.evict_from_cache(source), 1)
+        english_export.refresh_from_db()
+        spanish_export.refresh_from_db()
+        self.assertIsNone(english_export.cache_key)
+        self.assertIsNotNone(spanish_export.cache_key)
+        # Evicted exports are still available to their users
+        self.assertTrue(english_export.result.storage.exists(
+            english_export.result.name))
+
+    def test_csv_export_sharded(self):
+        export_task = ExportTask()
+        export_task.user = self.user
+        export_task.data = {
+            'source': reverse('asset-detail', args=[self.asset.uid]),
+            'type': 'csv',
+            'lang': 'English',
+            'sharded': 'true',
+        }
+        export_task.save()
+        with self.settings(EXPORT_SHARD_SIZE=2), mock.patch(
+                'kpi.tasks.render_export_shard.delay') as patched_delay:
+            export_task.run()
+        self.assertEqual(export_task.status, ExportTask.PROCESSING)
+        shard_calls = patched_delay.call_args_list
+        self.assertEqual(len(shard_calls), 2)
+        self.assertEqual(
+            [(shard['start_after'], shard['end_at'], shard['offset'])
+                for shard in export_task.data['shards']],
+            [(None, 62, 0), (62, None, 2)]
+        )
+
+        # Shards may finish in any order
+        for shard_call in reversed(shard_calls):
+            render_export_shard(**shard_call[1])
+        export_task.refresh_from_db()
+        self.assertEqual(export_task.status, ExportTask.COMPLETE)
+        self.assertEqual(export_task.data['submission_count'], 3)
+        for shard in export_task.data['shards']:
+            self.assertFalse(
+                export_task.result.storage.exists(shard['fragment']))
+
+        ExportTask.objects.update(cache_key=None)
+        full_export = self.run_complete_csv_export()
+        self.assertEqual(list(export_task.result), list(full_export.result))
+        self.assertEqual(
+            export_task.last_submission_time,
+            full_export.last_submission_time
+        )
+
     def test_xls_export_english_labels(self):
         export_task = ExportTask()
         export_task.user = self.user
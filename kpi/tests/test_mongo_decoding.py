@@ -6,6 +6,7 @@ import unittest
 from django.test import TestCase
 from django.conf import settings
 
+from kobo.apps.reports.report_data import get_submission_keys
 from kpi.utils.mongo_helper import MongoDecodingHelper
 
 
@@ -155,3 +156,54 @@ class MongoBase64Decoding(TestCase):
         decoded = list(get_instances_from_mongo())
         expected_results = decoded_results
         self.assertEqual(decoded, expected_results)
+
+
+class MongoDecodingInPlace(TestCase):
+    def test_decoding_is_repeatable_and_in_place(self):
+        for _ in range(2):
+            # The second pass is served by the decoded key cache
+            nested = {'aLg==b': 1, 'plain': 2}
+            submission = {'rptLg==x': [nested], 'untouched': {'plain': 3}}
+            decoded = MongoDecodingHelper.to_readable_dict(submission)
+            self.assertIs(decoded, submission)
+            self.assertEqual(decoded, {
+                'rpt.x': [{'a.b': 1, 'plain': 2}],
+                'untouched': {'plain': 3},
+            })
+            self.assertIs(decoded['rpt.x'][0], nested)
+
+
+class MongoProjection(TestCase):
+    '''
+    Only the keys needed by the selected fields should be requested from
+    MongoDB, encoded the same way KC encodes them
+    '''
+    def test_encoding_round_trip(self):
+        for key in ('dot.dot.dot', '$starts_with_dollar', 'regular/key'):
+            encoded = MongoDecodingHelper.encode(key)
+            self.assertNotIn('.', encoded)
+            self.assertFalse(encoded.startswith('$'))
+            self.assertEqual(MongoDecodingHelper.decode(encoded), key)
+
+    def test_submission_keys_for_fields(self):
+        content = {'survey': [
+            {'type': 'text', 'name': 'top'},
+            {'type': 'begin_group', 'name': 'grp'},
+            {'type': 'integer', 'name': 'grouped'},
+            {'type': 'begin_repeat', 'name': 'rpt'},
+            {'type': 'text', 'name': 'repeated'},
+            {'type': 'begin_group', 'name': 'inner'},
+            {'type': 'text', 'name': 'deeply_repeated'},
+            {'type': 'end_group'},
+            {'type': 'end_repeat'},
+            {'type': 'end_group'},
+            {'type': 'text', 'name': 'last'},
+        ]}
+        self.assertSetEqual(
+            get_submission_keys([content]),
+            {'top', 'grp/grouped', 'grp/rpt', 'last'}
+        )
+        self.assertSetEqual(
+            get_submission_keys([content], ['grouped', 'deeply_repeated']),
+            {'grp/grouped', 'grp/rpt'}
+        )
@@ -1,11 +1,21 @@
+import mock
 from django.contrib.auth.models import Permission
+from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
-from django.test import TestCase
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, TransactionTestCase, override_settings
 
 from ..models.asset import Asset
 from ..models.collection import Collection
-from ..models.object_permission import get_all_objects_for_user
+from ..models.object_permission import ObjectPermission
+from ..models.object_permission import (
+    get_all_objects_for_user,
+    get_anonymous_user,
+    get_objects_for_user,
+    get_permission_cache_stats,
+    permission_registry,
+)
 
 
 class BasePermissionsTestCase(TestCase):
@@ -476,6 +486,214 @@ class PermissionsTestCase(BasePermissionsTestCase):
         self.assertNotIn(self.admin_asset, someuser_assets)
         self.assertNotIn(self.admin_collection, someuser_collections)
 
+    def test_get_objects_for_user_with_effective_perms(self):
+        child_asset = Asset.objects.create(
+            owner=self.admin, parent=self.admin_collection)
+        self.assertNotIn(child_asset, get_objects_for_user(
+            self.someuser, 'view_asset', Asset))
+        # Inherited permissions are included
+        self.admin_collection.assign_perm(self.someuser, 'view_collection')
+        self.assertIn(child_asset, get_objects_for_user(
+            self.someuser, 'view_asset', Asset))
+        # The user must have *all* requested permissions
+        self.assertNotIn(child_asset, get_objects_for_user(
+            self.someuser, ['view_asset', 'change_asset'], Asset))
+        child_asset.assign_perm(self.someuser, 'change_asset')
+        self.assertIn(child_asset, get_objects_for_user(
+            self.someuser, ['view_asset', 'change_asset'], Asset))
+        # Denying an inherited permission excludes the object
+        child_asset.remove_perm(self.someuser, 'view_asset')
+        self.assertNotIn(child_asset, get_objects_for_user(
+            self.someuser, 'view_asset', Asset))
+
+    def test_effective_perms_cache(self):
+        self.admin_asset.has_perm(self.someuser, 'view_asset')
+        stats_before = get_permission_cache_stats()
+        self.assertFalse(self.admin_asset.has_perm(self.someuser, 'view_asset'))
+        stats_after = get_permission_cache_stats()
+        self.assertEqual(stats_after['misses'], stats_before['misses'])
+        self.assertGreater(stats_after['hits'], stats_before['hits'])
+        # Writing permissions through another instance must invalidate the
+        # cache of this one
+        Asset.objects.get(pk=self.admin_asset.pk).assign_perm(
+            self.someuser, 'view_asset')
+        self.assertTrue(self.admin_asset.has_perm(self.someuser, 'view_asset'))
+        self.assertIn('view_asset', self.admin_asset.get_perms(self.someuser))
+
+    def test_bulk_and_walking_recalculation_agree(self):
+        grandchild = Collection.objects.create(owner=self.admin)
+        child = Collection.objects.create(owner=self.someuser)
+        grandchild.parent = child
+        grandchild.save()
+        child.parent = self.admin_collection
+        child.save()
+        for parent in (self.admin_collection, child, grandchild):
+            Asset.objects.create(owner=self.admin, parent=parent)
+        Asset.objects.create(owner=self.someuser, parent=grandchild)
+        anotheruser = User.objects.get(username='anotheruser')
+        collection = Collection.objects.get(pk=self.admin_collection.pk)
+        collection.assign_perm(anotheruser, 'change_collection')
+        collection.assign_perm(self.someuser, 'view_collection')
+        Collection.objects.get(pk=child.pk).remove_perm(
+            anotheruser, 'change_collection')
+
+        def get_inherited_perms():
+            return set(ObjectPermission.objects.filter(
+                inherited=True).values_list(
+                    'content_type_id', 'object_id', 'user_id',
+                    'permission_id'
+            ))
+
+        collection = Collection.objects.get(pk=self.admin_collection.pk)
+        collection._walk_recalculate_descendants_perms()
+        walked = get_inherited_perms()
+        collection._bulk_recalculate_descendants_perms()
+        self.assertSetEqual(get_inherited_perms(), walked)
+        grandchild_asset = grandchild.assets.get(owner=self.admin)
+        self.assertTrue(grandchild_asset.has_perm(anotheruser, 'view_asset'))
+        self.assertFalse(
+            grandchild_asset.has_perm(anotheruser, 'change_asset'))
+        self.assertTrue(grandchild_asset.has_perm(self.someuser, 'view_asset'))
+
+    def test_bulk_and_walking_recalculation_agree_for_anonymous_user(self):
+        child = Collection.objects.create(
+            owner=self.someuser, parent=self.admin_collection)
+        grandchild = Collection.objects.create(
+            owner=self.someuser, parent=child)
+        Asset.objects.create(owner=self.admin, parent=grandchild)
+        anonymous_user = get_anonymous_user()
+        Collection.objects.get(pk=self.admin_collection.pk).assign_perm(
+            AnonymousUser(), 'view_collection')
+        # Granted directly, e.g. before `ALLOWED_ANONYMOUS_PERMISSIONS` was
+        # narrowed, so `assign_perm()` would refuse it
+        ObjectPermission.objects.create(
+            content_object=child,
+            user=anonymous_user,
+            permission=permission_registry.get_by_codename(
+                'change_collection', app_label='kpi'),
+            inherited=False
+        )
+
+        def get_inherited_perms():
+            return set(ObjectPermission.objects.filter(
+                inherited=True).values_list(
+                    'content_type_id', 'object_id', 'user_id',
+                    'permission_id'
+            ))
+
+        collection = Collection.objects.get(pk=self.admin_collection.pk)
+        collection._walk_recalculate_descendants_perms()
+        walked = get_inherited_perms()
+        collection._bulk_recalculate_descendants_perms()
+        self.assertSetEqual(get_inherited_perms(), walked)
+        grandchild = Collection.objects.get(pk=grandchild.pk)
+        self.assertTrue(
+            grandchild.has_perm(anonymous_user, 'view_collection'))
+        self.assertFalse(
+            grandchild.has_perm(anonymous_user, 'change_collection'))
+        self.assertFalse(ObjectPermission.objects.filter(
+            object_id=grandchild.pk,
+            user=anonymous_user,
+            permission__codename='change_collection'
+        ).exists())
+
+    def test_assign_and_remove_perms_in_bulk(self):
+        anotheruser = User.objects.get(username='anotheruser')
+        self.admin_asset.parent = self.admin_collection
+        self.admin_asset.save()
+        collection = Collection.objects.get(pk=self.admin_collection.pk)
+        new_permissions = collection.assign_perms([
+            (self.someuser, 'change_collection'),
+            (anotheruser, 'view_collection'),
+            # Duplicates are ignored
+            (anotheruser, 'view_collection'),
+        ])
+        self.assertItemsEqual(
+            [(p.user_id, p.permission.codename) for p in new_permissions],
+            [
+                (self.someuser.pk, 'change_collection'),
+                (self.someuser.pk, 'view_collection'),
+                (anotheruser.pk, 'view_collection'),
+            ]
+        )
+        # Assigning again creates nothing new
+        self.assertListEqual(
+            collection.assign_perms([(self.someuser, 'change_collection')]),
+            []
+        )
+        asset = Asset.objects.get(pk=self.admin_asset.pk)
+        self.assertTrue(asset.has_perm(self.someuser, 'change_asset'))
+        self.assertTrue(asset.has_perm(anotheruser, 'view_asset'))
+
+        # Revoking inherited permissions adds denials
+        asset.remove_perms([
+            (self.someuser, 'view_asset'),
+            (anotheruser, 'view_asset'),
+        ])
+        asset = Asset.objects.get(pk=self.admin_asset.pk)
+        for user in (self.someuser, anotheruser):
+            self.assertListEqual(list(asset.get_perms(user)), [])
+        self.assertTrue(ObjectPermission.objects.filter_for_object(
+            asset, user=self.someuser, deny=True,
+            permission__codename='change_asset'
+        ).exists())
+        self.assertTrue(collection.has_perm(self.someuser, 'change_collection'))
+
+    def test_permission_registry(self):
+        asset_ct = ContentType.objects.get_for_model(Asset)
+        change_asset = Permission.objects.get(
+            content_type=asset_ct, codename='change_asset')
+        share_asset = Permission.objects.get(
+            content_type=asset_ct, codename='share_asset')
+        self.assertEqual(
+            permission_registry.get_by_codename(
+                'change_asset', app_label='kpi').pk,
+            change_asset.pk
+        )
+        self.assertEqual(
+            permission_registry.get_share_pk_by_change_pk()[change_asset.pk],
+            share_asset.pk
+        )
+        self.assertItemsEqual(
+            permission_registry.get_delete_pks(asset_ct),
+            Permission.objects.filter(
+                content_type=asset_ct, codename__startswith='delete_'
+            ).values_list('pk', flat=True)
+        )
+        # Permissions created after loading are picked up by a reload
+        new_permission = Permission.objects.create(
+            content_type=asset_ct, codename='frobnicate_asset',
+            name='Can frobnicate asset')
+        self.assertEqual(
+            permission_registry.get(new_permission.pk).codename,
+            'frobnicate_asset'
+        )
+        with self.assertRaises(Permission.DoesNotExist):
+            permission_registry.get_by_codename(
+                'nonexistent_asset', app_label='kpi')
+
+    def test_permission_registry_ignores_large_unrelated_content_types(self):
+        # Content types that never store effective permissions may have more
+        # permissions than fit in `EffectiveObjectPermission.permission_bits`
+        large_ct = ContentType.objects.create(
+            app_label='unrelated', model='largemodel')
+        Permission.objects.bulk_create([
+            Permission(content_type=large_ct, codename='perm_{}'.format(i),
+                       name='Perm {}'.format(i))
+            for i in range(64)
+        ])
+        permission_registry.clear()
+        asset_ct = ContentType.objects.get_for_model(Asset)
+        self.assertIn(
+            'view_asset', permission_registry.get_bits(asset_ct)[1])
+        self.assertEqual(
+            permission_registry.get_by_codename(
+                'perm_63', app_label='unrelated').content_type_id,
+            large_ct.pk
+        )
+        with self.assertRaises(ImproperlyConfigured):
+            permission_registry.get_bits(large_ct)
+
     def test_copy_permissions_between_objects(self):
 
         new_admin_asset_1 = Asset.objects.create(content={'survey': [
@@ -509,3 +727,58 @@ class PermissionsTestCase(BasePermissionsTestCase):
 
         self.assertListEqual(
             sorted(new_admin_asset_2.get_perms(self.someuser)), expected_permissions)
+
+    def test_implied_perms_refresh_effective_perms_once(self):
+        # `change_asset` implies `view_asset`; the recursive assignment of the
+        # implied permission must not refresh the effective permissions again
+        with mock.patch.object(
+                Asset, '_refresh_effective_perms') as refresh:
+            self.admin_asset.assign_perm(self.someuser, 'change_asset')
+        self.assertEqual(refresh.call_count, 1)
+
+        with mock.patch.object(
+                Asset, '_refresh_effective_perms') as refresh:
+            self.admin_asset.remove_perm(self.someuser, 'view_asset')
+        self.assertEqual(refresh.call_count, 1)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'permissions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'permissions',
+        },
+    },
+    OBJECT_PERMISSION_CACHE='permissions',
+)
+class SharedPermissionCacheTestCase(TransactionTestCase):
+    fixtures = ['test_data']
+
+    def test_read_during_uncommitted_revoke(self):
+        admin = User.objects.get(username='admin')
+        someuser = User.objects.get(username='someuser')
+        asset = Asset.objects.create(owner=admin)
+        asset.assign_perm(someuser, 'view_asset')
+        self.assertTrue(asset.has_perm(someuser, 'view_asset'))
+        view_asset_pk = permission_registry.get_pks(
+            ContentType.objects.get_for_model(Asset), ['view_asset'])[0]
+        refresh_effective_perms = Asset._refresh_effective_perms
+
+        def refresh_then_read_elsewhere(self_):
+            refresh_effective_perms(self_)
+            # Another process reads the permissions before the revocation
+            # commits, so it still sees the grant, and caches it
+            with mock.patch.object(
+                    Asset, '_calculate_effective_perms',
+                    return_value={(someuser.pk, view_asset_pk)}):
+                self.assertTrue(Asset.objects.get(pk=asset.pk).has_perm(
+                    someuser, 'view_asset'))
+
+        with mock.patch.object(Asset, '_refresh_effective_perms',
+                               refresh_then_read_elsewhere):
+            asset.remove_perm(someuser, 'view_asset')
+        self.assertFalse(Asset.objects.get(pk=asset.pk).has_perm(
+            someuser, 'view_asset'))
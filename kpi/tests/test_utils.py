@@ -11,6 +11,7 @@ from kpi.utils.standardize_content import standardize_content
 from kpi.utils.sluggify import sluggify, sluggify_label
 from kpi.utils.autoname import autoname_fields, autoname_fields_to_field
 from kpi.utils.autoname import autovalue_choices_in_place
+from kpi.utils.json_patch import apply_patch, make_patch
 
 
 class UtilsTestCase(TestCase):
@@ -166,3 +167,27 @@ class UtilsTestCase(TestCase):
         part1 = u'العربية'
         part2 = '_001'
         self.assertEqual(surv['choices'][1]['$autovalue'], part1 + part2)
+
+    def test_json_patch(self):
+        src = {
+            'survey': [
+                {'type': 'text', 'name': 'q1', 'label': ['Q1']},
+                {'type': 'text', 'name': 'q2', 'label': ['Q2']},
+                {'type': 'text', 'name': 'q3', 'label': ['Q3']},
+            ],
+            'settings': {'a/b': 1, 'c~d': True},
+        }
+        dst = deepcopy(src)
+        dst['survey'].insert(0, {'type': 'note', 'name': 'n1'})
+        dst['survey'][2]['label'] = ['Question 2']
+        del dst['survey'][3]
+        dst['settings']['c~d'] = 1
+        del dst['settings']['a/b']
+        dst['translations'] = [None]
+
+        patch = make_patch(src, dst)
+        self.assertEqual(apply_patch(src, patch), dst)
+        self.assertIn({'op': 'replace', 'path': '/survey/1/label/0',
+                       'value': 'Question 2'}, patch)
+        self.assertIn({'op': 'remove', 'path': '/settings/a~1b'}, patch)
+        self.assertEqual(make_patch(src, deepcopy(src)), [])
@@ -0,0 +1,109 @@
+# coding: utf-8
+'''
+A minimal implementation of JSON Patch (RFC 6902), limited to the `add`,
+`remove` and `replace` operations, which are enough to turn any JSON document
+into any other
+'''
+
+from __future__ import (unicode_literals, print_function,
+                        absolute_import, division)
+
+import copy
+import difflib
+import json
+
+
+def _escape(token):
+    return unicode(token).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def _make_list_patch(src, dst, path, patch):
+    matcher = difflib.SequenceMatcher(
+        None,
+        [json.dumps(item, sort_keys=True) for item in src],
+        [json.dumps(item, sort_keys=True) for item in dst],
+        autojunk=False
+    )
+    # Work from the end of the list, so that the indexes of the opcodes still
+    # to be processed are not shifted by the operations already emitted
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == 'equal':
+            continue
+        # Items replaced one for one are usually rows that were edited, so
+        # patch them instead of replacing them whole
+        common = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+        for index in xrange(common):
+            _make_patch(src[i1 + index], dst[j1 + index],
+                        '{}/{}'.format(path, i1 + index), patch)
+        for index in reversed(xrange(i1 + common, i2)):
+            patch.append({'op': 'remove', 'path': '{}/{}'.format(path, index)})
+        for index in xrange(common, j2 - j1):
+            patch.append({'op': 'add',
+                          'path': '{}/{}'.format(path, i1 + index),
+                          'value': dst[j1 + index]})
+
+
+def _make_patch(src, dst, path, patch):
+    if isinstance(src, dict) and isinstance(dst, dict):
+        for key in src:
+            if key not in dst:
+                patch.append({'op': 'remove',
+                              'path': '{}/{}'.format(path, _escape(key))})
+        for key, value in dst.iteritems():
+            if key in src:
+                _make_patch(src[key], value,
+                            '{}/{}'.format(path, _escape(key)), patch)
+            else:
+                patch.append({'op': 'add',
+                              'path': '{}/{}'.format(path, _escape(key)),
+                              'value': value})
+    elif isinstance(src, list) and isinstance(dst, list):
+        _make_list_patch(src, dst, path, patch)
+    elif src != dst or isinstance(src, bool) != isinstance(dst, bool):
+        patch.append({'op': 'replace', 'path': path, 'value': dst})
+
+
+def make_patch(src, dst):
+    '''
+    Return a list of operations that turns `src` into `dst` when passed to
+    `apply_patch()`
+    '''
+    patch = []
+    _make_patch(src, dst, '', patch)
+    return patch
+
+
+def apply_patch(doc, patch):
+    '''
+    Return a copy of `doc` modified by the operations in `patch`. `doc` itself
+    is left untouched
+    '''
+    doc = copy.deepcopy(doc)
+    for operation in patch:
+        value = copy.deepcopy(operation.get('value'))
+        if operation['path'] == '':
+            # Only `replace` makes sense for the whole document
+            doc = value
+            continue
+        tokens = [_unescape(token)
+                  for token in operation['path'].split('/')[1:]]
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token) if isinstance(parent, list) else token]
+        key = tokens[-1]
+        if isinstance(parent, list):
+            key = len(parent) if key == '-' else int(key)
+        if operation['op'] == 'add' and isinstance(parent, list):
+            parent.insert(key, value)
+        elif operation['op'] == 'remove':
+            del parent[key]
+        elif operation['op'] in ('add', 'replace'):
+            parent[key] = value
+        else:
+            raise ValueError(
+                'Unsupported operation: {}'.format(operation['op']))
+    return doc
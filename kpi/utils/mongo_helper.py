@@ -5,7 +5,8 @@ import base64
 class MongoDecodingHelper(object):
     '''
     Stripped-down version of KoBoCAT's
-    onadata.apps.api.mongo_helper.MongoHelper for decoding only.
+    onadata.apps.api.mongo_helper.MongoHelper for decoding, and for encoding
+    the keys used in queries and projections.
     '''
 
     KEY_WHITELIST = ['$or', '$and', '$exists', '$in', '$gt', '$gte',
@@ -14,6 +15,17 @@ class MongoDecodingHelper(object):
         (re.compile(r'^' + base64.encodestring('$').strip()), '$'),
         (re.compile(base64.encodestring('.').strip()), '.'),
     ]
+    ENCODING_SUBSTITUTIONS = [
+        (re.compile(r'^\$'), base64.encodestring('$').strip()),
+        (re.compile(r'\.'), base64.encodestring('.').strip()),
+    ]
+
+    # Maps every key seen so far to its decoded form, or to `None` if it is
+    # not encoded. Submissions to the same form repeat the same keys over and
+    # over, so this spares almost all calls to `_is_attribute_encoded()` and
+    # `decode()`
+    _decoded_keys = {}
+    MAXIMUM_DECODED_KEYS = 100000
 
     @classmethod
     def to_readable_dict(cls, d):
@@ -21,24 +33,69 @@ class MongoDecodingHelper(object):
         Updates encoded attributes of a dict with human-readable attributes.
         For example:
         { "myLg==attribute": True } => { "my.attribute": True }
+        The dict and any dicts nested within it are modified in place; keys
+        are only moved when they actually need decoding.
 
         :param d: dict
         :return: dict
         """
+        decoded_keys = cls._decoded_keys
+        renamed_keys = None
+        for key, value in d.iteritems():
+            value_type = type(value)
+            if value_type == dict:
+                cls.to_readable_dict(value)
+            elif value_type == list:
+                for element in value:
+                    if type(element) == dict:
+                        cls.to_readable_dict(element)
 
-        for key, value in list(d.items()):
-            if type(value) == list:
-                value = [cls.to_readable_dict(e)
-                         if type(e) == dict else e for e in value]
-            elif type(value) == dict:
-                value = cls.to_readable_dict(value)
+            try:
+                decoded_key = decoded_keys[key]
+            except KeyError:
+                decoded_key = cls._cache_decoded_key(key)
+            if decoded_key is not None:
+                if renamed_keys is None:
+                    renamed_keys = []
+                renamed_keys.append((key, decoded_key))
 
-            if cls._is_attribute_encoded(key):
-                del d[key]
-                d[cls.decode(key)] = value
+        if renamed_keys is not None:
+            for key, decoded_key in renamed_keys:
+                d[decoded_key] = d.pop(key)
 
         return d
 
+    @classmethod
+    def _cache_decoded_key(cls, key):
+        """
+        Decodes `key` if needed and remembers the result for subsequent calls
+        to `to_readable_dict()`.
+
+        :param key: string
+        :return: string, or `None` if `key` is not encoded
+        """
+        if cls._is_attribute_encoded(key):
+            decoded_key = cls.decode(key)
+        else:
+            decoded_key = None
+        if len(cls._decoded_keys) >= cls.MAXIMUM_DECODED_KEYS:
+            cls._decoded_keys.clear()
+        cls._decoded_keys[key] = decoded_key
+        return decoded_key
+
+    @classmethod
+    def encode(cls, key):
+        """
+        Replace characters not allowed in Mongo keys with their base64-encoded
+        representations, as KoBoCAT does when saving submissions
+
+        :param key: string
+        :return: string
+        """
+        for pattern, repl in cls.ENCODING_SUBSTITUTIONS:
+            key = re.sub(pattern, repl, key)
+        return key
+
     @classmethod
     def decode(cls, key):
         """
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from distutils.util import strtobool
 from itertools import chain
 import copy
@@ -188,6 +189,94 @@ class ObjectPermissionViewSet(NoUpdateModelViewSet):
                 instance.permission.codename
             )
 
+    @list_route(methods=['post', 'delete'])
+    def bulk(self, request, *args, **kwargs):
+        r"""
+            Assign (`POST`) or revoke (`DELETE`) many permissions at once.
+            `POST` expects a list of objects like those accepted by `create()`
+            and responds with the permissions that were actually created;
+            `DELETE` expects a list of `uid`s of directly-applied permissions.
+            Each affected object is updated with a single call to
+            `assign_perms()` or `remove_perms()`.
+        """
+        if request.method == 'DELETE':
+            return self._bulk_destroy(request)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        # Group the assignments by affected object
+        assignments_by_object = OrderedDict()
+        can_share = {}
+        with transaction.atomic():
+            for item in serializer.validated_data:
+                affected_object = item['content_object']
+                codename = item['permission'].codename
+                key = (type(affected_object), affected_object.pk)
+                affected_object, assignments = \
+                    assignments_by_object.setdefault(
+                        key, (affected_object, []))
+                # Make sure the requesting user has the share_ permission on
+                # the affected object
+                if (key, codename) not in can_share:
+                    can_share[(key, codename)] = \
+                        self._requesting_user_can_share(
+                            affected_object, codename)
+                if not can_share[(key, codename)]:
+                    raise exceptions.PermissionDenied()
+                assignments.append((item['user'], codename))
+            new_permissions = []
+            for affected_object, assignments in \
+                    assignments_by_object.itervalues():
+                # TEMPORARY Issue #1161: something other than KC is setting a
+                # permission; clear the `from_kc_only` flag
+                ObjectPermission.objects.filter_for_object(
+                    affected_object,
+                    user__in=[user for user, _ in assignments],
+                    permission__codename='from_kc_only'
+                ).delete()
+                new_permissions.extend(
+                    affected_object.assign_perms(assignments))
+        return Response(
+            self.get_serializer(new_permissions, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def _bulk_destroy(self, request):
+        uids = request.data
+        if not isinstance(uids, list):
+            raise exceptions.ParseError(
+                detail='Expected a list of permission `uid`s.')
+        permissions = list(self.filter_queryset(self.get_queryset()).filter(
+            uid__in=uids).select_related('permission', 'user'))
+        if len(permissions) != len(set(uids)):
+            raise exceptions.NotFound()
+        # Group the removals by affected object
+        removals_by_object = OrderedDict()
+        with transaction.atomic():
+            for permission in permissions:
+                # Only directly-applied permissions may be modified; forbid
+                # deleting permissions inherited from ancestors
+                if permission.inherited:
+                    raise exceptions.MethodNotAllowed(
+                        request.method,
+                        detail='Cannot delete inherited permissions.'
+                    )
+                key = (permission.content_type_id, permission.object_id)
+                if key not in removals_by_object:
+                    removals_by_object[key] = (
+                        permission.content_object, set())
+                affected_object, removals = removals_by_object[key]
+                codename = permission.permission.codename
+                removals.add((permission.user, codename))
+            for affected_object, removals in removals_by_object.itervalues():
+                # Make sure the requesting user has the share_ permission on
+                # the affected object
+                for codename in {codename for _, codename in removals}:
+                    if not self._requesting_user_can_share(
+                            affected_object, codename):
+                        raise exceptions.PermissionDenied()
+                affected_object.remove_perms(removals)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class CollectionViewSet(viewsets.ModelViewSet):
     # Filtering handled by KpiObjectPermissionsFilter.filter_queryset()
     queryset = Collection.objects.select_related(
@@ -721,6 +810,7 @@ class SubmissionViewSet(NestedViewSetMixin, viewsets.ViewSet,
         This endpoint is handled by the SubmissionViewSet (not KobocatDataProxyViewSetMixin)
         because it doesn't use KC proxy.
         It's only used to trigger hook services of the Asset (so far).
+        It accepts either one `instance_id` or a list of `instances_ids`.
 
         :param request:
         :return:
@@ -734,13 +824,25 @@ class SubmissionViewSet(NestedViewSetMixin, viewsets.ViewSet,
         try:
             asset_uid = self.get_parents_query_dict().get("asset")
             asset = get_object_or_404(self.parent_model, uid=asset_uid)
-            instance_id = request.data.get("instance_id")
-            if not HookUtils.call_services(asset, instance_id):
-                response_status_code = status.HTTP_409_CONFLICT
-                response = {
-                    "detail": _(
-                        "Your data for instance {} has been already submitted.".format(instance_id))
-                }
+            if "instances_ids" in request.data:
+                if hasattr(request.data, "getlist"):
+                    instances_ids = request.data.getlist("instances_ids")
+                else:
+                    instances_ids = request.data.get("instances_ids")
+                if not HookUtils.call_services_bulk(asset, instances_ids):
+                    response_status_code = status.HTTP_409_CONFLICT
+                    response = {
+                        "detail": _(
+                            "Your data for these instances has been already submitted.")
+                    }
+            else:
+                instance_id = request.data.get("instance_id")
+                if not HookUtils.call_services(asset, instance_id):
+                    response_status_code = status.HTTP_409_CONFLICT
+                    response = {
+                        "detail": _(
+                            "Your data for instance {} has been already submitted.".format(instance_id))
+                    }
 
         except Exception as e:
             logging.error("SubmissionViewSet.create - {}".format(str(e)))
@@ -775,7 +877,7 @@ class AssetVersionViewSet(NestedViewSetMixin, viewsets.ModelViewSet):
             # Save time by only retrieving fields from the DB that the
             # serializer will use
             _queryset = _queryset.only(
-                'uid', 'deployed', 'date_modified', 'asset_id')
+                'uid', 'deployed', 'date_modified', 'asset_id', 'content_hash')
         # `AssetVersionListSerializer.get_url()` asks for the asset UID
         _queryset = _queryset.select_related('asset__uid')
         return _queryset